@@ -0,0 +1,23 @@
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_activity_log_indexes'
+down_revision = '20261018_add_engagement_decay'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Activity rollups and pruning scan these tables by time
+    op.create_index('ix_useractivity_created_at', 'useractivity', ['created_at'])
+    op.create_index('ix_reselleractivity_created_at', 'reselleractivity', ['created_at'])
+    op.create_index('ix_analyticsuseractivity_created_at', 'analyticsuseractivity', ['created_at'])
+    op.create_index('ix_notificationlog_attempted_at', 'notificationlog', ['attempted_at'])
+    # activityrollup is a new table, created by create_all
+
+
+def downgrade() -> None:
+    op.drop_index('ix_notificationlog_attempted_at', table_name='notificationlog')
+    op.drop_index('ix_analyticsuseractivity_created_at', table_name='analyticsuseractivity')
+    op.drop_index('ix_reselleractivity_created_at', table_name='reselleractivity')
+    op.drop_index('ix_useractivity_created_at', table_name='useractivity')
@@ -0,0 +1,22 @@
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_dashboard_range_indexes'
+down_revision = '20261018_add_reseller_commission_ledger'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The admin dashboard counts recent rows with range predicates on these columns
+    op.create_index('ix_telegramuser_created_at', 'telegramuser', ['created_at'])
+    op.create_index('ix_telegramuser_last_seen_at', 'telegramuser', ['last_seen_at'])
+    op.create_index('ix_service_purchased_at', 'service', ['purchased_at'])
+    op.create_index('ix_transaction_status_approved', 'transaction', ['status', 'approved_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_transaction_status_approved', table_name='transaction')
+    op.drop_index('ix_service_purchased_at', table_name='service')
+    op.drop_index('ix_telegramuser_last_seen_at', table_name='telegramuser')
+    op.drop_index('ix_telegramuser_created_at', table_name='telegramuser')
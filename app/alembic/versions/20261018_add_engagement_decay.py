@@ -0,0 +1,26 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_engagement_decay'
+down_revision = '20261018_add_revenue_rollups'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('userprofile') as batch_op:
+        batch_op.add_column(sa.Column('engagement_decayed_sum', sa.Numeric(10, 4), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('engagement_decayed_at', sa.DateTime(), nullable=True))
+    # Start from the current score, as of its last computation; the nightly
+    # crm.engagement_reconcile job then recomputes it from the activity log
+    op.execute(
+        "UPDATE userprofile SET engagement_decayed_sum = COALESCE(engagement_score, 0), "
+        "engagement_decayed_at = COALESCE(last_updated, CURRENT_TIMESTAMP)"
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('userprofile') as batch_op:
+        batch_op.drop_column('engagement_decayed_at')
+        batch_op.drop_column('engagement_decayed_sum')
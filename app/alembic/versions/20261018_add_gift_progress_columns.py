@@ -0,0 +1,24 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_gift_progress_columns'
+down_revision = '20261018_add_messageschedule_next_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('gift') as batch_op:
+        batch_op.add_column(sa.Column('last_processed_user_id', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('started_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('completed_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('error_message', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('gift') as batch_op:
+        batch_op.drop_column('error_message')
+        batch_op.drop_column('completed_at')
+        batch_op.drop_column('started_at')
+        batch_op.drop_column('last_processed_user_id')
@@ -0,0 +1,15 @@
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_messageschedule_next_index'
+down_revision = '20261018_add_notification_status_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_messageschedule_active_next', 'messageschedule', ['is_active', 'next_execution_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_messageschedule_active_next', table_name='messageschedule')
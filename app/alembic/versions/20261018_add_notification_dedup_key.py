@@ -0,0 +1,22 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_notification_dedup_key'
+down_revision = '20250922_add_alias_to_purchase_intent'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('notification') as batch_op:
+        batch_op.add_column(sa.Column('dedup_key', sa.String(length=128), nullable=True))
+        batch_op.create_unique_constraint('uq_notification_dedup_key', ['dedup_key'])
+    op.create_index('ix_service_expires_at', 'service', ['expires_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_service_expires_at', table_name='service')
+    with op.batch_alter_table('notification') as batch_op:
+        batch_op.drop_constraint('uq_notification_dedup_key', type_='unique')
+        batch_op.drop_column('dedup_key')
@@ -0,0 +1,15 @@
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_notification_status_index'
+down_revision = '20261018_add_notification_dedup_key'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_notification_status_scheduled', 'notification', ['status', 'scheduled_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_notification_status_scheduled', table_name='notification')
@@ -0,0 +1,20 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_receipt_image_hash'
+down_revision = '20261018_add_transaction_fraud_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('transaction') as batch_op:
+        batch_op.add_column(sa.Column('receipt_image_hash', sa.String(length=64), nullable=True))
+    op.create_index('ix_transaction_receipt_image_hash', 'transaction', ['receipt_image_hash'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_transaction_receipt_image_hash', table_name='transaction')
+    with op.batch_alter_table('transaction') as batch_op:
+        batch_op.drop_column('receipt_image_hash')
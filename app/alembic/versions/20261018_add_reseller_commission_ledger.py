@@ -0,0 +1,73 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_reseller_commission_ledger'
+down_revision = '20261018_add_receipt_image_hash'
+branch_labels = None
+depends_on = None
+
+# Set when upgrade() had to create resellersettlement, so downgrade() only drops what it created
+CREATED_MARKER = 'migration_created_resellersettlement'
+
+
+def upgrade() -> None:
+    # Normally created by create_all; needed here for the legacy batch and the foreign key
+    if not sa.inspect(op.get_bind()).has_table('resellersettlement'):
+        op.create_table(
+            'resellersettlement',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('first_commission_id', sa.Integer(), nullable=True),
+            sa.Column('last_commission_id', sa.Integer(), nullable=True),
+            sa.Column('commissions', sa.Integer(), nullable=False),
+            sa.Column('resellers', sa.Integer(), nullable=False),
+            sa.Column('sales_amount', sa.Numeric(18, 2), nullable=False),
+            sa.Column('commission_amount', sa.Numeric(18, 2), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        )
+        op.create_index('ix_resellersettlement_id', 'resellersettlement', ['id'])
+        op.execute(
+            sa.text("INSERT INTO botsettings (`key`, value, description, data_type) VALUES (:key, :value, :description, 'string')")
+            .bindparams(key=CREATED_MARKER, value=revision, description='resellersettlement was created by this migration')
+        )
+
+    with op.batch_alter_table('resellercommission') as batch_op:
+        batch_op.add_column(sa.Column('settlement_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('payment_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_resellercommission_settlement_id', 'resellersettlement', ['settlement_id'], ['id'])
+        batch_op.create_foreign_key('fk_resellercommission_payment_id', 'resellerpayment', ['payment_id'], ['id'])
+    op.create_index('ix_resellercommission_settlement_id', 'resellercommission', ['settlement_id'])
+    op.create_index('ix_resellercommission_payment_id', 'resellercommission', ['payment_id'])
+    op.create_index('ix_resellercommission_reseller_status', 'resellercommission', ['reseller_id', 'status'])
+
+    # Commissions written before the ledger are already in the reseller totals:
+    # record them as one "legacy" settlement so the settlement job skips them
+    bind = op.get_bind()
+    if bind.execute(sa.text("SELECT COUNT(*) FROM resellercommission")).scalar():
+        op.execute(
+            "INSERT INTO resellersettlement"
+            " (first_commission_id, last_commission_id, commissions, resellers, sales_amount, commission_amount, created_at, updated_at)"
+            " SELECT MIN(id), MAX(id), COUNT(*), COUNT(DISTINCT reseller_id),"
+            " COALESCE(SUM(base_amount), 0), COALESCE(SUM(commission_amount), 0), CURRENT_TIMESTAMP, CURRENT_TIMESTAMP"
+            " FROM resellercommission"
+        )
+        legacy_id = bind.execute(sa.text("SELECT MAX(id) FROM resellersettlement")).scalar()
+        op.execute(sa.text("UPDATE resellercommission SET settlement_id = :legacy_id").bindparams(legacy_id=legacy_id))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_resellercommission_reseller_status', table_name='resellercommission')
+    op.drop_index('ix_resellercommission_payment_id', table_name='resellercommission')
+    op.drop_index('ix_resellercommission_settlement_id', table_name='resellercommission')
+    with op.batch_alter_table('resellercommission') as batch_op:
+        batch_op.drop_constraint('fk_resellercommission_payment_id', type_='foreignkey')
+        batch_op.drop_constraint('fk_resellercommission_settlement_id', type_='foreignkey')
+        batch_op.drop_column('payment_id')
+        batch_op.drop_column('settlement_id')
+    bind = op.get_bind()
+    marker = sa.text("SELECT COUNT(*) FROM botsettings WHERE `key` = :key").bindparams(key=CREATED_MARKER)
+    if bind.execute(marker).scalar():
+        op.drop_index('ix_resellersettlement_id', table_name='resellersettlement')
+        op.drop_table('resellersettlement')
+        op.execute(sa.text("DELETE FROM botsettings WHERE `key` = :key").bindparams(key=CREATED_MARKER))
@@ -0,0 +1,26 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_revenue_rollups'
+down_revision = '20261018_add_gift_progress_columns'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('transaction') as batch_op:
+        batch_op.add_column(sa.Column('plan_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_transaction_plan_id', 'plan', ['plan_id'], ['id'])
+    # One row per day so the rollups can upsert into it
+    op.drop_index('ix_dailystats_date', table_name='dailystats')
+    op.create_index('ix_dailystats_date', 'dailystats', ['date'], unique=True)
+    # revenuerollup / userrevenuerollup are new tables, created by create_all
+
+
+def downgrade() -> None:
+    op.drop_index('ix_dailystats_date', table_name='dailystats')
+    op.create_index('ix_dailystats_date', 'dailystats', ['date'])
+    with op.batch_alter_table('transaction') as batch_op:
+        batch_op.drop_constraint('fk_transaction_plan_id', type_='foreignkey')
+        batch_op.drop_column('plan_id')
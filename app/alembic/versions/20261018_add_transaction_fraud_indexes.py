@@ -0,0 +1,18 @@
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_transaction_fraud_indexes'
+down_revision = '20261018_add_activity_log_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Fraud features read a user's history newest first and look up reused receipts
+    op.create_index('ix_transaction_user_created', 'transaction', ['user_id', 'created_at'])
+    op.create_index('ix_transaction_receipt_image_file_id', 'transaction', ['receipt_image_file_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_transaction_receipt_image_file_id', table_name='transaction')
+    op.drop_index('ix_transaction_user_created', table_name='transaction')
@@ -0,0 +1,84 @@
+import os
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+
+from core.config import settings
+from core.db import get_db_session
+from models.user import TelegramUser
+from services.export_service import ExportService, ExportError, EXPORTS
+from webapp.api import verify_telegram_auth
+
+
+router = APIRouter(prefix="/api/admin/exports", tags=["exports"])
+
+
+async def require_admin(user_data: dict = Depends(verify_telegram_auth)) -> dict:
+    telegram_id = int(user_data.get("id") or 0)
+    if telegram_id in set(settings.admin_ids):
+        return user_data
+    async with get_db_session() as session:
+        user = (await session.execute(
+            select(TelegramUser).where(TelegramUser.telegram_user_id == telegram_id)
+        )).scalar_one_or_none()
+    if not user or not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user_data
+
+
+@router.get("/{kind}.csv")
+async def export_csv(
+    kind: str,
+    start: Optional[date] = Query(None, description="first day, YYYY-MM-DD"),
+    end: Optional[date] = Query(None, description="last day (inclusive), YYYY-MM-DD"),
+    _admin: dict = Depends(require_admin),
+):
+    """Stream a table as CSV straight from a server-side cursor"""
+    if kind not in EXPORTS:
+        raise HTTPException(status_code=404, detail=f"Unknown export: {kind}")
+
+    start_at = datetime.combine(start, datetime.min.time()) if start else None
+    end_at = datetime.combine(end + timedelta(days=1), datetime.min.time()) if end else None
+    filename = ExportService.file_name(kind, "csv", start_at, end_at)
+    return StreamingResponse(
+        ExportService.iter_csv(kind, start_at, end_at),
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/{kind}.xlsx")
+async def export_xlsx(
+    kind: str,
+    start: Optional[date] = Query(None, description="first day, YYYY-MM-DD"),
+    end: Optional[date] = Query(None, description="last day (inclusive), YYYY-MM-DD"),
+    _admin: dict = Depends(require_admin),
+):
+    """Build an XLSX in a temp file (the format cannot be streamed) and stream the file"""
+    if kind not in EXPORTS:
+        raise HTTPException(status_code=404, detail=f"Unknown export: {kind}")
+
+    start_at = datetime.combine(start, datetime.min.time()) if start else None
+    end_at = datetime.combine(end + timedelta(days=1), datetime.min.time()) if end else None
+    try:
+        path, _total = await ExportService.export_to_file(kind, "xlsx", start_at, end_at)
+    except ExportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    def iter_file():
+        try:
+            with open(path, "rb") as f:
+                while chunk := f.read(1024 * 1024):
+                    yield chunk
+        finally:
+            os.unlink(path)
+
+    filename = ExportService.file_name(kind, "xlsx", start_at, end_at)
+    return StreamingResponse(
+        iter_file(),
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -6,6 +6,7 @@ from pathlib import Path
 
 from core.config import settings
 from core.db import init_db_schema
+from services.activity_log import activity_log
 
 app = FastAPI(title="VPN Bot API", version="0.1.0")
 BASE_DIR = Path(__file__).resolve().parent.parent  # /app/api -> /app
@@ -33,6 +34,11 @@ async def _startup():
     except Exception:
         pass
 
+@app.on_event("shutdown")
+async def _shutdown():
+    # Write activity events still queued in this process
+    await activity_log.close()
+
 # Serve WebApp index at root
 @app.get("/", response_class=HTMLResponse)
 async def root_index():
@@ -50,3 +56,16 @@ except Exception:
     # Avoid crashing API if webapp not present in some builds
     pass
 
+# Admin exports (CSV/XLSX)
+try:
+    from api.exports import router as exports_router
+    app.include_router(exports_router)
+except Exception:
+    pass
+
+# Admin analytics reports
+try:
+    from api.reports import router as reports_router
+    app.include_router(reports_router)
+except Exception:
+    pass
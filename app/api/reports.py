@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from api.exports import require_admin
+from core.db import get_db_session
+from services.cohort_report_service import CohortReportService, PERIODS, DIMENSIONS
+
+
+router = APIRouter(prefix="/api/admin/reports", tags=["reports"])
+
+
+@router.get("/cohorts")
+async def cohort_report(
+    period: str = Query("month", description="week or month"),
+    dimension: str = Query("signup", description="signup, plan, server or referral"),
+    cohorts: int = Query(12, ge=1, le=104, description="number of most recent cohorts"),
+    _admin: dict = Depends(require_admin),
+):
+    """Retention and renewal-rate matrix per signup cohort (cached for the day)"""
+    if period not in PERIODS:
+        raise HTTPException(status_code=400, detail=f"Unknown period: {period}")
+    if dimension not in DIMENSIONS:
+        raise HTTPException(status_code=400, detail=f"Unknown dimension: {dimension}")
+
+    async with get_db_session() as session:
+        return await CohortReportService.get_report(session, period, dimension, cohorts)
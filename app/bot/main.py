@@ -12,6 +12,9 @@ from aiogram.fsm.storage.memory import MemoryStorage
 from core.config import settings
 from core.db import init_db_schema, get_db_session
 from models.user import TelegramUser
+from services.activity_log import activity_log
+from services.notification_dispatcher import notification_dispatcher
+from services.scheduled_jobs import build_scheduler
 
 from .keyboards import main_menu_kb
 from .routers import user_main
@@ -43,6 +46,7 @@ from .routers import financial_reports as financial_reports_router
 from .routers import scheduled_messages as scheduled_messages_router
 from .routers import webapp_entry as webapp_entry_router
 from .routers import refund_system as refund_system_router
+from .routers import jobs as jobs_router
 
 
 router = Router()
@@ -147,10 +151,27 @@ async def main() -> None:
     dp.include_router(scheduled_messages_router.router)
     dp.include_router(webapp_entry_router.router)
     dp.include_router(refund_system_router.router)
+    dp.include_router(jobs_router.router)
 
     bot = Bot(token=settings.bot_token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
     await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+
+    dispatcher_task = None
+    if settings.notification_dispatcher_enabled:
+        dispatcher_task = asyncio.create_task(notification_dispatcher.run(bot))
+    scheduler = None
+    if settings.scheduler_enabled:
+        scheduler = build_scheduler()
+        await scheduler.start()
+    try:
+        await dp.start_polling(bot)
+    finally:
+        if scheduler:
+            await scheduler.stop()
+        if dispatcher_task:
+            notification_dispatcher.stop()
+            await dispatcher_task
+        await activity_log.close()
 
 
 if __name__ == "__main__":
@@ -14,6 +14,7 @@ from services.purchases import create_service_after_payment
 from services.qrcode_gen import generate_qr_with_template
 from services.admin_dashboard import AdminDashboardService
 from services.payment_processor import PaymentProcessor
+from services.sales_counters import SalesCounterService
 from bot.inline import admin_review_tx_kb, admin_manage_servers_kb, admin_manage_categories_kb, admin_manage_plans_kb, admin_transaction_actions_kb, user_profile_actions_kb, broadcast_options_kb
 from datetime import datetime
 from bot.inline import admin_approve_add_service_kb
@@ -2545,6 +2546,7 @@ async def server_status(message: Message):
         servers = (await session.execute(
             select(Server).order_by(Server.sort_order)
         )).scalars().all()
+        counters = await SalesCounterService.get_many(session, "server", [server.id for server in servers])
     
     if not servers:
         await message.answer("سروری ثبت نشده است.")
@@ -2568,6 +2570,14 @@ async def server_status(message: Message):
         status_text += f"{status_emoji} {server.name}\n"
         status_text += f"   نوع: {server.panel_type}\n"
         status_text += f"   اتصالات: {connections_info}\n"
+        counter = counters.get(server.id)
+        active_services = counter.active_services if counter else 0
+        load_info = f"{active_services}"
+        if server.capacity_limit:
+            load_info += f"/{server.capacity_limit} ({active_services / server.capacity_limit * 100:.0f}%)"
+        status_text += f"   سرویس‌های فعال: {load_info}\n"
+        if counter:
+            status_text += f"   فروش: {counter.sales_count} ({counter.revenue:,.0f} تومان)\n"
         status_text += f"   همگام‌سازی: {sync_emoji} {server.sync_status}\n"
         if server.last_sync_at:
             status_text += f"   آخرین همگام‌سازی: {server.last_sync_at.strftime('%m/%d %H:%M')}\n"
@@ -2699,11 +2709,12 @@ async def gift_bulk_criteria(message: Message, state: FSMContext):
 async def gift_amount(message: Message, state: FSMContext):
     txt = (message.text or "").strip().replace(",", "")
     try:
-        amount = int(float(txt))
+        amount = float(txt)
     except Exception:
         await message.answer("عدد نامعتبر. دوباره ارسال کنید:")
         return
-    await state.update_data(amount=amount)
+    # Fractional GB is refused when the gift is created instead of being truncated here
+    await state.update_data(amount=int(amount) if amount.is_integer() else amount)
     await state.set_state(GiftStates.waiting_description)
     await message.answer("توضیحات هدیه را وارد کنید (اختیاری، خالی برای رد شدن):")
 
@@ -2714,7 +2725,17 @@ async def gift_finalize(message: Message, state: FSMContext):
     data = await state.get_data()
     gift_type = data.get("gift_type")  # wallet | traffic
     mode = data.get("mode")            # user | bulk
-    amount = int(data.get("amount", 0))
+    amount = data.get("amount", 0)
+    if gift_type == "wallet":
+        amount = int(amount)
+    else:
+        from services.gift_service import GiftService, GiftAmountError
+        try:
+            amount = GiftService.whole_gb(amount)
+        except GiftAmountError:
+            await message.answer(_gift_amount_error(amount))
+            await state.clear()
+            return
     admin_chat_id = message.from_user.id
     async with get_db_session() as session:
         from sqlalchemy import select
@@ -2747,42 +2768,87 @@ async def gift_finalize(message: Message, state: FSMContext):
                 pass
             await message.answer("✅ هدیه اعمال شد.")
         else:
-            # bulk gift: select recipients via service
+            # bulk gift: queued and applied in chunks by the gifts.process background job
+            from services.gift_service import GiftService, GiftAmountError
             criteria = data.get("bulk_criteria") or {}
             try:
-                recipients = await ScheduledMessageService._generate_recipient_list(session=session, target_type="segment", target_users=None, target_segments=[criteria.get("segment", "active_users")])
-            except Exception:
-                recipients = []
-            total = len(recipients)
-            processed = 0
-            g = GiftModel(from_admin_id=(admin_user.id if admin_user else 0), to_user_id=None, type=("wallet_balance" if gift_type=="wallet" else "traffic_gb"), amount=amount, description=desc or None, is_bulk=True, target_criteria=(json.dumps(criteria) if criteria else None), total_count=total, processed_count=0, status="processing")
-            session.add(g)
-            await session.flush()
-            # naive immediate processing
-            from sqlalchemy import select as _select
-            for uid in recipients:
-                user = (await session.execute(_select(TelegramUser).where(TelegramUser.id == uid))).scalar_one_or_none()
-                if not user:
-                    continue
-                if gift_type == "wallet":
-                    user.wallet_balance = (user.wallet_balance or 0) + amount
-                else:
-                    from models.service import Service
-                    services = (await session.execute(_select(Service).where(Service.user_id == user.id, Service.is_active == True))).scalars().all()
-                    for svc in services:
-                        current = float(svc.traffic_limit_gb or 0)
-                        svc.traffic_limit_gb = current + amount
-                processed += 1
-                try:
-                    await message.bot.send_message(chat_id=user.telegram_user_id, text=f"🎁 هدیه گروهی برای شما اعمال شد: {('موجودی '+str(amount)+' تومان' if gift_type=='wallet' else str(amount)+' گیگ ترافیک')}.")
-                except Exception:
-                    pass
-            g.processed_count = processed
-            g.status = "completed"
-            await message.answer(f"✅ هدیه گروهی اعمال شد برای {processed} کاربر از {total}.")
+                g = await GiftService.create_bulk_gift(
+                    session,
+                    from_admin_id=(admin_user.id if admin_user else 0),
+                    gift_type=("wallet_balance" if gift_type == "wallet" else "traffic_gb"),
+                    amount=amount,
+                    criteria=criteria,
+                    description=desc or None,
+                )
+            except GiftAmountError:
+                await message.answer(_gift_amount_error(amount))
+                await state.clear()
+                return
+            except ValueError:
+                await message.answer("سگمنت نامعتبر است.")
+                await state.clear()
+                return
+            gift_id, total = g.id, g.total_count
+    if mode != "user":
+        await message.answer(
+            f"⏳ هدیه گروهی #{gift_id} برای {total} کاربر در صف اجرا قرار گرفت.\n"
+            "پس از پایان، نتیجه برای شما ارسال می‌شود.",
+            reply_markup=_gift_progress_kb(gift_id)
+        )
     await state.clear()
 
 
+def _gift_amount_error(amount) -> str:
+    return f"مقدار ترافیک باید عدد صحیح مثبت (گیگابایت) باشد؛ {amount:g} پذیرفته نیست."
+
+
+def _gift_progress_kb(gift_id: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🔄 وضعیت پیشرفت", callback_data=f"giftprog:{gift_id}")]
+    ])
+
+
+@router.callback_query(F.data.startswith("giftprog:"))
+async def gift_progress(callback: CallbackQuery):
+    if not await _is_admin(callback.from_user.id):
+        await callback.answer("اجازه ندارید", show_alert=True)
+        return
+    gift_id = int(callback.data.split(":")[1])
+    async with get_db_session() as session:
+        from sqlalchemy import select, func
+        from models.admin import Gift as GiftModel, GiftPanelPush
+        g = (await session.execute(select(GiftModel).where(GiftModel.id == gift_id))).scalar_one_or_none()
+        push_counts = dict((await session.execute(
+            select(GiftPanelPush.status, func.count(GiftPanelPush.id))
+            .where(GiftPanelPush.gift_id == gift_id)
+            .group_by(GiftPanelPush.status)
+        )).all())
+    if not g:
+        await callback.answer("هدیه یافت نشد", show_alert=True)
+        return
+    status_titles = {"pending": "در صف", "processing": "در حال اجرا", "completed": "تکمیل شده", "failed": "ناموفق"}
+    total = g.total_count or 0
+    percent = (g.processed_count * 100 // total) if total else 100
+    text = (
+        f"🎁 هدیه گروهی #{g.id}\n"
+        f"وضعیت: {status_titles.get(g.status, g.status)}\n"
+        f"پیشرفت: {g.processed_count}/{total} ({percent}%)"
+    )
+    if push_counts:
+        text += (
+            f"\nارسال به پنل: {push_counts.get('done', 0)} انجام شده، "
+            f"{push_counts.get('pending', 0)} در انتظار، {push_counts.get('failed', 0)} ناموفق"
+        )
+    if g.error_message:
+        text += f"\nخطا: {g.error_message[:200]}"
+    finished = g.status in ("completed", "failed") and not push_counts.get("pending")
+    try:
+        await callback.message.edit_text(text, reply_markup=None if finished else _gift_progress_kb(g.id))
+    except Exception:
+        pass  # unchanged text
+    await callback.answer()
+
+
 @router.message(F.text == "🏷️ مدیریت تخفیف‌ها")
 async def admin_discounts_menu(message: Message):
     if not await _is_admin(message.from_user.id):
@@ -10,6 +10,7 @@ from core.db import get_db_session
 from models.user import TelegramUser
 from models.advanced_reseller import ResellerLevel, ResellerStatus
 from services.advanced_reseller_service import AdvancedResellerService
+from services.reseller_ledger import ResellerLedgerService
 
 
 router = Router(name="advanced_reseller")
@@ -490,6 +491,9 @@ async def process_commissions(message: Message):
         return
     
     try:
+        # Bring the reseller totals up to date with the commission ledger first
+        await ResellerLedgerService.settle()
+        
         async with get_db_session() as session:
             from sqlalchemy import select
             admin_user = (await session.execute(
@@ -533,6 +537,34 @@ async def process_commissions(message: Message):
         await message.answer(f"❌ خطا در پردازش کمیسیون‌ها: {str(e)}")
 
 
+@router.message(Command("move_reseller"))
+async def move_reseller(message: Message):
+    if not await _is_admin(message.from_user.id):
+        await message.answer("دسترسی ندارید")
+        return
+    
+    command_parts = message.text.split()
+    if len(command_parts) < 3:
+        await message.answer("فرمت: /move_reseller <reseller_id> <parent_id یا 0>")
+        return
+    
+    try:
+        reseller_id = int(command_parts[1])
+        parent_id = int(command_parts[2]) or None
+    except ValueError:
+        await message.answer("شناسه نماینده نامعتبر است.")
+        return
+    
+    try:
+        async with get_db_session() as session:
+            reseller = await AdvancedResellerService.move_reseller(session, reseller_id, parent_id)
+        
+        await message.answer(f"✅ نماینده {reseller.business_name or reseller.id} منتقل شد.")
+        
+    except Exception as e:
+        await message.answer(f"❌ خطا در انتقال نماینده: {str(e)}")
+
+
 @router.message(Command("reseller_help"))
 async def reseller_help(message: Message):
     help_text = """
@@ -549,6 +581,7 @@ async def reseller_help(message: Message):
 • /approve_reseller <id> - تایید نماینده
 • /reseller_stats - آمار نمایندگان
 • /process_commissions - پردازش کمیسیون‌ها
+• /move_reseller <id> <parent_id> - انتقال نماینده
 
 🏆 سطوح نمایندگی:
 • 🥉 برنزی - شروع کار
@@ -1,3 +1,4 @@
+import json
 from datetime import datetime, timedelta
 from aiogram import Router, F
 from aiogram.filters import Command
@@ -8,6 +9,7 @@ from core.db import get_db_session
 from models.user import TelegramUser
 from models.anti_fraud import FraudType, FraudSeverity, FraudAction
 from services.anti_fraud_service import AntiFraudService
+from services.fraud_rules import FraudRuleEngine
 
 
 router = Router(name="anti_fraud")
@@ -375,7 +377,7 @@ async def fraud_rules(message: Message):
         status = "✅" if rule.is_active else "❌"
         auto_action = "🤖" if rule.auto_action else "👤"
         
-        rules_text += f"{i}. {status} {auto_action} {rule.name}\n"
+        rules_text += f"{i}. {status} {auto_action} {rule.name} (#{rule.id})\n"
         rules_text += f"   نوع: {rule.fraud_type.value}\n"
         rules_text += f"   شدت: {rule.severity.value}\n"
         rules_text += f"   اقدام: {rule.action.value}\n"
@@ -385,6 +387,92 @@ async def fraud_rules(message: Message):
     await message.answer(rules_text)
 
 
+@router.message(Command("edit_fraud_rule"))
+async def edit_fraud_rule(message: Message):
+    if not await _is_admin(message.from_user.id):
+        await message.answer("دسترسی ندارید")
+        return
+    
+    usage = (
+        "فرمت: /edit_fraud_rule <rule_id> <field> <value>\n"
+        "فیلدها: active on|off، auto on|off، threshold <0-1>، action <warn|suspend|block|delete_config|investigate>، criteria <json>"
+    )
+    parts = (message.text or "").split(maxsplit=3)
+    if len(parts) < 4:
+        await message.answer(usage)
+        return
+    
+    try:
+        rule_id = int(parts[1])
+    except ValueError:
+        await message.answer("شناسه قانون نامعتبر است.")
+        return
+    field, value = parts[2].lower(), parts[3].strip()
+    
+    async with get_db_session() as session:
+        from sqlalchemy import select
+        from models.anti_fraud import FraudRule
+        
+        rule = (await session.execute(select(FraudRule).where(FraudRule.id == rule_id))).scalar_one_or_none()
+        if not rule:
+            await message.answer("قانون یافت نشد.")
+            return
+        
+        try:
+            if field == "active":
+                rule.is_active = value.lower() in {"on", "1", "true", "yes"}
+            elif field == "auto":
+                rule.auto_action = value.lower() in {"on", "1", "true", "yes"}
+            elif field == "threshold":
+                threshold = float(value)
+                if not 0 <= threshold <= 1:
+                    raise ValueError("threshold must be between 0 and 1")
+                rule.threshold = threshold
+            elif field == "action":
+                rule.action = FraudAction(value.lower())
+            elif field == "criteria":
+                criteria = json.loads(value)
+                if not isinstance(criteria, dict):
+                    raise ValueError("criteria must be a JSON object")
+                rule.criteria = json.dumps(criteria)
+            else:
+                await message.answer(usage)
+                return
+        except ValueError as e:
+            await message.answer(f"❌ مقدار نامعتبر: {e}")
+            return
+        
+        # Every process picks up the new rule set once this commits
+        await FraudRuleEngine.bump_version(session)
+    
+    await message.answer(f"✅ قانون {rule.name} به‌روزرسانی شد.")
+
+
+@router.message(Command("fraud_rule_stats"))
+async def fraud_rule_stats(message: Message):
+    if not await _is_admin(message.from_user.id):
+        await message.answer("دسترسی ندارید")
+        return
+    
+    async with get_db_session() as session:
+        rules = {rule.id: rule for rule in await FraudRuleEngine.rules(session)}
+    
+    timings = FraudRuleEngine.slowest()
+    if not timings:
+        await message.answer(f"هنوز قانونی اجرا نشده است. ({len(rules)} قانون فعال)")
+        return
+    
+    text = "⏱️ زمان اجرای قوانین (از آخرین راه‌اندازی):\n\n"
+    for rule_id, timing in timings:
+        rule = rules.get(rule_id)
+        name = rule.name if rule else f"#{rule_id} (غیرفعال)"
+        text += f"• {name}\n"
+        text += f"   اجرا: {timing.calls} | فعال شده: {timing.triggered} | خطا: {timing.errors}\n"
+        text += f"   میانگین: {timing.avg_us:.1f}µs | بیشترین: {timing.max_ns / 1000:.1f}µs\n"
+    
+    await message.answer(text)
+
+
 @router.message(Command("fraud_alerts"))
 async def fraud_alerts(message: Message):
     if not await _is_admin(message.from_user.id):
@@ -447,11 +535,13 @@ async def fraud_help(message: Message):
 • /recent_fraud_detections - آخرین تشخیص‌ها
 • /fraud_detection_details <id> - جزئیات تشخیص
 • /fraud_rules - قوانین ضد کلاهبرداری
+• /fraud_rule_stats - زمان اجرای قوانین
 • /fraud_alerts - هشدارهای کلاهبرداری
 
 🔧 دستورات مدیریت:
 • /blacklist_user <user_id> - اضافه به سیاه‌لیست
 • /whitelist_user <user_id> - اضافه به سفید‌لیست
+• /edit_fraud_rule <rule_id> <field> <value> - ویرایش قانون
 
 🔍 انواع کلاهبرداری:
 • رسید جعلی - رسیدهای تقلبی
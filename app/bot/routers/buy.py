@@ -15,6 +15,7 @@ from models.billing import Transaction
 from models.orders import PurchaseIntent
 from services.purchases import create_service_after_payment
 from services.qrcode_gen import generate_qr_with_template
+from services.receipt_hash import ReceiptHashService
 from bot.inline import admin_review_tx_kb
 from services.join_guard import is_join_required_and_missing
 from services.join_guard import build_join_keyboard
@@ -238,6 +239,7 @@ async def pay_with_wallet(callback: CallbackQuery, state: FSMContext):
                 type="purchase",
                 status="approved",
                 description=f"Purchase plan #{plan.id} via wallet",
+                plan_id=plan.id,
             )
             session.add(tx)
 
@@ -260,6 +262,7 @@ async def pay_with_wallet(callback: CallbackQuery, state: FSMContext):
                         type="purchase",
                         status="approved",
                         description=f"Partial wallet deduction for plan #{plan.id}",
+                        plan_id=plan.id,
                     )
                 )
             intent = PurchaseIntent(
@@ -340,6 +343,7 @@ async def start_receipt_flow(callback: CallbackQuery, state: FSMContext):
                     type="purchase",
                     status="approved",
                     description=f"Partial wallet deduction for plan #{plan.id}",
+                    plan_id=plan.id,
                 )
             )
         # Persist intent with alias for later creation
@@ -383,6 +387,7 @@ async def receive_purchase_receipt(message: Message, state: FSMContext):
     data = await state.get_data()
     intent_id = data.get("purchase_intent_id")
     file_id = message.photo[-1].file_id
+    receipt_hash = await ReceiptHashService.hash_telegram_file(message.bot, file_id)
 
     async with get_db_session() as session:
         from sqlalchemy import select
@@ -399,7 +404,9 @@ async def receive_purchase_receipt(message: Message, state: FSMContext):
             type="purchase_receipt",
             status="pending",
             description=f"Receipt for plan #{intent.plan_id}",
+            plan_id=intent.plan_id,
             receipt_image_file_id=file_id,
+            receipt_image_hash=receipt_hash,
         )
         session.add(tx)
         await session.flush()
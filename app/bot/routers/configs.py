@@ -66,6 +66,8 @@ async def svc_renew(callback: CallbackQuery):
             return
         client = get_panel_client("mock")
         await client.renew_service(svc.uuid, add_days=30)
+        # Cohort reports read renewals from this counter
+        svc.renewal_count = Service.renewal_count + 1
     await callback.message.answer(f"تمدید ۳۰ روز انجام شد برای سرویس #{svc_id}")
     await callback.answer()
 
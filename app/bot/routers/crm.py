@@ -196,6 +196,8 @@ async def crm_dashboard(message: Message):
         level_name = engagement_names.get(level, level)
         dashboard_text += f"• {level_name}: {count}\n"
     
+    dashboard_text += f"\n🕒 به‌روزرسانی: {analytics['as_of']:%Y-%m-%d %H:%M} UTC"
+    
     await message.answer(dashboard_text)
 
 
@@ -474,6 +476,12 @@ async def update_crm_metrics(message: Message):
         return
     
     async with get_db_session() as session:
-        await CRMService.update_daily_metrics(session)
-    
-    await message.answer("✅ معیارهای CRM به‌روزرسانی شد.")
\ No newline at end of file
+        report = await CRMService.update_daily_metrics(session)
+    
+    await message.answer(
+        "✅ معیارهای CRM به‌روزرسانی شد.\n\n"
+        f"📅 روزهای عدم فعالیت: {report['days_updated']:,}\n"
+        f"🔴 ریزش‌کرده: {report['churned']:,}\n"
+        f"🟡 در معرض ریزش: {report['at_risk']:,}\n"
+        f"🔄 شمارنده‌های هفتگی: {report['counters_reset']:,}"
+    )
\ No newline at end of file
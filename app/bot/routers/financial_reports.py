@@ -1,12 +1,15 @@
+import os
 from datetime import datetime, timedelta
 from aiogram import Router, F
 from aiogram.filters import Command
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile
 
 from core.config import settings
 from core.db import get_db_session
 from models.user import TelegramUser
 from services.financial_report_service import FinancialReportService
+from services.export_service import ExportService, ExportError, EXPORTS, FORMATS
+from services.cohort_report_service import CohortReportService, PERIODS, DIMENSIONS
 
 
 router = Router(name="financial_reports")
@@ -396,12 +399,18 @@ async def financial_help(message: Message):
 • /profit_loss_report <شروع> <پایان> - گزارش سود و زیان
 • /trend_analysis [روزها] - تحلیل روند
 • /custom_report - گزارش سفارشی
+• /cohort_report [week|month] [signup|plan|server|referral] - نگهداشت و تمدید کوهورت‌ها
+
+📁 خروجی فایل:
+• /export <transactions|users|services> [csv|xlsx] [شروع] [پایان]
 
 📋 مثال‌های استفاده:
 • /daily_report 2024-01-15
 • /monthly_report 2024 1
 • /profit_loss_report 2024-01-01 2024-01-31
 • /trend_analysis 14
+• /cohort_report month plan
+• /export transactions xlsx 2024-01-01 2024-12-31
 
 📊 اطلاعات موجود:
 • درآمد و تراکنش‌ها
@@ -420,4 +429,95 @@ async def financial_help(message: Message):
 • تحلیل‌های مقایسه‌ای
 """
     
-    await message.answer(help_text)
\ No newline at end of file
+    await message.answer(help_text)
+
+
+# Telegram bots may upload documents of at most 50 MB
+TELEGRAM_DOCUMENT_LIMIT = 50 * 1024 * 1024
+
+
+@router.message(Command("export"))
+async def export_data(message: Message):
+    if not await _is_admin(message.from_user.id):
+        await message.answer("دسترسی ندارید")
+        return
+    
+    parts = message.text.split()[1:]
+    usage = "فرمت: /export <transactions|users|services> [csv|xlsx] [YYYY-MM-DD] [YYYY-MM-DD]"
+    if not parts or parts[0] not in EXPORTS:
+        await message.answer(usage)
+        return
+    
+    kind = parts[0]
+    fmt = "csv"
+    if len(parts) > 1 and parts[1] in FORMATS:
+        fmt = parts[1]
+        parts = parts[:1] + parts[2:]
+    
+    start_date = end_date = None
+    try:
+        if len(parts) > 1:
+            start_date = datetime.strptime(parts[1], "%Y-%m-%d")
+        if len(parts) > 2:
+            # The end date is inclusive
+            end_date = datetime.strptime(parts[2], "%Y-%m-%d") + timedelta(days=1)
+    except ValueError:
+        await message.answer("فرمت تاریخ نامعتبر است. از YYYY-MM-DD استفاده کنید.")
+        return
+    
+    await message.answer("⏳ در حال آماده‌سازی فایل...")
+    path = None
+    try:
+        path, total = await ExportService.export_to_file(kind, fmt, start_date, end_date)
+        if os.path.getsize(path) > TELEGRAM_DOCUMENT_LIMIT:
+            await message.answer("❌ حجم فایل بیش از حد مجاز تلگرام است. بازه کوتاه‌تری انتخاب کنید یا از API خروجی استفاده کنید.")
+            return
+        await message.answer_document(
+            FSInputFile(path, filename=ExportService.file_name(kind, fmt, start_date, end_date)),
+            caption=f"📁 {kind}: {total:,} ردیف"
+        )
+    except ExportError as e:
+        await message.answer(f"❌ {e}")
+    except Exception as e:
+        await message.answer(f"❌ خطا در تولید خروجی: {str(e)}")
+    finally:
+        if path and os.path.exists(path):
+            os.unlink(path)
+
+
+@router.message(Command("cohort_report"))
+async def cohort_report(message: Message):
+    if not await _is_admin(message.from_user.id):
+        await message.answer("دسترسی ندارید")
+        return
+    
+    parts = message.text.split()[1:]
+    period = parts[0] if parts else "month"
+    dimension = parts[1] if len(parts) > 1 else "signup"
+    if period not in PERIODS or dimension not in DIMENSIONS:
+        await message.answer("فرمت: /cohort_report [week|month] [signup|plan|server|referral]")
+        return
+    
+    try:
+        async with get_db_session() as session:
+            report = await CohortReportService.get_report(session, period, dimension, cohorts=8)
+    except Exception as e:
+        await message.answer(f"❌ خطا در تولید گزارش: {str(e)}")
+        return
+    
+    if not report["cohorts"]:
+        await message.answer("داده‌ای برای این بازه وجود ندارد")
+        return
+    
+    unit = "هفته" if period == "week" else "ماه"
+    text = f"👥 نگهداشت کوهورت‌ها ({unit}، {dimension})\n"
+    text += f"درصد کاربران پرداخت‌کننده در {unit} 0، 1، 2، ... پس از ثبت‌نام\n\n"
+    for row in report["cohorts"]:
+        retention = " ".join(f"{value * 100:.0f}%" for value in row["retention"][:6])
+        segment = "" if dimension == "signup" else f" | {row['segment']}"
+        text += f"📅 {row['cohort']}{segment} ({row['size']:,} کاربر)\n"
+        text += f"   {retention}\n"
+        text += f"   🔄 نرخ تمدید: {row['renewal_rate'] * 100:.1f}%\n"
+    
+    # Telegram messages are limited to 4096 characters
+    await message.answer(text[:4000])
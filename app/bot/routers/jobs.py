@@ -0,0 +1,51 @@
+from aiogram import Router
+from aiogram.filters import Command
+from aiogram.types import Message
+from sqlalchemy import select
+
+from core.config import settings
+from core.db import get_db_session
+from models.user import TelegramUser
+from models.scheduler import JobLease
+
+
+router = Router(name="jobs")
+
+
+async def _is_admin(telegram_id: int) -> bool:
+    if telegram_id in set(settings.admin_ids):
+        return True
+    async with get_db_session() as session:
+        user = (
+            await session.execute(select(TelegramUser).where(TelegramUser.telegram_user_id == telegram_id))
+        ).scalar_one_or_none()
+        return bool(user and user.is_admin)
+
+
+@router.message(Command("jobs"))
+async def jobs_status(message: Message):
+    if not await _is_admin(message.from_user.id):
+        await message.answer("دسترسی ندارید")
+        return
+    
+    async with get_db_session() as session:
+        leases = (await session.execute(select(JobLease).order_by(JobLease.job_name))).scalars().all()
+    
+    if not leases:
+        await message.answer("هیچ کار زمان‌بندی شده‌ای ثبت نشده است.")
+        return
+    
+    status_icons = {"success": "✅", "failed": "❌", "timeout": "⏱"}
+    text = "⚙️ کارهای پس‌زمینه:\n\n"
+    for lease in leases:
+        icon = status_icons.get(lease.last_status, "⏳")
+        text += f"{icon} {lease.job_name}\n"
+        if lease.last_finished_at:
+            text += f"   آخرین اجرا: {lease.last_finished_at.strftime('%m/%d %H:%M:%S')} ({lease.last_duration_ms} ms)\n"
+        text += f"   اجرا: {lease.run_count} | خطا: {lease.failure_count}\n"
+        if lease.owner:
+            text += f"   اجراکننده: {lease.owner}\n"
+        if lease.last_error:
+            text += f"   خطا: {lease.last_error[:100]}\n"
+    
+    await message.answer(text)
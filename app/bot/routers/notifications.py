@@ -234,9 +234,9 @@ async def check_expiries(message: Message):
     
     try:
         async with get_db_session() as session:
-            await NotificationService.check_service_expiries(session)
+            queued_count = await NotificationService.check_service_expiries(session)
         
-        await message.answer("✅ بررسی انقضاهای سرویس تکمیل شد.")
+        await message.answer(f"✅ بررسی انقضاهای سرویس تکمیل شد. ({queued_count} اعلان جدید)")
         
     except Exception as e:
         await message.answer(f"❌ خطا در بررسی انقضاها: {str(e)}")
@@ -11,6 +11,7 @@ from core.db import get_db_session
 from models.smart_discounts import SmartDiscount, CashbackRule, DiscountType
 from models.user import TelegramUser
 from services.smart_discount_service import SmartDiscountService
+from services.discount_index import SmartDiscountIndex
 
 
 router = Router(name="smart_discounts")
@@ -209,6 +210,8 @@ async def add_smart_discount_targets(message: Message, state: FSMContext):
             priority=0
         )
         session.add(smart_discount)
+        # Every process re-indexes the discounts once this commits
+        await SmartDiscountIndex.bump_version(session)
     
     await state.clear()
     await message.answer("✅ تخفیف هوشمند با موفقیت اضافه شد!")
@@ -11,6 +11,7 @@ from models.billing import Transaction, PaymentCard
 from models.user import TelegramUser
 from services.payment_processor import PaymentProcessor
 from services.fraud_detection import FraudDetectionService
+from services.receipt_hash import ReceiptHashService
 from bot.inline import admin_review_tx_kb, payment_cards_kb
 from bot.keyboards import wallet_menu_kb, main_menu_kb
 from services.bot_settings import get_int
@@ -89,6 +90,7 @@ async def receive_receipt(message: Message, state: FSMContext):
     data = await state.get_data()
     amount = data["amount"]
     file_id = message.photo[-1].file_id
+    receipt_hash = await ReceiptHashService.hash_telegram_file(message.bot, file_id)
 
     async with get_db_session() as session:
         from sqlalchemy import select
@@ -96,7 +98,7 @@ async def receive_receipt(message: Message, state: FSMContext):
         
         # Process wallet top-up with fraud detection
         tx = await PaymentProcessor.process_wallet_topup(
-            session, me, amount, file_id, f"شارژ کیف پول - {amount:,.0f} تومان"
+            session, me, amount, file_id, f"شارژ کیف پول - {amount:,.0f} تومان", receipt_hash
         )
         
         # Get payment card info
@@ -79,12 +79,54 @@ class Settings(BaseSettings):
     enable_fraud_detection: bool = True
     max_daily_transactions: int = 10
     max_daily_amount: int = 1_000_000
+    risk_counters_max_users: int = 50000  # in-memory velocity counters (see services/risk_counters.py)
+    risk_counters_resync_seconds: int = 600  # reload a user's counters to see other processes' writes
+    receipt_hash_enabled: bool = True  # perceptual hash of receipt photos (see services/receipt_hash.py)
+    receipt_hash_max_distance: int = 10  # differing bits (of 256) still treated as the same image
+    receipt_hash_scoring: bool = False  # score near-duplicate receipts; enable once scripts/backtest_fraud.py shows few false positives
+    fraud_rules_check_seconds: int = 30  # how often other processes look for edited fraud rules
+    fraud_lists_resync_seconds: int = 60  # reload of the in-memory white/blacklists (see services/fraud_lists.py)
+    fraud_blacklist_bloom_capacity: int = 100_000  # blacklisted phones/emails/IPs the Bloom filter is sized for
+    smart_discount_index_check_seconds: int = 30  # how often other processes look for edited smart discounts
+    reseller_settlement_interval_seconds: int = 300  # how often ledger commissions are added to reseller totals
+    reseller_settlement_batch_size: int = 5000  # commissions settled per transaction
 
     # Payment Gateways
     enable_stars: bool = False
     enable_zarinpal: bool = False
     zarinpal_merchant_id: str = ""
 
+    # Notifications
+    notification_dispatcher_enabled: bool = True
+    notification_batch_size: int = 500
+    notification_concurrency: int = 20
+    notification_rate_per_second: float = 25.0  # Telegram allows ~30 msg/s per bot
+    notification_scan_interval_seconds: int = 900
+
+    # Background jobs (in-process scheduler, see core/scheduler.py)
+    scheduler_enabled: bool = True
+    scheduled_message_interval_seconds: int = 30
+    recurring_schedule_check_seconds: int = 30  # how often the schedule runner looks for schedules edited in other processes
+    backup_jobs_enabled: bool = True
+
+    # Reports (daily rollups, see services/revenue_rollup.py)
+    report_rollup_reconcile_days: int = 2  # recent days rebuilt from transactions every night
+    dashboard_cache_seconds: int = 30  # admin dashboard snapshot shared across admins
+    analytics_snapshot_enabled: bool = True  # nightly columnar snapshot; only runs when numpy is installed (optional)
+    analytics_snapshot_dir: str = "data/analytics"
+
+    # Activity log (see services/activity_log.py)
+    activity_log_batch_size: int = 500  # rows per bulk insert
+    activity_log_flush_seconds: float = 1.0
+    activity_log_max_queue: int = 50000  # events beyond this are dropped, not blocking handlers
+    activity_retention_days: int = 180  # older events are pruned once rolled up
+
+    # Partitioning and archival of append-only tables (see services/archive_service.py)
+    archive_enabled: bool = False  # move cold months to archive_dir (instead of pruning them)
+    archive_dir: str = "data/archive"
+    archive_after_months: int = 6  # whole months older than this are archived
+    partition_months_ahead: int = 3  # monthly partitions kept ready in advance
+
     # Misc
     status_url: str = ""
     uptime_robot_api_key: str = ""
@@ -46,3 +46,10 @@ async def init_db_schema() -> None:
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
+
+
+# Keep the report rollups, sales counters and risk counters in step with every
+# session that writes transactions or services
+import services.revenue_rollup  # noqa: E402,F401
+import services.sales_counters  # noqa: E402,F401
+import services.risk_counters  # noqa: E402,F401
@@ -0,0 +1,326 @@
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select, update, or_
+from sqlalchemy.exc import IntegrityError
+
+from core.db import get_db_session
+from models.scheduler import JobLease
+
+
+logger = logging.getLogger(__name__)
+
+
+class IntervalTrigger:
+    """Fire every N seconds"""
+
+    def __init__(self, seconds: float):
+        if seconds <= 0:
+            raise ValueError("Interval must be positive")
+        self.seconds = seconds
+
+    def next_fire(self, after: datetime) -> datetime:
+        return after + timedelta(seconds=self.seconds)
+
+    def __repr__(self) -> str:
+        return f"every {self.seconds:g}s"
+
+
+class CronTrigger:
+    """Five-field cron expression (minute hour day month weekday), evaluated in UTC.
+
+    Supports ``*``, ``*/n``, ``a-b``, ``a-b/n`` and comma lists; weekday 0 and 7 are Sunday.
+    """
+
+    _RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+
+    def __init__(self, expression: str):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression!r}")
+        self.expression = expression
+        fields = []
+        for index, (part, (low, high)) in enumerate(zip(parts, self._RANGES)):
+            values = self._parse_field(part, low, 7 if index == 4 else high)
+            if index == 4:
+                values = {0 if v == 7 else v for v in values}
+            fields.append(values)
+        self.minutes, self.hours, self.days, self.months, self.weekdays = fields
+        self._day_restricted = parts[2] != "*"
+        self._weekday_restricted = parts[4] != "*"
+
+    @staticmethod
+    def _parse_field(part: str, low: int, high: int) -> Set[int]:
+        values: Set[int] = set()
+        for item in part.split(","):
+            step = 1
+            if "/" in item:
+                item, step_str = item.split("/", 1)
+                step = int(step_str)
+            if item == "*":
+                start, end = low, high
+            elif "-" in item:
+                start_str, end_str = item.split("-", 1)
+                start, end = int(start_str), int(end_str)
+            else:
+                start = end = int(item)
+            if start < low or end > high or start > end or step <= 0:
+                raise ValueError(f"Invalid cron field {part!r}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day_ok = moment.day in self.days
+        weekday_ok = (moment.weekday() + 1) % 7 in self.weekdays
+        if self._day_restricted and self._weekday_restricted:
+            return day_ok or weekday_ok
+        if self._day_restricted:
+            return day_ok
+        if self._weekday_restricted:
+            return weekday_ok
+        return True
+
+    def next_fire(self, after: datetime) -> datetime:
+        moment = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + timedelta(days=366 * 5)
+        while moment < limit:
+            if moment.month not in self.months:
+                year, month = (moment.year + 1, 1) if moment.month == 12 else (moment.year, moment.month + 1)
+                moment = moment.replace(year=year, month=month, day=1, hour=0, minute=0)
+            elif not self._day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f"Cron expression never fires: {self.expression!r}")
+
+    def __repr__(self) -> str:
+        return f"cron '{self.expression}'"
+
+
+@dataclass
+class JobStats:
+    runs: int = 0
+    failures: int = 0
+    skipped_overlap: int = 0
+    skipped_not_leader: int = 0
+    last_started_at: Optional[datetime] = None
+    last_duration: Optional[float] = None  # seconds
+    max_duration: float = 0.0
+    total_duration: float = 0.0
+    last_error: Optional[str] = None
+
+    @property
+    def avg_duration(self) -> float:
+        return self.total_duration / self.runs if self.runs else 0.0
+
+
+@dataclass
+class ScheduledJob:
+    name: str
+    func: Callable[[], Awaitable[object]]
+    trigger: object
+    jitter: float = 0.0  # seconds of random delay added to each fire
+    timeout: Optional[float] = None
+    stats: JobStats = field(default_factory=JobStats)
+    next_run_at: Optional[datetime] = None
+    running: bool = False
+
+
+class JobScheduler:
+    """In-process async job scheduler.
+
+    Each job runs in its own loop, so a slow job never delays another and a run
+    never overlaps the previous one. Before every run the scheduler takes a
+    DB-backed lease on the job: the leader keeps renewing it past the next fire
+    time, so with several replicas only one executes each job and another takes
+    over once the leader stops renewing.
+    """
+
+    def __init__(self, lease_grace_seconds: float = 30.0, leader_election: bool = True):
+        self.owner_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.lease_grace = timedelta(seconds=lease_grace_seconds)
+        self.leader_election = leader_election
+        self.jobs: Dict[str, ScheduledJob] = {}
+        self.workers: Dict[str, Tuple[Callable[[], Awaitable[None]], Callable[[], None]]] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._stop_event = asyncio.Event()
+
+    def add_job(
+        self,
+        name: str,
+        func: Callable[[], Awaitable[object]],
+        trigger,
+        jitter: float = 0.0,
+        timeout: Optional[float] = None,
+    ) -> ScheduledJob:
+        if name in self.jobs:
+            raise ValueError(f"Job {name!r} already registered")
+        job = ScheduledJob(name=name, func=func, trigger=trigger, jitter=jitter, timeout=timeout)
+        self.jobs[name] = job
+        return job
+
+    def add_worker(self, name: str, run: Callable[[], Awaitable[None]], stop: Callable[[], None]) -> None:
+        """Register a long-running coroutine started and stopped with the scheduler.
+
+        Workers are not leader-elected; they must be safe to run on every replica.
+        """
+        if name in self.workers:
+            raise ValueError(f"Worker {name!r} already registered")
+        self.workers[name] = (run, stop)
+
+    async def _ensure_lease_rows(self) -> None:
+        async with get_db_session() as session:
+            existing = set((await session.execute(
+                select(JobLease.job_name).where(JobLease.job_name.in_(list(self.jobs)))
+            )).scalars().all())
+        for name in self.jobs:
+            if name in existing:
+                continue
+            try:
+                async with get_db_session() as session:
+                    session.add(JobLease(job_name=name))
+            except IntegrityError:
+                pass  # another replica created it first
+
+    def _lease_until(self, job: ScheduledJob, now: datetime) -> datetime:
+        # Hold the lease past our own next fire (and past a timed-out run) so
+        # followers only take over once the leader stops renewing.
+        hold_until = job.trigger.next_fire(now) + timedelta(seconds=job.jitter)
+        if job.timeout:
+            hold_until = max(hold_until, now + timedelta(seconds=job.timeout))
+        return hold_until + self.lease_grace
+
+    async def _acquire_lease(self, job: ScheduledJob, now: datetime) -> bool:
+        if not self.leader_election:
+            return True
+        async with get_db_session() as session:
+            result = await session.execute(
+                update(JobLease)
+                .where(
+                    JobLease.job_name == job.name,
+                    or_(
+                        JobLease.owner == self.owner_id,
+                        JobLease.lease_until.is_(None),
+                        JobLease.lease_until < now,
+                    )
+                )
+                .values(owner=self.owner_id, lease_until=self._lease_until(job, now), last_started_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            return result.rowcount == 1
+
+    async def _record_run(self, job: ScheduledJob, status: str, duration: float, error: Optional[str]) -> None:
+        now = datetime.utcnow()
+        values = dict(
+            last_finished_at=now,
+            last_duration_ms=int(duration * 1000),
+            last_status=status,
+            last_error=error,
+            run_count=JobLease.run_count + 1,
+            failure_count=JobLease.failure_count + (0 if status == "success" else 1),
+        )
+        if self.leader_election:
+            values["lease_until"] = self._lease_until(job, now)
+        async with get_db_session() as session:
+            await session.execute(
+                update(JobLease)
+                .where(JobLease.job_name == job.name)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+
+    async def run_job(self, job: ScheduledJob) -> bool:
+        """Run a job once if it is not already running and this process holds its lease"""
+
+        if job.running:
+            job.stats.skipped_overlap += 1
+            return False
+
+        job.running = True
+        try:
+            now = datetime.utcnow()
+            if not await self._acquire_lease(job, now):
+                job.stats.skipped_not_leader += 1
+                return False
+
+            job.stats.last_started_at = now
+            started = time.perf_counter()
+            status, error = "success", None
+            try:
+                if job.timeout:
+                    await asyncio.wait_for(job.func(), timeout=job.timeout)
+                else:
+                    await job.func()
+            except asyncio.TimeoutError:
+                status, error = "timeout", f"Timed out after {job.timeout}s"
+            except Exception as e:
+                status, error = "failed", str(e)
+                logger.exception("Scheduled job %s failed", job.name)
+
+            duration = time.perf_counter() - started
+            stats = job.stats
+            stats.runs += 1
+            stats.last_duration = duration
+            stats.total_duration += duration
+            stats.max_duration = max(stats.max_duration, duration)
+            stats.last_error = error
+            if status != "success":
+                stats.failures += 1
+
+            try:
+                await self._record_run(job, status, duration, error)
+            except Exception:
+                logger.exception("Could not record run of job %s", job.name)
+            return status == "success"
+        finally:
+            job.running = False
+
+    async def _job_loop(self, job: ScheduledJob) -> None:
+        while not self._stop_event.is_set():
+            now = datetime.utcnow()
+            delay = job.jitter * random.random()
+            job.next_run_at = job.trigger.next_fire(now) + timedelta(seconds=delay)
+            wait_seconds = max(0.0, (job.next_run_at - now).total_seconds())
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=wait_seconds)
+                break
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.run_job(job)
+            except Exception:
+                logger.exception("Scheduler loop error in job %s", job.name)
+
+    async def start(self) -> None:
+        self._stop_event.clear()
+        if self.leader_election:
+            await self._ensure_lease_rows()
+        for job in self.jobs.values():
+            self._tasks.append(asyncio.create_task(self._job_loop(job), name=f"job:{job.name}"))
+        for name, (run, _stop) in self.workers.items():
+            self._tasks.append(asyncio.create_task(run(), name=f"worker:{name}"))
+        logger.info("Scheduler %s started with %d jobs", self.owner_id, len(self.jobs))
+
+    async def stop(self) -> None:
+        self._stop_event.set()
+        for _run, stop in self.workers.values():
+            stop()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def run_forever(self) -> None:
+        await self.start()
+        await self._stop_event.wait()
@@ -10,16 +10,17 @@ from .referrals import ReferralEvent
 from .support import Ticket, TicketMessage
 from .tutorials import Tutorial
 from .content import ContentItem
-from .admin import AdminUser, BotSettings, Gift, ResellerRequest, Reseller, Button
-from .analytics import AnalyticsUserActivity, DailyStats, ServiceUsage
+from .admin import AdminUser, BotSettings, Gift, GiftPanelPush, ResellerRequest, Reseller, Button
+from .analytics import AnalyticsUserActivity, DailyStats, RevenueRollup, UserRevenueRollup, ActivityRollup, SalesCounter, ServiceUsage
 from .trial import TrialRequest, TrialConfig
 from .smart_discounts import SmartDiscount, DiscountUsage, CashbackRule, CashbackTransaction, UserDiscountProfile
 from .crm import UserProfile, UserActivity, PersonalizedOffer, CRMCampaign, CampaignRecipient, UserInsight, CustomerJourney
 from .notifications import Notification, NotificationTemplate, NotificationSettings, NotificationLog
-from .advanced_reseller import AdvancedReseller, SubReseller, ResellerCommission, ResellerTarget, ResellerActivity, ResellerPayment, ResellerLevelRule
+from .advanced_reseller import AdvancedReseller, SubReseller, ResellerClosure, ResellerCommission, ResellerSettlement, ResellerTarget, ResellerActivity, ResellerPayment, ResellerLevelRule
 from .anti_fraud import FraudRule, FraudDetection, UserFraudProfile, FraudPattern, FraudAlert, FraudWhitelist, FraudBlacklist
 from .scheduled_messages import ScheduledMessage, Campaign, MessageRecipient, MessageTemplate, MessageSchedule, MessageAnalytics
 from .refund_system import RefundRequest, ServiceUpgrade, WalletTransaction, RefundPolicy, UpgradeRule, RefundAnalytics
+from .scheduler import JobLease
 
 __all__ = [
     "Base",
@@ -40,11 +41,16 @@ __all__ = [
     "AdminUser",
     "BotSettings",
     "Gift",
+    "GiftPanelPush",
     "ResellerRequest",
     "Reseller",
     "Button",
     "AnalyticsUserActivity",
     "DailyStats",
+    "RevenueRollup",
+    "UserRevenueRollup",
+    "ActivityRollup",
+    "SalesCounter",
     "ServiceUsage",
     "TrialRequest",
     "TrialConfig",
@@ -66,7 +72,9 @@ __all__ = [
     "NotificationLog",
     "AdvancedReseller",
     "SubReseller",
+    "ResellerClosure",
     "ResellerCommission",
+    "ResellerSettlement",
     "ResellerTarget",
     "ResellerActivity",
     "ResellerPayment",
@@ -89,4 +97,5 @@ __all__ = [
     "RefundPolicy",
     "UpgradeRule",
     "RefundAnalytics",
+    "JobLease",
 ]
\ No newline at end of file
@@ -1,7 +1,7 @@
 from typing import Optional
 from datetime import datetime
 
-from sqlalchemy import String, Integer, ForeignKey, Boolean, DateTime, Text, Numeric
+from sqlalchemy import String, Integer, ForeignKey, Boolean, DateTime, Text, Numeric, Index
 from sqlalchemy.orm import Mapped, mapped_column
 
 from .base import Base
@@ -33,6 +33,32 @@ class Gift(Base):
     processed_count: Mapped[int] = mapped_column(Integer, default=0)
     total_count: Mapped[int] = mapped_column(Integer, default=1)
     status: Mapped[str] = mapped_column(String(16), default="pending")  # pending | processing | completed | failed
+    last_processed_user_id: Mapped[int] = mapped_column(Integer, default=0)  # bulk progress cursor (TelegramUser.id)
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    completed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    error_message: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+
+class GiftPanelPush(Base):
+    """Traffic a bulk gift chunk still has to add on one server's panel
+
+    Written in the same transaction as the chunk's traffic_limit_gb update
+    and retried by the gifts.process job until the panel accepts it.
+    """
+    __table_args__ = (
+        Index("ix_giftpanelpush_status_next", "status", "next_attempt_at"),
+    )
+
+    gift_id: Mapped[int] = mapped_column(ForeignKey("gift.id"), index=True)
+    server_id: Mapped[int] = mapped_column(ForeignKey("server.id"))
+    identifiers: Mapped[str] = mapped_column(Text)  # JSON list of [uuid, remark] still to update
+    add_gb: Mapped[int] = mapped_column(Integer)
+    status: Mapped[str] = mapped_column(String(16), default="pending")  # pending | done | failed
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    pushed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
 
 
 class ResellerRequest(Base):
@@ -2,7 +2,7 @@ from datetime import datetime, timedelta
 from typing import Optional
 from enum import Enum
 
-from sqlalchemy import String, Integer, ForeignKey, Boolean, DateTime, Text, Numeric, Enum as SQLEnum, JSON
+from sqlalchemy import String, Integer, ForeignKey, Boolean, DateTime, Text, Numeric, Enum as SQLEnum, JSON, Index, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column
 
 from .base import Base
@@ -106,8 +106,32 @@ class SubReseller(Base):
     last_activity_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
 
 
+class ResellerClosure(Base):
+    """Every (ancestor, descendant) pair of the reseller tree, self pairs at depth 0
+
+    Maintained on create and move by services/reseller_hierarchy.py, so a
+    whole subtree or ancestor chain is one indexed lookup.
+    """
+    __table_args__ = (
+        UniqueConstraint("ancestor_id", "descendant_id", name="uq_resellerclosure_pair"),
+        Index("ix_resellerclosure_descendant_depth", "descendant_id", "depth"),
+    )
+
+    ancestor_id: Mapped[int] = mapped_column(ForeignKey("advancedreseller.id"))
+    descendant_id: Mapped[int] = mapped_column(ForeignKey("advancedreseller.id"))
+    depth: Mapped[int] = mapped_column(Integer)
+
+
 class ResellerCommission(Base):
-    """Commission tracking for resellers"""
+    """Commission tracking for resellers
+
+    Append-only ledger: rows are written at purchase time and added to the
+    reseller's totals later by the settlement job (services/reseller_ledger.py).
+    """
+    __table_args__ = (
+        Index("ix_resellercommission_reseller_status", "reseller_id", "status"),
+    )
+
     reseller_id: Mapped[int] = mapped_column(ForeignKey("advancedreseller.id"))
     transaction_id: Mapped[int] = mapped_column(ForeignKey("transaction.id"))
     
@@ -124,6 +148,8 @@ class ResellerCommission(Base):
     # Status
     status: Mapped[str] = mapped_column(String(16), default="pending")  # pending, approved, paid
     paid_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    settlement_id: Mapped[Optional[int]] = mapped_column(ForeignKey("resellersettlement.id"), nullable=True, index=True)  # None: not in the totals yet
+    payment_id: Mapped[Optional[int]] = mapped_column(ForeignKey("resellerpayment.id"), nullable=True, index=True)
     
     # Context
     customer_id: Mapped[int] = mapped_column(ForeignKey("telegramuser.id"))
@@ -133,6 +159,17 @@ class ResellerCommission(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
 
+class ResellerSettlement(Base):
+    """A batch of ledger commissions added to the reseller totals in one go"""
+    first_commission_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    last_commission_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    commissions: Mapped[int] = mapped_column(Integer, default=0)
+    resellers: Mapped[int] = mapped_column(Integer, default=0)
+    sales_amount: Mapped[float] = mapped_column(Numeric(18, 2), default=0)
+    commission_amount: Mapped[float] = mapped_column(Numeric(18, 2), default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
 class ResellerTarget(Base):
     """Monthly/quarterly targets for resellers"""
     reseller_id: Mapped[int] = mapped_column(ForeignKey("advancedreseller.id"))
@@ -183,7 +220,7 @@ class ResellerActivity(Base):
     payment_metadata: Mapped[Optional[str]] = mapped_column(JSON, nullable=True)
     
     # Date
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
 
 
 class ResellerPayment(Base):
@@ -1,13 +1,17 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional
 
-from sqlalchemy import String, Integer, ForeignKey, DateTime, Numeric, Boolean
+from sqlalchemy import String, Integer, ForeignKey, DateTime, Date, Numeric, Boolean, UniqueConstraint, Index
 from sqlalchemy.orm import Mapped, mapped_column
 
 from .base import Base
 
 
 class AnalyticsUserActivity(Base):
+    __table_args__ = (
+        Index("ix_analyticsuseractivity_created_at", "created_at"),
+    )
+
     user_id: Mapped[int] = mapped_column(ForeignKey("telegramuser.id"))
     action: Mapped[str] = mapped_column(String(64))  # login | purchase | wallet_topup | config_use | etc.
     details: Mapped[Optional[str]] = mapped_column(String(512), nullable=True)
@@ -16,11 +20,11 @@ class AnalyticsUserActivity(Base):
 
 
 class DailyStats(Base):
-    date: Mapped[datetime] = mapped_column(DateTime, index=True)
-    total_users: Mapped[int] = mapped_column(Integer, default=0)
+    date: Mapped[datetime] = mapped_column(DateTime, unique=True, index=True)
+    total_users: Mapped[int] = mapped_column(Integer, default=0)  # reconcile-only (see RevenueRollupService)
     new_users: Mapped[int] = mapped_column(Integer, default=0)
-    active_users: Mapped[int] = mapped_column(Integer, default=0)
-    total_services: Mapped[int] = mapped_column(Integer, default=0)
+    active_users: Mapped[int] = mapped_column(Integer, default=0)  # reconcile-only
+    total_services: Mapped[int] = mapped_column(Integer, default=0)  # reconcile-only
     new_services: Mapped[int] = mapped_column(Integer, default=0)
     total_revenue: Mapped[float] = mapped_column(Numeric(18, 2), default=0)
     wallet_topups: Mapped[float] = mapped_column(Numeric(18, 2), default=0)
@@ -28,9 +32,69 @@ class DailyStats(Base):
     successful_transactions: Mapped[int] = mapped_column(Integer, default=0)
 
 
+class RevenueRollup(Base):
+    """Transactions aggregated per creation day and dimension, kept current on every flush"""
+    __table_args__ = (
+        UniqueConstraint("date", "status", "payment_gateway", "transaction_type", "plan_id", name="uq_revenuerollup_key"),
+    )
+
+    date: Mapped[date] = mapped_column(Date, index=True)
+    status: Mapped[str] = mapped_column(String(32))
+    payment_gateway: Mapped[str] = mapped_column(String(32))
+    transaction_type: Mapped[str] = mapped_column(String(32))
+    # 0 when the transaction is not tied to a plan (top-ups, transfers, ...)
+    plan_id: Mapped[int] = mapped_column(Integer, default=0)
+    server_id: Mapped[int] = mapped_column(Integer, default=0)
+    category_id: Mapped[int] = mapped_column(Integer, default=0)
+    transaction_count: Mapped[int] = mapped_column(Integer, default=0)
+    total_amount: Mapped[float] = mapped_column(Numeric(18, 2), default=0)
+    # Exact only after a rebuild: flushes widen them but never shrink them back
+    min_amount: Mapped[Optional[float]] = mapped_column(Numeric(18, 2), nullable=True)
+    max_amount: Mapped[Optional[float]] = mapped_column(Numeric(18, 2), nullable=True)
+
+
+class UserRevenueRollup(Base):
+    """Approved transaction totals per creation day and user"""
+    __table_args__ = (
+        UniqueConstraint("date", "user_id", name="uq_userrevenuerollup_key"),
+    )
+
+    date: Mapped[date] = mapped_column(Date, index=True)
+    user_id: Mapped[int] = mapped_column(Integer, index=True)
+    transaction_count: Mapped[int] = mapped_column(Integer, default=0)
+    total_amount: Mapped[float] = mapped_column(Numeric(18, 2), default=0)
+
+
 class ServiceUsage(Base):
     service_id: Mapped[int] = mapped_column(ForeignKey("service.id"))
     date: Mapped[datetime] = mapped_column(DateTime, index=True)
     traffic_used_gb: Mapped[float] = mapped_column(Numeric(10, 3), default=0)
     connection_count: Mapped[int] = mapped_column(Integer, default=0)
-    last_connection_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
\ No newline at end of file
+    last_connection_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+
+class ActivityRollup(Base):
+    """Activity log events counted per day, source and type; outlives the pruned events"""
+    __table_args__ = (
+        UniqueConstraint("date", "source", "event_type", name="uq_activityrollup_key"),
+    )
+
+    date: Mapped[date] = mapped_column(Date, index=True)
+    source: Mapped[str] = mapped_column(String(16))  # see services/activity_log.py SOURCES
+    event_type: Mapped[str] = mapped_column(String(64))
+    event_count: Mapped[int] = mapped_column(Integer, default=0)
+    actor_count: Mapped[int] = mapped_column(Integer, default=0)  # distinct users / resellers
+
+
+class SalesCounter(Base):
+    """All-time sales and active services per plan, server or category, kept current on every flush"""
+    __table_args__ = (
+        UniqueConstraint("scope", "scope_id", name="uq_salescounter_key"),
+        Index("ix_salescounter_scope_sales", "scope", "sales_count"),
+    )
+
+    scope: Mapped[str] = mapped_column(String(16))  # plan | server | category
+    scope_id: Mapped[int] = mapped_column(Integer)
+    sales_count: Mapped[int] = mapped_column(Integer, default=0)  # approved transactions tied to a plan
+    revenue: Mapped[float] = mapped_column(Numeric(18, 2), default=0)
+    active_services: Mapped[int] = mapped_column(Integer, default=0)  # active, non-test services
@@ -55,6 +55,9 @@ class UserProfile(Base):
     last_activity_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
     days_since_last_activity: Mapped[int] = mapped_column(Integer, default=0)
     engagement_score: Mapped[float] = mapped_column(Numeric(3, 2), default=0)  # 0-1 score
+    # Exponentially decayed sum of activity weights as of engagement_decayed_at
+    engagement_decayed_sum: Mapped[float] = mapped_column(Numeric(10, 4), default=0)
+    engagement_decayed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
     
     # Risk assessment
     risk_score: Mapped[float] = mapped_column(Numeric(3, 2), default=0)  # 0-1 score
@@ -94,7 +97,7 @@ class UserActivity(Base):
     user_agent: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     
     # Timestamp
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
 
 
 class PersonalizedOffer(Base):
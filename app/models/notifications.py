@@ -2,7 +2,7 @@ from datetime import datetime, timedelta
 from typing import Optional
 from enum import Enum
 
-from sqlalchemy import String, Integer, ForeignKey, Boolean, DateTime, Text, JSON
+from sqlalchemy import String, Integer, ForeignKey, Boolean, DateTime, Text, JSON, Index
 from sqlalchemy.orm import Mapped, mapped_column
 
 from .base import Base
@@ -21,6 +21,7 @@ class NotificationType(str, Enum):
     DISCOUNT_AVAILABLE = "discount_available"  # تخفیف موجود
     CASHBACK_EARNED = "cashback_earned"  # کسب کش‌بک
     REFERRAL_BONUS = "referral_bonus"  # پاداش معرفی
+    GIFT_RECEIVED = "gift_received"  # دریافت هدیه
     TRIAL_APPROVED = "trial_approved"  # تایید تست
     TRIAL_EXPIRED = "trial_expired"  # انقضای تست
     RESELLER_APPROVED = "reseller_approved"  # تایید نمایندگی
@@ -31,6 +32,7 @@ class NotificationType(str, Enum):
 class NotificationStatus(str, Enum):
     """Notification status"""
     PENDING = "pending"  # در انتظار
+    SENDING = "sending"  # در حال ارسال (رزرو شده توسط ارسال‌کننده)
     SENT = "sent"  # ارسال شده
     DELIVERED = "delivered"  # تحویل داده شده
     FAILED = "failed"  # ناموفق
@@ -63,6 +65,10 @@ class NotificationTemplate(Base):
 
 class Notification(Base):
     """Individual notifications"""
+    __table_args__ = (
+        Index("ix_notification_status_scheduled", "status", "scheduled_at"),
+    )
+    
     user_id: Mapped[int] = mapped_column(ForeignKey("telegramuser.id"))
     notification_type: Mapped[NotificationType] = mapped_column(String(32))
     template_id: Mapped[Optional[int]] = mapped_column(ForeignKey("notificationtemplate.id"), nullable=True)
@@ -85,6 +91,7 @@ class Notification(Base):
     context_data: Mapped[Optional[str]] = mapped_column(JSON, nullable=True)  # Related data
     related_service_id: Mapped[Optional[int]] = mapped_column(ForeignKey("service.id"), nullable=True)
     related_transaction_id: Mapped[Optional[int]] = mapped_column(ForeignKey("transaction.id"), nullable=True)
+    dedup_key: Mapped[Optional[str]] = mapped_column(String(128), unique=True, nullable=True)  # e.g. service_expiry:<service>:<expiry>:<days>
     
     # Delivery tracking
     delivery_attempts: Mapped[int] = mapped_column(Integer, default=0)
@@ -133,7 +140,7 @@ class NotificationLog(Base):
     status: Mapped[NotificationStatus] = mapped_column(String(16))
     
     # Timing
-    attempted_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    attempted_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
     delivered_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
     
     # Error tracking
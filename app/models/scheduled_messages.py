@@ -2,7 +2,7 @@ from datetime import datetime, timedelta
 from typing import Optional
 from enum import Enum
 
-from sqlalchemy import String, Integer, ForeignKey, Boolean, DateTime, Text, JSON, Enum as SQLEnum, Numeric
+from sqlalchemy import String, Integer, ForeignKey, Boolean, DateTime, Text, JSON, Enum as SQLEnum, Numeric, Index
 from sqlalchemy.orm import Mapped, mapped_column
 
 from .base import Base
@@ -182,6 +182,10 @@ class MessageTemplate(Base):
 
 class MessageSchedule(Base):
     """Recurring message schedules"""
+    __table_args__ = (
+        Index("ix_messageschedule_active_next", "is_active", "next_execution_at"),
+    )
+    
     name: Mapped[str] = mapped_column(String(128))
     description: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     
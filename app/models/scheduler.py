@@ -0,0 +1,27 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import String, Integer, DateTime, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base
+
+
+class JobLease(Base):
+    """Leader lease and last-run metrics of an in-process scheduled job"""
+    job_name: Mapped[str] = mapped_column(String(64), unique=True, index=True)
+    
+    # Leader election
+    owner: Mapped[Optional[str]] = mapped_column(String(128), nullable=True)  # host:pid:nonce of the leader
+    lease_until: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    
+    # Last run
+    last_started_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    last_finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    last_duration_ms: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    last_status: Mapped[Optional[str]] = mapped_column(String(16), nullable=True)  # success | failed | timeout
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    
+    # Totals
+    run_count: Mapped[int] = mapped_column(Integer, default=0)
+    failure_count: Mapped[int] = mapped_column(Integer, default=0)
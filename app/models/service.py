@@ -17,8 +17,8 @@ class Service(Base):
     qr_image_file_id: Mapped[Optional[str]] = mapped_column(String(256), nullable=True)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     is_test: Mapped[bool] = mapped_column(Boolean, default=False)
-    expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
-    purchased_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True, index=True)
+    purchased_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
     traffic_used_gb: Mapped[float] = mapped_column(Numeric(10, 3), default=0)
     traffic_limit_gb: Mapped[Optional[float]] = mapped_column(Numeric(10, 3), nullable=True)
     last_used_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
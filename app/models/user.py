@@ -1,13 +1,18 @@
 from typing import Optional
 from datetime import datetime
 
-from sqlalchemy import BigInteger, String, Boolean, Numeric, ForeignKey, DateTime, Integer, Text
+from sqlalchemy import BigInteger, String, Boolean, Numeric, ForeignKey, DateTime, Integer, Text, Index
 from sqlalchemy.orm import Mapped, mapped_column
 
 from .base import Base
 
 
 class TelegramUser(Base):
+    __table_args__ = (
+        Index("ix_telegramuser_created_at", "created_at"),  # dashboard new-user counts
+        Index("ix_telegramuser_last_seen_at", "last_seen_at"),  # dashboard active-user count
+    )
+
     telegram_user_id: Mapped[int] = mapped_column(BigInteger, unique=True, index=True)
     username: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
     first_name: Mapped[Optional[str]] = mapped_column(String(128), nullable=True)
@@ -29,6 +29,8 @@ if [ "$mode" = "api" ]; then
   exec uvicorn api.main:app --host 0.0.0.0 --port 8000 --workers 2 --proxy-headers
 elif [ "$mode" = "bot" ]; then
   exec python -m bot.main
+elif [ "$mode" = "worker" ]; then
+  exec python -m worker.main
 else
   # Execute arbitrary command if provided
   exec "$@"
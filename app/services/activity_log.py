@@ -0,0 +1,297 @@
+import asyncio
+import logging
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, delete, insert, func, and_, event
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.db import get_db_session
+from models.advanced_reseller import ResellerActivity
+from models.analytics import AnalyticsUserActivity, ActivityRollup
+from models.crm import UserActivity
+from models.notifications import NotificationLog
+from services.archive_service import ARCHIVE_TABLES
+from services.revenue_rollup import _to_date
+
+
+logger = logging.getLogger(__name__)
+
+# Session.info key of the events waiting for that session to commit
+HELD_KEY = "activity_log_held"
+
+
+@dataclass
+class ActivitySource:
+    model: Any
+    time_column: Any
+    type_column: Any
+    actor_column: Any  # counted distinct in the rollups
+
+
+# Append-only logs that are rolled up per day and pruned after the retention period
+SOURCES: Dict[str, ActivitySource] = {
+    "crm": ActivitySource(UserActivity, UserActivity.created_at, UserActivity.activity_type, UserActivity.user_id),
+    "analytics": ActivitySource(
+        AnalyticsUserActivity, AnalyticsUserActivity.created_at, AnalyticsUserActivity.action, AnalyticsUserActivity.user_id
+    ),
+    "reseller": ActivitySource(
+        ResellerActivity, ResellerActivity.created_at, ResellerActivity.activity_type, ResellerActivity.reseller_id
+    ),
+    "notifications": ActivitySource(NotificationLog, NotificationLog.attempted_at, NotificationLog.status, NotificationLog.user_id),
+}
+
+
+class ActivityLogWriter:
+    """Buffers activity rows in memory and bulk-inserts them in the background.
+
+    Handlers call `emit` instead of adding an ORM object to their session, so
+    logging an event costs an append to a deque. The writer task starts on
+    the first event, flushes every `flush_interval` seconds or as soon as a
+    batch is full, and groups rows per table into one executemany INSERT.
+    Events emitted with a session are only queued once it commits (and
+    dropped if it rolls back), so they never reference rows that are not
+    in the database. Events are stamped when emitted, not when written. A
+    batch that keeps failing is written table by table, then row by row,
+    so only the rows that cannot be written are dropped. If the queue is
+    full (database down for a long time) new events are dropped and
+    counted rather than blocking the bot.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        max_queue: int = 50000,
+        max_attempts: int = 3,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.max_attempts = max_attempts
+        self.dropped = 0
+        self.written = 0
+        self._pending: Deque[Tuple[Any, Dict[str, Any]]] = deque()
+        self._failures = 0
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    def emit(self, model, session: Optional[AsyncSession] = None, **values) -> None:
+        """Queue one row for `model`; returns immediately
+
+        With a session, the row is held until that session commits and
+        discarded if it rolls back.
+        """
+
+        values.setdefault("created_at", datetime.utcnow())
+        if session is not None:
+            self._hold(session.sync_session, model, values)
+            return
+        self._enqueue(model, values)
+
+    def _hold(self, sync_session, model, values: Dict[str, Any]) -> None:
+        if HELD_KEY not in sync_session.info:
+            sync_session.info[HELD_KEY] = []
+
+            def committed(_session):
+                held, sync_session.info[HELD_KEY] = sync_session.info[HELD_KEY], []
+                for event_model, event_values in held:
+                    self._enqueue(event_model, event_values)
+
+            def rolled_back(_session):
+                sync_session.info[HELD_KEY] = []
+
+            event.listen(sync_session, "after_commit", committed)
+            event.listen(sync_session, "after_rollback", rolled_back)
+        sync_session.info[HELD_KEY].append((model, values))
+
+    def _enqueue(self, model, values: Dict[str, Any]) -> None:
+        if len(self._pending) >= self.max_queue:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning("Activity log queue full, %d events dropped so far", self.dropped)
+            return
+        self._pending.append((model, values))
+        self._ensure_running()
+        if len(self._pending) >= self.batch_size and self._wakeup:
+            self._wakeup.set()
+
+    def _ensure_running(self) -> None:
+        if self._stopping or (self._task and not self._task.done()):
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # no event loop (scripts); rows wait for an explicit flush()
+        self._wakeup = asyncio.Event()
+        self._task = loop.create_task(self.run())
+
+    async def flush(self) -> int:
+        """Write everything queued so far; returns the number of rows written"""
+
+        written = 0
+        while self._pending:
+            batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+            # executemany needs the same columns in every row
+            groups: Dict[Tuple[Any, frozenset], List[Dict[str, Any]]] = defaultdict(list)
+            for model, values in batch:
+                groups[(model, frozenset(values))].append(values)
+            try:
+                async with get_db_session() as session:
+                    for (model, _columns), rows in groups.items():
+                        await session.execute(insert(model), rows)
+            except Exception:
+                self._failures += 1
+                if self._failures < self.max_attempts:
+                    logger.exception("Writing %d activity events failed, will retry", len(batch))
+                    self._pending.extendleft(reversed(batch))
+                    break
+                self._failures = 0
+                written += await self._write_isolated(groups)
+                continue
+            self._failures = 0
+            written += len(batch)
+        self.written += written
+        return written
+
+    async def _write_isolated(self, groups: Dict[Tuple[Any, frozenset], List[Dict[str, Any]]]) -> int:
+        """Write a failing batch one table, then one row at a time; drops only the rows that fail"""
+
+        written = dropped = 0
+        for (model, _columns), rows in groups.items():
+            try:
+                async with get_db_session() as session:
+                    await session.execute(insert(model), rows)
+                written += len(rows)
+                continue
+            except Exception:
+                pass
+            for row in rows:
+                try:
+                    async with get_db_session() as session:
+                        await session.execute(insert(model), [row])
+                    written += 1
+                except Exception as e:
+                    dropped += 1
+                    logger.warning("Dropping %s activity event: %s", model.__tablename__, e)
+        self.dropped += dropped
+        return written
+
+    async def run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def close(self) -> None:
+        """Stop the writer after writing what is still queued (call on shutdown)"""
+
+        self._stopping = True
+        if self._task and not self._task.done():
+            self._wakeup.set()
+            await self._task
+        await self.flush()
+        self._stopping = False
+
+    @property
+    def queued(self) -> int:
+        return len(self._pending)
+
+
+activity_log = ActivityLogWriter(
+    batch_size=settings.activity_log_batch_size,
+    flush_interval=settings.activity_log_flush_seconds,
+    max_queue=settings.activity_log_max_queue,
+)
+
+
+class ActivityLogService:
+    """Daily rollups and retention of the activity logs in SOURCES"""
+
+    @staticmethod
+    async def rollup(session, start: date, end: date) -> int:
+        """Recompute the rollups of days start..end (inclusive); returns rows written"""
+
+        start_at = datetime.combine(start, datetime.min.time())
+        end_at = datetime.combine(end + timedelta(days=1), datetime.min.time())
+        await session.execute(delete(ActivityRollup).where(and_(ActivityRollup.date >= start, ActivityRollup.date <= end)))
+
+        rows = []
+        for name, source in SOURCES.items():
+            day = func.date(source.time_column)
+            result = (await session.execute(
+                select(day, source.type_column, func.count(), func.count(func.distinct(source.actor_column)))
+                .where(and_(source.time_column >= start_at, source.time_column < end_at))
+                .group_by(day, source.type_column)
+            )).all()
+            for event_day, event_type, events, actors in result:
+                rows.append({
+                    "date": _to_date(event_day),
+                    "source": name,
+                    "event_type": str(getattr(event_type, "value", event_type) or ""),
+                    "event_count": events,
+                    "actor_count": actors,
+                })
+        if rows:
+            await session.execute(insert(ActivityRollup), rows)
+        return len(rows)
+
+    @staticmethod
+    async def prune(before: datetime, chunk_size: int = 5000) -> Dict[str, int]:
+        """Delete events older than `before` in short per-chunk transactions"""
+
+        deleted: Dict[str, int] = {}
+        for name, source in SOURCES.items():
+            if settings.archive_enabled and source.model.__tablename__ in ARCHIVE_TABLES:
+                continue  # moved to archive files by the archive job instead
+            id_column = source.model.id
+            total = 0
+            while True:
+                async with get_db_session() as session:
+                    ids = (await session.execute(
+                        select(id_column).where(source.time_column < before).order_by(id_column).limit(chunk_size)
+                    )).scalars().all()
+                    if not ids:
+                        break
+                    await session.execute(delete(source.model).where(id_column.in_(ids)))
+                total += len(ids)
+            deleted[name] = total
+        return deleted
+
+    @staticmethod
+    async def rollup_and_prune(retention_days: int, days_per_batch: int = 7) -> Dict[str, Any]:
+        """Nightly job: roll up every day not yet rolled up (and yesterday again), then prune"""
+
+        today = datetime.utcnow().date()
+        async with get_db_session() as session:
+            last = (await session.execute(select(func.max(ActivityRollup.date)))).scalar()
+            if last is None:
+                firsts = [
+                    (await session.execute(select(func.min(source.time_column)))).scalar()
+                    for source in SOURCES.values()
+                ]
+                firsts = [_to_date(value) for value in firsts if value is not None]
+                start = min(firsts) if firsts else today
+            else:
+                start = min(_to_date(last), today - timedelta(days=1))
+
+        rollup_rows = 0
+        batch_start = start
+        while batch_start <= today:
+            batch_end = min(today, batch_start + timedelta(days=days_per_batch - 1))
+            async with get_db_session() as session:
+                rollup_rows += await ActivityLogService.rollup(session, batch_start, batch_end)
+            batch_start = batch_end + timedelta(days=1)
+
+        # Only whole days, all of which have just been rolled up
+        cutoff = datetime.combine(today - timedelta(days=retention_days), datetime.min.time())
+        deleted = await ActivityLogService.prune(cutoff)
+        logger.info("Activity rollups from %s: %d rows; pruned %s", start, rollup_rows, deleted)
+        return {"rollup_rows": rollup_rows, "deleted": deleted}
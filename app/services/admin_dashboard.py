@@ -1,8 +1,13 @@
+import asyncio
+import time
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
-from sqlalchemy import select, func, and_, or_
+from sqlalchemy import select, func, or_
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from core.config import settings
+from core.db import get_db_session
+
 from models.user import TelegramUser
 from models.service import Service
 from models.billing import Transaction
@@ -15,152 +20,122 @@ from models.analytics import DailyStats
 class AdminDashboardService:
     """Service for generating admin dashboard statistics and reports"""
     
+    # Dashboard snapshot shared by every admin: (monotonic time taken, stats)
+    _snapshot: Optional[Tuple[float, Dict]] = None
+    _snapshot_lock = asyncio.Lock()
+    
     @staticmethod
-    async def get_dashboard_stats(session: AsyncSession) -> Dict:
-        """Get comprehensive dashboard statistics"""
+    def _count_where(column, *conditions):
+        return select(func.count(column)).where(*conditions).scalar_subquery()
+    
+    @staticmethod
+    def _sum_where(value, *conditions):
+        return select(func.coalesce(func.sum(value), 0)).where(*conditions).scalar_subquery()
+    
+    @staticmethod
+    async def _fetch_row(query) -> Tuple:
+        # Own session, hence own pooled connection, so the groups run in parallel
+        async with get_db_session() as session:
+            return tuple((await session.execute(query)).one())
+    
+    @staticmethod
+    async def get_dashboard_stats(session: Optional[AsyncSession] = None, max_age: Optional[float] = None) -> Dict:
+        """Get comprehensive dashboard statistics.
+        
+        Served from a snapshot at most `max_age` seconds old (default
+        DASHBOARD_CACHE_SECONDS); concurrent callers wait for a single refresh.
+        The session argument is kept for compatibility and not used.
+        """
+        if max_age is None:
+            max_age = settings.dashboard_cache_seconds
+        
+        cls = AdminDashboardService
+        snapshot = cls._snapshot
+        if snapshot and time.monotonic() - snapshot[0] < max_age:
+            return snapshot[1]
+        
+        async with cls._snapshot_lock:
+            snapshot = cls._snapshot
+            if snapshot and time.monotonic() - snapshot[0] < max_age:
+                return snapshot[1]
+            stats = await cls._compute_dashboard_stats()
+            cls._snapshot = (time.monotonic(), stats)
+            return stats
+    
+    @staticmethod
+    async def _compute_dashboard_stats() -> Dict:
+        """One round trip of filtered counts per table, all tables concurrently"""
+        cls = AdminDashboardService
         now = datetime.utcnow()
-        today = now.date()
+        today_start = datetime.combine(now.date(), datetime.min.time())
         week_ago = now - timedelta(days=7)
         month_ago = now - timedelta(days=30)
         
-        # User statistics
-        total_users = (await session.execute(
-            select(func.count(TelegramUser.id))
-        )).scalar() or 0
-        
-        new_users_today = (await session.execute(
-            select(func.count(TelegramUser.id))
-            .where(func.date(TelegramUser.created_at) == today)
-        )).scalar() or 0
-        
-        new_users_week = (await session.execute(
-            select(func.count(TelegramUser.id))
-            .where(TelegramUser.created_at >= week_ago)
-        )).scalar() or 0
-        
-        new_users_month = (await session.execute(
-            select(func.count(TelegramUser.id))
-            .where(TelegramUser.created_at >= month_ago)
-        )).scalar() or 0
-        
-        active_users_today = (await session.execute(
-            select(func.count(TelegramUser.id))
-            .where(TelegramUser.last_seen_at >= now - timedelta(days=1))
-        )).scalar() or 0
-        
-        blocked_users = (await session.execute(
-            select(func.count(TelegramUser.id))
-            .where(TelegramUser.is_blocked == True)
-        )).scalar() or 0
-        
-        # Service statistics
-        total_services = (await session.execute(
-            select(func.count(Service.id))
-        )).scalar() or 0
-        
-        active_services = (await session.execute(
-            select(func.count(Service.id))
-            .where(Service.is_active == True)
-        )).scalar() or 0
-        
-        new_services_today = (await session.execute(
-            select(func.count(Service.id))
-            .where(func.date(Service.purchased_at) == today)
-        )).scalar() or 0
-        
-        # Revenue statistics
-        total_revenue = (await session.execute(
-            select(func.sum(Transaction.amount))
-            .where(and_(
-                Transaction.status == "approved",
-                Transaction.type.in_(["purchase", "wallet_topup"])
-            ))
-        )).scalar() or 0
-        
-        revenue_today = (await session.execute(
-            select(func.sum(Transaction.amount))
-            .where(and_(
-                Transaction.status == "approved",
-                Transaction.type.in_(["purchase", "wallet_topup"]),
-                func.date(Transaction.approved_at) == today
-            ))
-        )).scalar() or 0
-        
-        revenue_week = (await session.execute(
-            select(func.sum(Transaction.amount))
-            .where(and_(
-                Transaction.status == "approved",
-                Transaction.type.in_(["purchase", "wallet_topup"]),
-                Transaction.approved_at >= week_ago
-            ))
-        )).scalar() or 0
-        
-        revenue_month = (await session.execute(
-            select(func.sum(Transaction.amount))
-            .where(and_(
-                Transaction.status == "approved",
-                Transaction.type.in_(["purchase", "wallet_topup"]),
-                Transaction.approved_at >= month_ago
-            ))
-        )).scalar() or 0
-        
-        # Transaction statistics
-        pending_transactions = (await session.execute(
-            select(func.count(Transaction.id))
-            .where(Transaction.status == "pending")
-        )).scalar() or 0
-        
-        total_transactions = (await session.execute(
-            select(func.count(Transaction.id))
-        )).scalar() or 0
-        
-        # Referral statistics
-        total_referrals = (await session.execute(
-            select(func.count(ReferralEvent.id))
-        )).scalar() or 0
-        
-        referral_bonus_paid = (await session.execute(
-            select(func.sum(ReferralEvent.bonus_amount))
-        )).scalar() or 0
-        
-        # Support statistics
-        open_tickets = (await session.execute(
-            select(func.count(Ticket.id))
-            .where(Ticket.status == "open")
-        )).scalar() or 0
-        
-        total_tickets = (await session.execute(
-            select(func.count(Ticket.id))
-        )).scalar() or 0
-        
-        # Server statistics
-        total_servers = (await session.execute(
-            select(func.count(Server.id))
-        )).scalar() or 0
-        
-        active_servers = (await session.execute(
-            select(func.count(Server.id))
-            .where(Server.is_active == True)
-        )).scalar() or 0
-        
-        # Category and Plan statistics
-        total_categories = (await session.execute(
-            select(func.count(Category.id))
-        )).scalar() or 0
-        
-        active_categories = (await session.execute(
-            select(func.count(Category.id))
-            .where(Category.is_active == True)
-        )).scalar() or 0
-        
-        total_plans = (await session.execute(
-            select(func.count(Plan.id))
-        )).scalar() or 0
-        
-        active_plans = (await session.execute(
-            select(func.count(Plan.id))
-            .where(Plan.is_active == True)
-        )).scalar() or 0
+        # Each count is its own WHERE-filtered subquery, so the range counts
+        # read only their slice of the created_at / last_seen_at / purchased_at
+        # / (status, approved_at) indexes; only the totals count whole tables
+        users_query = select(
+            select(func.count(TelegramUser.id)).scalar_subquery(),
+            cls._count_where(TelegramUser.id, TelegramUser.created_at >= today_start),
+            cls._count_where(TelegramUser.id, TelegramUser.created_at >= week_ago),
+            cls._count_where(TelegramUser.id, TelegramUser.created_at >= month_ago),
+            cls._count_where(TelegramUser.id, TelegramUser.last_seen_at >= now - timedelta(days=1)),
+            cls._count_where(TelegramUser.id, TelegramUser.is_blocked == True),
+        )
+        
+        services_query = select(
+            select(func.count(Service.id)).scalar_subquery(),
+            cls._count_where(Service.id, Service.is_active == True),
+            cls._count_where(Service.id, Service.purchased_at >= today_start),
+        )
+        
+        revenue = (
+            Transaction.status == "approved",
+            Transaction.type.in_(["purchase", "wallet_topup"])
+        )
+        transactions_query = select(
+            select(func.count(Transaction.id)).scalar_subquery(),
+            cls._count_where(Transaction.id, Transaction.status == "pending"),
+            cls._sum_where(Transaction.amount, *revenue),
+            cls._sum_where(Transaction.amount, *revenue, Transaction.approved_at >= today_start),
+            cls._sum_where(Transaction.amount, *revenue, Transaction.approved_at >= week_ago),
+            cls._sum_where(Transaction.amount, *revenue, Transaction.approved_at >= month_ago),
+        )
+        
+        referrals_query = select(
+            func.count(ReferralEvent.id),
+            func.coalesce(func.sum(ReferralEvent.bonus_amount), 0),
+        )
+        
+        tickets_query = select(
+            select(func.count(Ticket.id)).scalar_subquery(),
+            cls._count_where(Ticket.id, Ticket.status == "open"),
+        )
+        
+        # The catalog tables are tiny: one round trip for all three
+        infrastructure_query = select(
+            select(func.count(Server.id)).scalar_subquery(),
+            cls._count_where(Server.id, Server.is_active == True),
+            select(func.count(Category.id)).scalar_subquery(),
+            cls._count_where(Category.id, Category.is_active == True),
+            select(func.count(Plan.id)).scalar_subquery(),
+            cls._count_where(Plan.id, Plan.is_active == True),
+        )
+        
+        (
+            (total_users, new_users_today, new_users_week, new_users_month, active_users_today, blocked_users),
+            (total_services, active_services, new_services_today),
+            (total_transactions, pending_transactions, total_revenue, revenue_today, revenue_week, revenue_month),
+            (total_referrals, referral_bonus_paid),
+            (total_tickets, open_tickets),
+            (total_servers, active_servers, total_categories, active_categories, total_plans, active_plans),
+        ) = await asyncio.gather(*(
+            cls._fetch_row(query)
+            for query in (
+                users_query, services_query, transactions_query,
+                referrals_query, tickets_query, infrastructure_query,
+            )
+        ))
         
         return {
             "users": {
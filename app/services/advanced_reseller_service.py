@@ -1,7 +1,7 @@
 import json
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any, Tuple
-from sqlalchemy import select, func, and_, or_, desc
+from sqlalchemy import select, delete, func, and_, or_, desc
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from models.advanced_reseller import (
@@ -12,6 +12,9 @@ from models.advanced_reseller import (
 from models.user import TelegramUser
 from models.billing import Transaction
 from models.service import Service
+from services.activity_log import activity_log
+from services.reseller_hierarchy import ResellerHierarchyService
+from services.reseller_ledger import ResellerLedgerService
 
 
 class AdvancedResellerService:
@@ -75,6 +78,7 @@ class AdvancedResellerService:
         
         session.add(reseller)
         await session.flush()
+        await ResellerHierarchyService.add(session, reseller.id, parent_reseller_id)
         
         # Create sub-reseller relationship if parent exists
         if parent_reseller:
@@ -94,6 +98,64 @@ class AdvancedResellerService:
         
         return reseller
     
+    @staticmethod
+    async def move_reseller(
+        session: AsyncSession,
+        reseller_id: int,
+        new_parent_id: Optional[int]
+    ) -> AdvancedReseller:
+        """Move a reseller (with its sub-resellers) under another parent, or to the top level"""
+        
+        reseller = (await session.execute(
+            select(AdvancedReseller).where(AdvancedReseller.id == reseller_id)
+        )).scalar_one_or_none()
+        
+        if not reseller:
+            raise ValueError("Reseller not found")
+        
+        if reseller.parent_reseller_id == new_parent_id:
+            return reseller
+        
+        new_parent = None
+        if new_parent_id:
+            new_parent = (await session.execute(
+                select(AdvancedReseller).where(AdvancedReseller.id == new_parent_id)
+            )).scalar_one_or_none()
+            
+            if not new_parent:
+                raise ValueError("Parent reseller not found")
+            
+            if new_parent_id == reseller_id:
+                raise ValueError("Reseller cannot be its own parent")
+        
+        # Closure first: it refuses moves under the reseller's own subtree
+        await ResellerHierarchyService.move(session, reseller_id, new_parent_id)
+        
+        if reseller.parent_reseller_id:
+            old_parent = (await session.execute(
+                select(AdvancedReseller).where(AdvancedReseller.id == reseller.parent_reseller_id)
+            )).scalar_one_or_none()
+            if old_parent and old_parent.total_sub_resellers > 0:
+                old_parent.total_sub_resellers -= 1
+            await session.execute(
+                delete(SubReseller).where(SubReseller.sub_reseller_id == reseller_id)
+            )
+        
+        if new_parent:
+            session.add(SubReseller(parent_reseller_id=new_parent_id, sub_reseller_id=reseller_id))
+            new_parent.total_sub_resellers += 1
+        
+        old_parent_id = reseller.parent_reseller_id
+        reseller.parent_reseller_id = new_parent_id
+        
+        # Log activity
+        await AdvancedResellerService._log_activity(
+            session, reseller.id, "reseller_moved",
+            f"Moved from parent {old_parent_id or '-'} to {new_parent_id or '-'}"
+        )
+        
+        return reseller
+    
     @staticmethod
     async def approve_reseller(
         session: AsyncSession,
@@ -130,7 +192,12 @@ class AdvancedResellerService:
         transaction: Transaction,
         service: Optional[Service] = None
     ) -> List[ResellerCommission]:
-        """Calculate commissions for reseller hierarchy"""
+        """Calculate commissions for reseller hierarchy
+
+        Only appends rows to the commission ledger; the reseller totals are
+        updated by the settlement job (services/reseller_ledger.py), so a
+        purchase never locks the reseller rows.
+        """
         
         # Find the reseller who referred this customer
         customer = (await session.execute(
@@ -150,11 +217,12 @@ class AdvancedResellerService:
             return []  # Not an active reseller
         
         commissions = []
-        current_reseller = referring_reseller
-        level = 1
+        
+        # The referring reseller and up to two levels above it, in one query
+        chain = await ResellerHierarchyService.ancestors(session, referring_reseller.id, max_depth=2)
         
         # Calculate commissions up the hierarchy (max 3 levels)
-        while current_reseller and level <= 3:
+        for level, current_reseller in enumerate(chain, 1):
             commission_amount = await AdvancedResellerService._calculate_commission_amount(
                 session, current_reseller, transaction.amount, level
             )
@@ -174,34 +242,6 @@ class AdvancedResellerService:
                 )
                 session.add(commission)
                 commissions.append(commission)
-                
-                # Update reseller stats
-                current_reseller.total_sales += transaction.amount
-                current_reseller.total_commission_earned += commission_amount
-                current_reseller.pending_commission += commission_amount
-                current_reseller.monthly_sales += transaction.amount
-                current_reseller.monthly_commission += commission_amount
-                current_reseller.last_activity_at = datetime.utcnow()
-                
-                # Log activity
-                await AdvancedResellerService._log_activity(
-                    session, current_reseller.id, "commission_earned",
-                    f"Commission earned: {commission_amount:,.0f} IRR",
-                    amount=commission_amount,
-                    transaction_id=transaction.id
-                )
-            
-            # Move to parent reseller
-            if current_reseller.parent_reseller_id:
-                current_reseller = (await session.execute(
-                    select(AdvancedReseller).where(
-                        AdvancedReseller.id == current_reseller.parent_reseller_id
-                    )
-                )).scalar_one_or_none()
-            else:
-                current_reseller = None
-            
-            level += 1
         
         return commissions
     
@@ -217,10 +257,10 @@ class AdvancedResellerService:
         if reseller.commission_type == CommissionType.PERCENTAGE:
             # Apply level-based commission reduction
             level_multiplier = 1.0 if level == 1 else (0.5 if level == 2 else 0.25)
-            return transaction_amount * (reseller.commission_rate / 100) * level_multiplier
+            return float(transaction_amount) * (float(reseller.commission_rate) / 100) * level_multiplier
         
         elif reseller.commission_type == CommissionType.FIXED:
-            return reseller.fixed_commission
+            return float(reseller.fixed_commission or 0)
         
         elif reseller.commission_type == CommissionType.TIERED:
             # Calculate based on tiered rates
@@ -228,13 +268,13 @@ class AdvancedResellerService:
                 try:
                     rates = json.loads(reseller.tiered_rates)
                     for tier in rates:
-                        if transaction_amount >= tier['min_amount']:
-                            return transaction_amount * (tier['rate'] / 100)
+                        if float(transaction_amount) >= tier['min_amount']:
+                            return float(transaction_amount) * (tier['rate'] / 100)
                 except (json.JSONDecodeError, KeyError):
                     pass
             
             # Fallback to percentage
-            return transaction_amount * (reseller.commission_rate / 100)
+            return float(transaction_amount) * (float(reseller.commission_rate) / 100)
         
         return 0
     
@@ -433,7 +473,7 @@ class AdvancedResellerService:
         processed_by: int,
         notes: Optional[str] = None
     ) -> ResellerPayment:
-        """Process commission payment for reseller"""
+        """Pay a reseller's settled, pending ledger commissions as one batch"""
         
         reseller = (await session.execute(
             select(AdvancedReseller).where(AdvancedReseller.id == reseller_id)
@@ -442,44 +482,39 @@ class AdvancedResellerService:
         if not reseller:
             raise ValueError("Reseller not found")
         
-        if reseller.pending_commission <= 0:
-            raise ValueError("No pending commission to pay")
-        
-        # Get pending commissions
-        pending_commissions = (await session.execute(
-            select(ResellerCommission)
-            .where(
-                and_(
-                    ResellerCommission.reseller_id == reseller_id,
-                    ResellerCommission.status == "pending"
-                )
-            )
-        )).scalars().all()
-        
-        if not pending_commissions:
+        payable = and_(
+            ResellerCommission.reseller_id == reseller_id,
+            ResellerCommission.status == "pending",
+            ResellerCommission.settlement_id.isnot(None)
+        )
+        if not (await session.execute(select(ResellerCommission.id).where(payable).limit(1))).first():
             raise ValueError("No pending commissions found")
         
-        # Create payment record
+        # Create payment record, then move the batch onto it with set-based updates
+        now = datetime.utcnow()
         payment = ResellerPayment(
             reseller_id=reseller_id,
-            amount=reseller.pending_commission,
+            amount=0,
             payment_method=payment_method,
-            commission_ids=[c.id for c in pending_commissions],
-            period_start=min(c.created_at for c in pending_commissions),
-            period_end=max(c.created_at for c in pending_commissions),
+            commission_ids=[],
+            period_start=now,
+            period_end=now,
             processed_by=processed_by,
             notes=notes
         )
         session.add(payment)
+        await session.flush()
         
-        # Update commission status
-        for commission in pending_commissions:
-            commission.status = "paid"
-            commission.paid_at = datetime.utcnow()
+        batch = await ResellerLedgerService.pay_batch(session, payment)
+        if not batch["commissions"]:
+            # Paid by a concurrent run in the meantime
+            await session.delete(payment)
+            raise ValueError("No pending commissions found")
         
-        # Update reseller
-        reseller.total_paid += reseller.pending_commission
-        reseller.pending_commission = 0
+        payment.amount = batch["amount"]
+        payment.commission_ids = batch["commission_ids"]
+        payment.period_start = batch["period_start"]
+        payment.period_end = batch["period_end"]
         
         # Log activity
         await AdvancedResellerService._log_activity(
@@ -494,36 +529,26 @@ class AdvancedResellerService:
     async def get_reseller_hierarchy(session: AsyncSession, reseller_id: int) -> Dict[str, Any]:
         """Get reseller hierarchy tree"""
         
-        reseller = (await session.execute(
-            select(AdvancedReseller).where(AdvancedReseller.id == reseller_id)
-        )).scalar_one_or_none()
-        
-        if not reseller:
+        # The whole subtree in one query, then nested by parent
+        rows = await ResellerHierarchyService.subtree(session, reseller_id)
+        if not rows:
             return {}
         
-        # Get sub-resellers
-        sub_resellers = (await session.execute(
-            select(AdvancedReseller, TelegramUser)
-            .join(TelegramUser, AdvancedReseller.user_id == TelegramUser.id)
-            .where(AdvancedReseller.parent_reseller_id == reseller_id)
-        )).all()
-        
-        hierarchy = {
-            "reseller": reseller,
-            "sub_resellers": []
+        nodes = {
+            reseller.id: {"reseller": reseller, "user": user, "sub_resellers": []}
+            for reseller, user, _depth in rows
         }
         
-        for sub_reseller, user in sub_resellers:
-            sub_hierarchy = await AdvancedResellerService.get_reseller_hierarchy(
-                session, sub_reseller.id
-            )
-            hierarchy["sub_resellers"].append({
-                "reseller": sub_reseller,
-                "user": user,
-                "sub_resellers": sub_hierarchy.get("sub_resellers", [])
-            })
+        root = rows[0][0]
+        for reseller, _user, _depth in rows[1:]:
+            parent = nodes.get(reseller.parent_reseller_id)
+            if parent is not None:
+                parent["sub_resellers"].append(nodes[reseller.id])
         
-        return hierarchy
+        return {
+            "reseller": root,
+            "sub_resellers": nodes[root.id]["sub_resellers"]
+        }
     
     @staticmethod
     async def get_reseller_analytics(session: AsyncSession, reseller_id: int) -> Dict[str, Any]:
@@ -604,13 +629,15 @@ class AdvancedResellerService:
     ):
         """Log reseller activity"""
         
-        activity = ResellerActivity(
+        # Written in bulk by the background activity log writer once the session commits
+        activity_log.emit(
+            ResellerActivity,
+            session=session,
             reseller_id=reseller_id,
             activity_type=activity_type,
-            description=description,
+            description=description[:512],
             amount=amount,
             transaction_id=transaction_id,
             customer_id=customer_id,
             service_id=service_id
-        )
-        session.add(activity)
\ No newline at end of file
+        )
\ No newline at end of file
@@ -0,0 +1,176 @@
+from datetime import date, timedelta
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from services.analytics_snapshot import AnalyticsSnapshot, EPOCH, _numpy
+
+
+PERIODS = ("day", "week", "month")
+DIMENSIONS = ("payment_gateway", "type", "plan_id", "server_id", "category_id")
+
+
+def _day_number(value: date) -> int:
+    return (value - EPOCH).days
+
+
+def _to_period(np, days, period: str):
+    """Period index of each day number: days, Monday-based weeks or calendar months"""
+    if period == "day":
+        return days.astype(np.int64)
+    if period == "week":
+        return (days.astype(np.int64) + 3) // 7  # 1970-01-01 was a Thursday
+    if period == "month":
+        return days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    raise ValueError(f"Unknown period: {period}")
+
+
+def _period_label(np, index: int, period: str) -> str:
+    if period == "day":
+        return (EPOCH + timedelta(days=int(index))).isoformat()
+    if period == "week":
+        return (EPOCH + timedelta(days=int(index) * 7 - 3)).isoformat()
+    return str(np.datetime64(int(index), "M"))
+
+
+class AnalyticsEngine:
+    """Vectorized analytics over a columnar snapshot (see analytics_snapshot.py).
+
+    Everything is computed with NumPy array operations on the memory-mapped
+    columns, so multi-year questions never loop over rows in Python or touch
+    the database. Signup-cohort retention is the SQL report in
+    cohort_report_service.py; this engine covers revenue series, pivots and
+    purchase-cohort LTV.
+    """
+
+    def __init__(self, snapshot: AnalyticsSnapshot):
+        self.snapshot = snapshot
+        self.np = _numpy()
+
+    def _approved(self) -> Dict[str, Any]:
+        tx = self.snapshot.table("transactions")
+        mask = tx["status"] == self.snapshot.code("transactions", "status", "approved")
+        return {name: column[mask] for name, column in tx.items()}
+
+    def _plan_lookup(self, column: str):
+        """Array mapping plan_id -> column value (0 for unknown plans)"""
+        np = self.np
+        plans = self.snapshot.table("plans")
+        size = int(plans["id"].max()) + 1 if len(plans["id"]) else 1
+        lookup = np.zeros(size, dtype=np.int64)
+        lookup[plans["id"]] = plans[column]
+        return lookup
+
+    def daily_revenue(self, start: date, end: date) -> Dict[str, Any]:
+        """Approved revenue and transaction count for every day start..end"""
+        np = self.np
+        tx = self._approved()
+        first, last = _day_number(start), _day_number(end)
+        in_range = (tx["day"] >= first) & (tx["day"] <= last)
+        offsets = tx["day"][in_range] - first
+        length = last - first + 1
+        return {
+            "days": [(start + timedelta(days=i)).isoformat() for i in range(length)],
+            "revenue": np.bincount(offsets, weights=tx["amount"][in_range], minlength=length),
+            "transactions": np.bincount(offsets, minlength=length),
+        }
+
+    def moving_average(self, values, window: int):
+        """Trailing moving average; the first window-1 points average what is available"""
+        np = self.np
+        values = np.asarray(values, dtype=np.float64)
+        cumulative = np.cumsum(np.insert(values, 0, 0.0))
+        sums = cumulative[window:] - cumulative[:-window]
+        head = cumulative[1:window] / np.arange(1, min(window, len(values) + 1))
+        return np.concatenate([head[:len(values)], sums / window])
+
+    def growth_rates(self, values):
+        """Percent change from the previous point; 0 where the previous point is 0"""
+        np = self.np
+        values = np.asarray(values, dtype=np.float64)
+        previous = np.concatenate([[0.0], values[:-1]])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(previous > 0, (values - previous) / previous * 100, 0.0)
+
+    def segment_distribution(self, engagement_bins: Sequence[Tuple[str, float, float]]) -> Dict[str, Any]:
+        """Profile counts per segment and lifecycle stage, and per engagement score range [low, high)"""
+        np = self.np
+        profiles = self.snapshot.table("profiles")
+
+        def counts(column: str) -> Dict[str, int]:
+            codes, totals = np.unique(profiles[column], return_counts=True)
+            names = self.snapshot.categories("profiles", column)
+            return {names[code]: int(total) for code, total in zip(codes, totals)}
+
+        scores = profiles["engagement_score"]
+        return {
+            "segment_counts": counts("primary_segment"),
+            "lifecycle_counts": counts("lifecycle_stage"),
+            "engagement_distribution": {
+                label: int(np.count_nonzero((scores >= low) & (scores < high)))
+                for label, low, high in engagement_bins
+            },
+        }
+
+    def revenue_pivot(self, dimension: str, period: str = "month", start: Optional[date] = None, end: Optional[date] = None) -> Dict[str, Any]:
+        """Approved revenue as a (period x dimension value) matrix"""
+        np = self.np
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"Unknown dimension: {dimension}")
+        tx = self._approved()
+        mask = np.ones(len(tx["day"]), dtype=bool)
+        if start:
+            mask &= tx["day"] >= _day_number(start)
+        if end:
+            mask &= tx["day"] <= _day_number(end)
+
+        if dimension in ("server_id", "category_id"):
+            lookup = self._plan_lookup(dimension)
+            plan_ids = tx["plan_id"][mask]
+            keys = np.where(plan_ids < len(lookup), lookup[np.minimum(plan_ids, len(lookup) - 1)], 0)
+        else:
+            keys = tx[dimension][mask].astype(np.int64)
+        periods = _to_period(np, tx["day"][mask], period)
+        if not len(periods):
+            return {"periods": [], "keys": [], "matrix": np.zeros((0, 0))}
+
+        period_values, period_index = np.unique(periods, return_inverse=True)
+        key_values, key_index = np.unique(keys, return_inverse=True)
+        matrix = np.zeros((len(period_values), len(key_values)))
+        np.add.at(matrix, (period_index, key_index), tx["amount"][mask])
+
+        if dimension in ("payment_gateway", "type"):
+            names = self.snapshot.categories("transactions", dimension)
+            labels = [names[k] for k in key_values]
+        else:
+            labels = [int(k) for k in key_values]
+        return {
+            "periods": [_period_label(np, p, period) for p in period_values],
+            "keys": labels,
+            "matrix": matrix,
+        }
+
+    def _cohorts(self, period: str):
+        """Per approved transaction: cohort index (first purchase period) and offset from it"""
+        np = self.np
+        tx = self._approved()
+        periods = _to_period(np, tx["day"], period)
+        users, user_index = np.unique(tx["user_id"], return_inverse=True)
+        first = np.full(len(users), np.iinfo(np.int64).max)
+        np.minimum.at(first, user_index, periods)
+        return tx, first, first[user_index], periods - first[user_index]
+
+    def lifetime_value(self, period: str = "month", max_offset: int = 12) -> Dict[str, Any]:
+        """Cumulative approved revenue per cohort user after N periods"""
+        np = self.np
+        tx, first, cohort_of_tx, offsets = self._cohorts(period)
+        if not len(first):
+            return {"cohorts": [], "sizes": [], "matrix": np.zeros((0, max_offset + 1))}
+
+        cohort_values, cohort_sizes = np.unique(first, return_counts=True)
+        keep = offsets <= max_offset
+        revenue = np.zeros((len(cohort_values), max_offset + 1))
+        np.add.at(revenue, (np.searchsorted(cohort_values, cohort_of_tx[keep]), offsets[keep]), tx["amount"][keep])
+        return {
+            "cohorts": [_period_label(np, c, period) for c in cohort_values],
+            "sizes": cohort_sizes.tolist(),
+            "matrix": np.cumsum(revenue, axis=1) / cohort_sizes[:, None],
+        }
@@ -0,0 +1,266 @@
+import json
+import logging
+import os
+import shutil
+from dataclasses import dataclass
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+from sqlalchemy import select, func
+
+from core.config import settings
+from core.db import get_db_session
+from models.billing import Transaction
+from models.catalog import Plan
+from models.crm import UserProfile
+from models.service import Service
+from models.user import TelegramUser
+
+
+logger = logging.getLogger(__name__)
+
+EPOCH = date(1970, 1, 1)
+
+
+class SnapshotUnavailable(Exception):
+    pass
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise SnapshotUnavailable("Analytics snapshots need the numpy package")
+    return numpy
+
+
+@dataclass
+class SnapshotColumn:
+    name: str
+    expression: Any
+    kind: str  # int32 | int64 | float64 | bool | day | category
+
+
+@dataclass
+class SnapshotTable:
+    name: str
+    id_column: Any
+    columns: Sequence[SnapshotColumn]
+
+
+# Dates are stored as days since 1970-01-01 (-1 when NULL) and strings as
+# int16 codes into a per-column dictionary kept in meta.json.
+TABLES: List[SnapshotTable] = [
+    SnapshotTable("transactions", Transaction.id, [
+        SnapshotColumn("id", Transaction.id, "int64"),
+        SnapshotColumn("user_id", Transaction.user_id, "int64"),
+        SnapshotColumn("day", Transaction.created_at, "day"),
+        SnapshotColumn("amount", Transaction.amount, "float64"),
+        SnapshotColumn("status", Transaction.status, "category"),
+        SnapshotColumn("type", Transaction.type, "category"),
+        SnapshotColumn("payment_gateway", Transaction.payment_gateway, "category"),
+        SnapshotColumn("plan_id", func.coalesce(Transaction.plan_id, 0), "int32"),
+    ]),
+    SnapshotTable("services", Service.id, [
+        SnapshotColumn("id", Service.id, "int64"),
+        SnapshotColumn("user_id", Service.user_id, "int64"),
+        SnapshotColumn("plan_id", Service.plan_id, "int32"),
+        SnapshotColumn("server_id", Service.server_id, "int32"),
+        SnapshotColumn("purchased_day", Service.purchased_at, "day"),
+        SnapshotColumn("expires_day", Service.expires_at, "day"),
+        SnapshotColumn("renewal_count", func.coalesce(Service.renewal_count, 0), "int32"),
+        SnapshotColumn("is_active", Service.is_active, "bool"),
+        SnapshotColumn("is_test", Service.is_test, "bool"),
+    ]),
+    SnapshotTable("users", TelegramUser.id, [
+        SnapshotColumn("id", TelegramUser.id, "int64"),
+        SnapshotColumn("created_day", TelegramUser.created_at, "day"),
+        SnapshotColumn("referred_by_user_id", func.coalesce(TelegramUser.referred_by_user_id, 0), "int64"),
+        SnapshotColumn("registration_source", TelegramUser.registration_source, "category"),
+    ]),
+    SnapshotTable("profiles", UserProfile.id, [
+        SnapshotColumn("id", UserProfile.id, "int64"),
+        SnapshotColumn("user_id", UserProfile.user_id, "int64"),
+        SnapshotColumn("primary_segment", UserProfile.primary_segment, "category"),
+        SnapshotColumn("lifecycle_stage", UserProfile.lifecycle_stage, "category"),
+        SnapshotColumn("engagement_score", UserProfile.engagement_score, "float64"),
+    ]),
+    SnapshotTable("plans", Plan.id, [
+        SnapshotColumn("id", Plan.id, "int32"),
+        SnapshotColumn("category_id", Plan.category_id, "int32"),
+        SnapshotColumn("server_id", Plan.server_id, "int32"),
+    ]),
+]
+
+
+class AnalyticsSnapshot:
+    """A built snapshot: one memory-mapped .npy file per column.
+
+    Arrays are opened read-only with mmap, so several processes share the
+    page cache and only the columns a query touches are ever read.
+    """
+
+    def __init__(self, path: Path):
+        np = _numpy()
+        self.path = path
+        self.meta = json.loads((path / "meta.json").read_text())
+        self._np = np
+        self._arrays: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def created_at(self) -> datetime:
+        return datetime.fromisoformat(self.meta["created_at"])
+
+    def table(self, name: str) -> Dict[str, Any]:
+        if name not in self._arrays:
+            table_meta = self.meta["tables"][name]
+            rows = table_meta["rows"]
+            self._arrays[name] = {
+                column: self._np.load(self.path / f"{name}__{column}.npy", mmap_mode="r")[:rows]
+                for column in table_meta["columns"]
+            }
+        return self._arrays[name]
+
+    def categories(self, table: str, column: str) -> List[str]:
+        return self.meta["tables"][table]["categories"][column]
+
+    def code(self, table: str, column: str, value: str) -> int:
+        """Dictionary code of a category value, -1 when it never occurs"""
+        values = self.categories(table, column)
+        return values.index(value) if value in values else -1
+
+
+class AnalyticsSnapshotService:
+    """Builds columnar snapshots of the main tables for offline analytics.
+
+    Tables are streamed through a server-side cursor straight into
+    pre-sized memory-mapped arrays, so neither the build nor the analysis
+    holds a table in Python objects. Each build goes to a fresh directory
+    and CURRENT is switched atomically once it is complete.
+    """
+
+    @staticmethod
+    def base_dir() -> Path:
+        return Path(settings.analytics_snapshot_dir)
+
+    @staticmethod
+    def _encode(np, column: SnapshotColumn, values: List[Any], dictionary: Dict[str, int]):
+        if column.kind == "day":
+            days = np.array(values, dtype="datetime64[D]")
+            encoded = days.astype(np.int64)
+            encoded[np.isnat(days)] = -1
+            return encoded.astype(np.int32)
+        if column.kind == "category":
+            return np.array(
+                # Enum columns store their value, as in the database
+                [dictionary.setdefault("" if v is None else str(getattr(v, "value", v)), len(dictionary)) for v in values],
+                dtype=np.int16,
+            )
+        if column.kind == "bool":
+            return np.array([bool(v) for v in values], dtype=np.bool_)
+        if column.kind == "float64":
+            return np.array([float(v or 0) for v in values], dtype=np.float64)
+        return np.array([v or 0 for v in values], dtype=getattr(np, column.kind))
+
+    @staticmethod
+    async def _build_table(np, path: Path, table: SnapshotTable, chunk_size: int) -> Dict[str, Any]:
+        async with get_db_session() as session:
+            max_id = (await session.execute(select(func.max(table.id_column)))).scalar() or 0
+            expected = (await session.execute(
+                select(func.count()).select_from(table.id_column.table).where(table.id_column <= max_id)
+            )).scalar() or 0
+
+            dtypes = {"day": np.int32, "category": np.int16, "bool": np.bool_}
+            arrays = {
+                column.name: np.lib.format.open_memmap(
+                    path / f"{table.name}__{column.name}.npy", mode="w+",
+                    dtype=dtypes.get(column.kind) or getattr(np, column.kind), shape=(expected,),
+                )
+                for column in table.columns
+            }
+            dictionaries: Dict[str, Dict[str, int]] = {
+                column.name: {} for column in table.columns if column.kind == "category"
+            }
+
+            query = (
+                select(*(column.expression for column in table.columns))
+                .where(table.id_column <= max_id)
+                .order_by(table.id_column)
+                .execution_options(yield_per=chunk_size)
+            )
+            rows = 0
+            result = await session.stream(query)
+            async for partition in result.partitions():
+                # Rows inserted below max_id after the count are dropped, not overflowed
+                partition = partition[:expected - rows]
+                if not partition:
+                    break
+                for index, column in enumerate(table.columns):
+                    arrays[column.name][rows:rows + len(partition)] = AnalyticsSnapshotService._encode(
+                        np, column, [row[index] for row in partition], dictionaries.get(column.name, {})
+                    )
+                rows += len(partition)
+
+        for array in arrays.values():
+            array.flush()
+        return {
+            "rows": rows,
+            "columns": [column.name for column in table.columns],
+            "categories": {
+                name: [value for value, _code in sorted(dictionary.items(), key=lambda item: item[1])]
+                for name, dictionary in dictionaries.items()
+            },
+        }
+
+    @staticmethod
+    async def build(chunk_size: int = 20000, keep: int = 2) -> Dict[str, int]:
+        """Snapshot every table and make it the current one; returns rows per table"""
+
+        np = _numpy()
+        base = AnalyticsSnapshotService.base_dir()
+        base.mkdir(parents=True, exist_ok=True)
+        created_at = datetime.utcnow()
+        path = base / f"snapshot_{created_at:%Y%m%d%H%M%S%f}"
+        path.mkdir()
+
+        try:
+            tables = {}
+            for table in TABLES:
+                tables[table.name] = await AnalyticsSnapshotService._build_table(np, path, table, chunk_size)
+            (path / "meta.json").write_text(json.dumps({
+                "created_at": created_at.isoformat(),
+                "epoch": EPOCH.isoformat(),
+                "tables": tables,
+            }))
+        except BaseException:
+            shutil.rmtree(path, ignore_errors=True)
+            raise
+
+        pointer = base / "CURRENT.tmp"
+        pointer.write_text(path.name)
+        os.replace(pointer, base / "CURRENT")
+
+        snapshots = sorted(p for p in base.iterdir() if p.is_dir() and p.name.startswith("snapshot_"))
+        for old in snapshots[:-keep]:
+            shutil.rmtree(old, ignore_errors=True)
+
+        logger.info("Analytics snapshot %s built", path.name)
+        return {name: meta["rows"] for name, meta in tables.items()}
+
+    @staticmethod
+    def open_current() -> AnalyticsSnapshot:
+        base = AnalyticsSnapshotService.base_dir()
+        try:
+            name = (base / "CURRENT").read_text().strip()
+        except FileNotFoundError:
+            raise SnapshotUnavailable("No analytics snapshot has been built yet")
+        return AnalyticsSnapshot(base / name)
+
+    @staticmethod
+    def is_available() -> bool:
+        try:
+            _numpy()
+        except SnapshotUnavailable:
+            return False
+        return True
@@ -1,10 +1,12 @@
 import json
 import hashlib
-from datetime import datetime, timedelta
-from typing import List, Optional, Dict, Any, Tuple
-from sqlalchemy import select, func, and_, or_, desc
+from datetime import datetime
+from typing import List, Optional, Dict, Any
+from sqlalchemy import select, update, func, desc
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from core.config import settings
+
 from models.anti_fraud import (
     FraudRule, FraudDetection, UserFraudProfile, FraudPattern,
     FraudAlert, FraudWhitelist, FraudBlacklist,
@@ -13,6 +15,11 @@ from models.anti_fraud import (
 from models.user import TelegramUser
 from models.billing import Transaction
 from models.service import Service
+from services.fraud_features import FraudFeatureService
+from services.fraud_lists import FraudListService
+from services.fraud_rules import FraudRuleEngine, CompiledRule, RuleContext
+from services.receipt_hash import ReceiptHashService
+from services.risk_counters import RiskCounterService
 
 
 class AntiFraudService:
@@ -28,9 +35,6 @@ class AntiFraudService:
         
         detections = []
         
-        # Get user fraud profile
-        profile = await AntiFraudService._get_user_fraud_profile(session, user.id)
-        
         # Check if user is whitelisted
         if await AntiFraudService._is_user_whitelisted(session, user):
             return detections
@@ -45,15 +49,27 @@ class AntiFraudService:
             detections.append(detection)
             return detections
         
-        # Run fraud detection rules
-        active_rules = (await session.execute(
-            select(FraudRule).where(FraudRule.is_active == True)
-        )).scalars().all()
-        
-        for rule in active_rules:
-            detection = await AntiFraudService._check_fraud_rule(
-                session, rule, transaction, user, profile
+        # Compiled active rules; everything they look at is gathered up front
+        rules = await FraudRuleEngine.rules(session)
+        features = await FraudFeatureService.extract(
+            session, user.id, transaction.amount,
+            windows=FraudRuleEngine.windows(rules), exclude_id=transaction.id
+        )
+        context = RuleContext(
+            transaction=transaction,
+            features=features,
+            velocity=await RiskCounterService.velocity(session, user.id)
+        )
+        if (
+            transaction.receipt_image_hash and settings.receipt_hash_scoring
+            and any(rule.fraud_type == FraudType.FAKE_RECEIPT for rule in rules)
+        ):
+            context.similar_receipts = await ReceiptHashService.find_similar(
+                session, transaction.receipt_image_hash, transaction.amount, exclude_id=transaction.id
             )
+        
+        for rule in rules:
+            detection = await AntiFraudService._check_fraud_rule(session, rule, context, user)
             if detection:
                 detections.append(detection)
         
@@ -65,274 +81,37 @@ class AntiFraudService:
     @staticmethod
     async def _check_fraud_rule(
         session: AsyncSession,
-        rule: FraudRule,
-        transaction: Transaction,
-        user: TelegramUser,
-        profile: UserFraudProfile
+        rule: CompiledRule,
+        context: RuleContext,
+        user: TelegramUser
     ) -> Optional[FraudDetection]:
         """Check if transaction matches fraud rule"""
         
-        try:
-            criteria = json.loads(rule.criteria)
-            confidence = 0.0
-            evidence = {}
-            
-            if rule.fraud_type == FraudType.FAKE_RECEIPT:
-                confidence, evidence = await AntiFraudService._check_fake_receipt(
-                    session, transaction, criteria
-                )
-            
-            elif rule.fraud_type == FraudType.DUPLICATE_PAYMENT:
-                confidence, evidence = await AntiFraudService._check_duplicate_payment(
-                    session, transaction, criteria
-                )
-            
-            elif rule.fraud_type == FraudType.HIGH_FREQUENCY:
-                confidence, evidence = await AntiFraudService._check_high_frequency(
-                    session, user, criteria
-                )
-            
-            elif rule.fraud_type == FraudType.UNUSUAL_AMOUNT:
-                confidence, evidence = await AntiFraudService._check_unusual_amount(
-                    session, user, transaction, criteria
-                )
-            
-            elif rule.fraud_type == FraudType.SUSPICIOUS_PATTERN:
-                confidence, evidence = await AntiFraudService._check_suspicious_pattern(
-                    session, user, transaction, criteria
-                )
-            
-            # Check if confidence meets threshold
-            if confidence >= (rule.threshold or 0.7):
-                detection = await AntiFraudService._create_fraud_detection(
-                    session, user.id, rule.fraud_type, rule.severity,
-                    confidence, f"Rule triggered: {rule.name}", evidence,
-                    rule_id=rule.id, transaction_id=transaction.id
-                )
-                
-                # Update rule statistics
-                rule.triggered_count += 1
-                rule.last_triggered_at = datetime.utcnow()
-                
-                # Take automatic action if enabled
-                if rule.auto_action:
-                    await AntiFraudService._execute_fraud_action(
-                        session, detection, rule.action
-                    )
-                
-                return detection
-        
-        except Exception as e:
-            print(f"Error checking fraud rule {rule.name}: {e}")
-        
-        return None
-    
-    @staticmethod
-    async def _check_fake_receipt(
-        session: AsyncSession,
-        transaction: Transaction,
-        criteria: Dict[str, Any]
-    ) -> Tuple[float, Dict[str, Any]]:
-        """Check for fake receipt patterns"""
-        
-        confidence = 0.0
-        evidence = {}
-        
-        # Check receipt image hash (if available)
-        if hasattr(transaction, 'receipt_image_hash') and transaction.receipt_image_hash:
-            # Check if this hash has been used before
-            duplicate_count = (await session.execute(
-                select(func.count(Transaction.id))
-                .where(Transaction.receipt_image_hash == transaction.receipt_image_hash)
-            )).scalar()
-            
-            if duplicate_count > 1:
-                confidence += 0.8
-                evidence["duplicate_receipt_hash"] = transaction.receipt_image_hash
-                evidence["duplicate_count"] = duplicate_count
-        
-        # Check receipt amount vs transaction amount
-        if hasattr(transaction, 'receipt_amount') and transaction.receipt_amount:
-            if abs(transaction.receipt_amount - transaction.amount) > 1000:  # 1K IRR difference
-                confidence += 0.6
-                evidence["amount_mismatch"] = {
-                    "receipt_amount": transaction.receipt_amount,
-                    "transaction_amount": transaction.amount
-                }
-        
-        # Check receipt date vs transaction date
-        if hasattr(transaction, 'receipt_date') and transaction.receipt_date:
-            time_diff = abs((transaction.created_at - transaction.receipt_date).total_seconds())
-            if time_diff > 3600:  # More than 1 hour difference
-                confidence += 0.4
-                evidence["date_mismatch"] = {
-                    "receipt_date": transaction.receipt_date.isoformat(),
-                    "transaction_date": transaction.created_at.isoformat()
-                }
-        
-        return min(confidence, 1.0), evidence
-    
-    @staticmethod
-    async def _check_duplicate_payment(
-        session: AsyncSession,
-        transaction: Transaction,
-        criteria: Dict[str, Any]
-    ) -> Tuple[float, Dict[str, Any]]:
-        """Check for duplicate payments"""
-        
-        confidence = 0.0
-        evidence = {}
-        
-        # Check for same amount within time window
-        time_window = timedelta(hours=criteria.get("time_window_hours", 1))
-        start_time = transaction.created_at - time_window
-        
-        duplicate_transactions = (await session.execute(
-            select(Transaction)
-            .where(
-                and_(
-                    Transaction.user_id == transaction.user_id,
-                    Transaction.amount == transaction.amount,
-                    Transaction.created_at >= start_time,
-                    Transaction.created_at <= transaction.created_at,
-                    Transaction.id != transaction.id
-                )
-            )
-        )).scalars().all()
-        
-        if duplicate_transactions:
-            confidence = min(len(duplicate_transactions) * 0.3, 1.0)
-            evidence["duplicate_transactions"] = [
-                {"id": t.id, "amount": t.amount, "created_at": t.created_at.isoformat()}
-                for t in duplicate_transactions
-            ]
-        
-        return confidence, evidence
-    
-    @staticmethod
-    async def _check_high_frequency(
-        session: AsyncSession,
-        user: TelegramUser,
-        criteria: Dict[str, Any]
-    ) -> Tuple[float, Dict[str, Any]]:
-        """Check for high frequency transactions"""
-        
-        confidence = 0.0
-        evidence = {}
-        
-        # Check transactions in last 24 hours
-        time_window = timedelta(hours=criteria.get("time_window_hours", 24))
-        start_time = datetime.utcnow() - time_window
-        
-        recent_transactions = (await session.execute(
-            select(func.count(Transaction.id))
-            .where(
-                and_(
-                    Transaction.user_id == user.id,
-                    Transaction.created_at >= start_time
-                )
-            )
-        )).scalar()
+        result = rule.evaluate(context)
+        if not result:
+            return None
+        confidence, evidence = result
         
-        max_transactions = criteria.get("max_transactions", 10)
-        if recent_transactions > max_transactions:
-            confidence = min((recent_transactions - max_transactions) / max_transactions, 1.0)
-            evidence["high_frequency"] = {
-                "transactions_count": recent_transactions,
-                "max_allowed": max_transactions,
-                "time_window_hours": criteria.get("time_window_hours", 24)
-            }
+        detection = await AntiFraudService._create_fraud_detection(
+            session, user.id, rule.fraud_type, rule.severity,
+            confidence, f"Rule triggered: {rule.name}", evidence,
+            rule_id=rule.id, transaction_id=context.transaction.id
+        )
         
-        return confidence, evidence
-    
-    @staticmethod
-    async def _check_unusual_amount(
-        session: AsyncSession,
-        user: TelegramUser,
-        transaction: Transaction,
-        criteria: Dict[str, Any]
-    ) -> Tuple[float, Dict[str, Any]]:
-        """Check for unusual transaction amounts"""
-        
-        confidence = 0.0
-        evidence = {}
-        
-        # Get user's transaction history
-        user_transactions = (await session.execute(
-            select(Transaction.amount)
-            .where(Transaction.user_id == user.id)
-            .order_by(Transaction.created_at.desc())
-            .limit(50)
-        )).scalars().all()
+        # Update rule statistics
+        await session.execute(
+            update(FraudRule)
+            .where(FraudRule.id == rule.id)
+            .values(triggered_count=FraudRule.triggered_count + 1, last_triggered_at=datetime.utcnow())
+        )
         
-        if len(user_transactions) >= 5:  # Need at least 5 transactions for analysis
-            avg_amount = sum(user_transactions) / len(user_transactions)
-            max_amount = max(user_transactions)
-            
-            # Check if current transaction is significantly higher than average
-            if transaction.amount > avg_amount * criteria.get("multiplier", 3):
-                confidence += 0.6
-                evidence["unusual_amount"] = {
-                    "current_amount": transaction.amount,
-                    "average_amount": avg_amount,
-                    "max_previous_amount": max_amount
-                }
-            
-            # Check if amount is higher than previous maximum
-            if transaction.amount > max_amount * 1.5:
-                confidence += 0.4
-                evidence["exceeds_maximum"] = {
-                    "current_amount": transaction.amount,
-                    "previous_maximum": max_amount
-                }
-        
-        return min(confidence, 1.0), evidence
-    
-    @staticmethod
-    async def _check_suspicious_pattern(
-        session: AsyncSession,
-        user: TelegramUser,
-        transaction: Transaction,
-        criteria: Dict[str, Any]
-    ) -> Tuple[float, Dict[str, Any]]:
-        """Check for suspicious behavioral patterns"""
-        
-        confidence = 0.0
-        evidence = {}
-        
-        # Check for rapid successive transactions
-        recent_transactions = (await session.execute(
-            select(Transaction)
-            .where(
-                and_(
-                    Transaction.user_id == user.id,
-                    Transaction.created_at >= datetime.utcnow() - timedelta(hours=1)
-                )
+        # Take automatic action if enabled
+        if rule.auto_action:
+            await AntiFraudService._execute_fraud_action(
+                session, detection, rule.action
             )
-            .order_by(Transaction.created_at.desc())
-        )).scalars().all()
         
-        if len(recent_transactions) >= 3:
-            # Check if transactions are very close in time
-            time_gaps = []
-            for i in range(len(recent_transactions) - 1):
-                gap = (recent_transactions[i].created_at - recent_transactions[i + 1].created_at).total_seconds()
-                time_gaps.append(gap)
-            
-            avg_gap = sum(time_gaps) / len(time_gaps)
-            if avg_gap < 300:  # Less than 5 minutes between transactions
-                confidence += 0.7
-                evidence["rapid_transactions"] = {
-                    "transaction_count": len(recent_transactions),
-                    "average_gap_seconds": avg_gap
-                }
-        
-        # Check for round number amounts (potential fake transactions)
-        if transaction.amount % 10000 == 0 and transaction.amount >= 100000:  # Round 10K amounts
-            confidence += 0.3
-            evidence["round_amount"] = transaction.amount
-        
-        return min(confidence, 1.0), evidence
+        return detection
     
     @staticmethod
     async def _create_fraud_detection(
@@ -485,37 +264,13 @@ class AntiFraudService:
     async def _is_user_whitelisted(session: AsyncSession, user: TelegramUser) -> bool:
         """Check if user is whitelisted"""
         
-        whitelist = (await session.execute(
-            select(FraudWhitelist)
-            .where(
-                and_(
-                    FraudWhitelist.user_id == user.id,
-                    FraudWhitelist.is_active == True,
-                    or_(
-                        FraudWhitelist.expires_at.is_(None),
-                        FraudWhitelist.expires_at > datetime.utcnow()
-                    )
-                )
-            )
-        )).scalar_one_or_none()
-        
-        return whitelist is not None
+        return await FraudListService.is_whitelisted(session, user.id)
     
     @staticmethod
     async def _is_user_blacklisted(session: AsyncSession, user: TelegramUser) -> bool:
-        """Check if user is blacklisted"""
-        
-        blacklist = (await session.execute(
-            select(FraudBlacklist)
-            .where(
-                and_(
-                    FraudBlacklist.user_id == user.id,
-                    FraudBlacklist.is_active == True
-                )
-            )
-        )).scalar_one_or_none()
+        """Check if user (or their phone number) is blacklisted"""
         
-        return blacklist is not None
+        return await FraudListService.is_blacklisted(session, user)
     
     @staticmethod
     async def get_fraud_analytics(session: AsyncSession) -> Dict[str, Any]:
@@ -579,6 +334,7 @@ class AntiFraudService:
             created_by=created_by
         )
         session.add(blacklist_entry)
+        FraudListService.blacklist_added(session, blacklist_entry)
         
         # Block user if auto_block is enabled
         if blacklist_entry.auto_block:
@@ -607,5 +363,6 @@ class AntiFraudService:
             expires_at=expires_at
         )
         session.add(whitelist_entry)
+        FraudListService.whitelist_added(session, whitelist_entry)
         
         return whitelist_entry
\ No newline at end of file
@@ -0,0 +1,387 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select, delete, func, and_, text
+
+from core.config import settings
+from core.db import get_db_session
+from models.crm import UserActivity
+from models.notifications import NotificationLog
+from models.scheduled_messages import MessageRecipient
+
+
+logger = logging.getLogger(__name__)
+
+
+class ArchiveError(Exception):
+    pass
+
+
+@dataclass
+class ArchiveTable:
+    model: Any
+    time_column: Any  # partition key; rows are archived by the month of this column
+
+
+# Append-only tables that are partitioned by month and archived when cold.
+# `transaction` and `frauddetection` are left out on purpose: other tables
+# reference them with foreign keys, which MySQL partitioned tables cannot have.
+ARCHIVE_TABLES: Dict[str, ArchiveTable] = {
+    "notificationlog": ArchiveTable(NotificationLog, NotificationLog.attempted_at),
+    "messagerecipient": ArchiveTable(MessageRecipient, MessageRecipient.created_at),
+    "useractivity": ArchiveTable(UserActivity, UserActivity.created_at),
+}
+
+
+def _month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _partition_name(month: date) -> str:
+    return f"p{month:%Y%m}"
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Cannot archive value of type {type(value).__name__}")
+
+
+class ArchiveService:
+    """Monthly range partitions and cold-month archival of append-only tables.
+
+    On MySQL a table converted with `partition_table` gets one partition per
+    month of its time column (RANGE COLUMNS) and a catch-all `pmax`. The
+    maintenance job keeps partitions for the next months split out of pmax.
+    Archiving a month streams its rows into a gzipped JSON Lines file, checks
+    the row count and then drops the partition, which is instant and leaves
+    no fragmentation. Tables that are not partitioned (or other databases)
+    fall back to chunked deletes. `iter_rows` reads a time range from the
+    archive files and the live table together for historical reports.
+    """
+
+    @staticmethod
+    def get_table(name: str) -> ArchiveTable:
+        spec = ARCHIVE_TABLES.get(name)
+        if spec is None:
+            raise ArchiveError(f"Unknown archive table: {name}")
+        return spec
+
+    @staticmethod
+    def archive_path(name: str, month: date) -> Path:
+        return Path(settings.archive_dir) / name / f"{name}_{month:%Y%m}.jsonl.gz"
+
+    @staticmethod
+    def _is_mysql(session) -> bool:
+        return session.get_bind().dialect.name == "mysql"
+
+    @staticmethod
+    async def partitions(session, name: str) -> List[Tuple[str, str]]:
+        """(partition name, upper bound) of a MySQL table; empty when not partitioned"""
+
+        if not ArchiveService._is_mysql(session):
+            return []
+        rows = (await session.execute(
+            text(
+                "SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL "
+                "ORDER BY PARTITION_ORDINAL_POSITION"
+            ),
+            {"table": name},
+        )).all()
+        return [(row[0], row[1]) for row in rows]
+
+    @staticmethod
+    def _partition_clauses(months: List[date]) -> str:
+        clauses = [
+            f"PARTITION {_partition_name(month)} VALUES LESS THAN ('{_add_months(month, 1):%Y-%m-%d}')"
+            for month in months
+        ]
+        clauses.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+        return ", ".join(clauses)
+
+    @staticmethod
+    async def partition_table(name: str, months_ahead: Optional[int] = None) -> int:
+        """Convert a table to monthly partitions (MySQL, rewrites the table); returns partitions created"""
+
+        spec = ArchiveService.get_table(name)
+        column = spec.time_column.key
+        months_ahead = settings.partition_months_ahead if months_ahead is None else months_ahead
+        async with get_db_session() as session:
+            if not ArchiveService._is_mysql(session):
+                raise ArchiveError("Partitioning is only supported on MySQL")
+            if await ArchiveService.partitions(session, name):
+                raise ArchiveError(f"{name} is already partitioned")
+
+            # Partitioned InnoDB tables cannot have foreign keys, and the partition
+            # column has to be part of every unique key
+            unique_keys = (await session.execute(
+                text(
+                    "SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS "
+                    "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table "
+                    "AND NON_UNIQUE = 0 AND INDEX_NAME != 'PRIMARY'"
+                ),
+                {"table": name},
+            )).scalars().all()
+            if unique_keys:
+                raise ArchiveError(f"{name} has unique keys ({', '.join(unique_keys)}) that prevent partitioning")
+            foreign_keys = (await session.execute(
+                text(
+                    "SELECT CONSTRAINT_NAME FROM information_schema.REFERENTIAL_CONSTRAINTS "
+                    "WHERE CONSTRAINT_SCHEMA = DATABASE() AND TABLE_NAME = :table"
+                ),
+                {"table": name},
+            )).scalars().all()
+            for foreign_key in foreign_keys:
+                await session.execute(text(f"ALTER TABLE `{name}` DROP FOREIGN KEY `{foreign_key}`"))
+            await session.execute(text(f"ALTER TABLE `{name}` DROP PRIMARY KEY, ADD PRIMARY KEY (id, `{column}`)"))
+
+            first = (await session.execute(select(func.min(spec.time_column)))).scalar()
+            current = _month_start(datetime.utcnow().date())
+            month = _month_start(first.date()) if first else current
+            months = []
+            while month <= _add_months(current, months_ahead):
+                months.append(month)
+                month = _add_months(month, 1)
+            await session.execute(text(
+                f"ALTER TABLE `{name}` PARTITION BY RANGE COLUMNS(`{column}`) "
+                f"({ArchiveService._partition_clauses(months)})"
+            ))
+        logger.info("Partitioned %s into %d months", name, len(months))
+        return len(months)
+
+    @staticmethod
+    async def ensure_partitions(months_ahead: Optional[int] = None) -> Dict[str, int]:
+        """Split partitions for the coming months out of pmax; returns partitions added per table"""
+
+        months_ahead = settings.partition_months_ahead if months_ahead is None else months_ahead
+        target = _add_months(_month_start(datetime.utcnow().date()), months_ahead)
+        added: Dict[str, int] = {}
+        for name in ARCHIVE_TABLES:
+            async with get_db_session() as session:
+                existing = await ArchiveService.partitions(session, name)
+                if not existing:
+                    continue
+                monthly = [partition for partition, _bound in existing if partition != "pmax"]
+                last = datetime.strptime(max(monthly), "p%Y%m").date() if monthly else _add_months(target, -1)
+                months = []
+                month = _add_months(last, 1)
+                while month <= target:
+                    months.append(month)
+                    month = _add_months(month, 1)
+                if months:
+                    # pmax only holds rows past the last month, so this is normally instant
+                    await session.execute(text(
+                        f"ALTER TABLE `{name}` REORGANIZE PARTITION pmax INTO "
+                        f"({ArchiveService._partition_clauses(months)})"
+                    ))
+                added[name] = len(months)
+        return added
+
+    @staticmethod
+    def _write_file(path: Path, lines: List[str], append: bool) -> None:
+        with gzip.open(path, "at" if append else "wt", encoding="utf-8") as f:
+            f.writelines(lines)
+
+    @staticmethod
+    def _archive_line(row) -> str:
+        return json.dumps(dict(row._mapping), default=_json_default, ensure_ascii=False) + "\n"
+
+    @staticmethod
+    def _read_lines(path: Path) -> Set[int]:
+        """Hashes of the lines of an archive file, to recognise rows already written to it"""
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return {hash(line) for line in f}
+
+    @staticmethod
+    async def _remove_month(name: str, month: date, in_month, chunk_size: int) -> None:
+        """Drop the month's partition, or delete its rows in short transactions when not partitioned"""
+
+        table = ArchiveService.get_table(name).model.__table__
+        partition_name = _partition_name(month)
+        async with get_db_session() as session:
+            existing = [partition for partition, _bound in await ArchiveService.partitions(session, name)]
+            if partition_name in existing:
+                await session.execute(text(f"ALTER TABLE `{name}` DROP PARTITION {partition_name}"))
+                return
+
+        while True:
+            async with get_db_session() as session:
+                ids = (await session.execute(
+                    select(table.c.id).where(in_month).order_by(table.c.id).limit(chunk_size)
+                )).scalars().all()
+                if not ids:
+                    break
+                await session.execute(delete(table).where(table.c.id.in_(ids)))
+
+    @staticmethod
+    async def archive_month(name: str, month: date, chunk_size: int = 5000) -> int:
+        """Move one month of a table to its archive file; returns rows archived
+
+        When the file is already there (an earlier run wrote it, then failed to
+        drop or delete), the run resumes: if every live row of the month is in
+        the file, the drop or delete is finished and 0 is returned.
+        """
+
+        spec = ArchiveService.get_table(name)
+        month = _month_start(month)
+        start_at = datetime.combine(month, datetime.min.time())
+        end_at = datetime.combine(_add_months(month, 1), datetime.min.time())
+        in_month = and_(spec.time_column >= start_at, spec.time_column < end_at)
+        table = spec.model.__table__
+
+        path = ArchiveService.archive_path(name, month)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_name(path.name + ".tmp")
+        written = 0
+        async with get_db_session() as session:
+            expected = (await session.execute(select(func.count()).select_from(table).where(in_month))).scalar() or 0
+            if not expected:
+                return 0
+            resume = path.exists()
+            if resume:
+                # Whole rows are compared, not ids: a database may hand out a deleted id again
+                archived = await asyncio.to_thread(ArchiveService._read_lines, path)
+                missing = 0
+                result = await session.stream(
+                    select(table).where(in_month).execution_options(yield_per=chunk_size)
+                )
+                async for partition in result.partitions():
+                    missing += sum(hash(ArchiveService._archive_line(row)) not in archived for row in partition)
+                if missing:
+                    raise ArchiveError(f"{path} exists but {missing} of the {expected} {name} rows for {month:%Y-%m} are not in it")
+        if resume:
+            logger.info("Resuming %s %s: removing %d rows already in %s", name, f"{month:%Y-%m}", expected, path)
+            await ArchiveService._remove_month(name, month, in_month, chunk_size)
+            return 0
+
+        async with get_db_session() as session:
+            result = await session.stream(
+                select(table).where(in_month).order_by(table.c.id).execution_options(yield_per=chunk_size)
+            )
+            try:
+                async for partition in result.partitions():
+                    lines = [ArchiveService._archive_line(row) for row in partition]
+                    await asyncio.to_thread(ArchiveService._write_file, partial, lines, written > 0)
+                    written += len(lines)
+                if written != expected:
+                    raise ArchiveError(f"{name} {month:%Y-%m}: wrote {written} rows, expected {expected}")
+            except BaseException:
+                partial.unlink(missing_ok=True)
+                raise
+        os.replace(partial, path)
+
+        await ArchiveService._remove_month(name, month, in_month, chunk_size)
+        return written
+
+    @staticmethod
+    async def archive_cold(after_months: Optional[int] = None) -> Dict[str, int]:
+        """Archive every month older than `after_months` whole months; returns rows per table"""
+
+        after_months = settings.archive_after_months if after_months is None else after_months
+        cutoff = _add_months(_month_start(datetime.utcnow().date()), -after_months)
+        cutoff_at = datetime.combine(cutoff, datetime.min.time())
+        archived: Dict[str, int] = {}
+        for name, spec in ARCHIVE_TABLES.items():
+            async with get_db_session() as session:
+                first = (await session.execute(
+                    select(func.min(spec.time_column)).where(spec.time_column < cutoff_at)
+                )).scalar()
+            total = 0
+            month = _month_start(first.date()) if first else cutoff
+            while month < cutoff:
+                try:
+                    rows = await ArchiveService.archive_month(name, month)
+                except ArchiveError as e:
+                    # Leave this table for an admin; the other tables still get archived
+                    logger.error("Archiving %s stopped at %s: %s", name, f"{month:%Y-%m}", e)
+                    break
+                if rows:
+                    logger.info("Archived %d %s rows of %s", rows, name, f"{month:%Y-%m}")
+                total += rows
+                month = _add_months(month, 1)
+            archived[name] = total
+        return archived
+
+    @staticmethod
+    async def maintain() -> Dict[str, Any]:
+        """Nightly job: add upcoming partitions and, when enabled, archive cold months"""
+
+        result: Dict[str, Any] = {"partitions_added": await ArchiveService.ensure_partitions()}
+        if settings.archive_enabled:
+            result["archived"] = await ArchiveService.archive_cold()
+        return result
+
+    @staticmethod
+    def _read_file(path: Path, column: str, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+        low, high = start.isoformat(), end.isoformat()
+        rows = []
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                row = json.loads(line)
+                # ISO timestamps compare correctly as strings
+                if row[column] is not None and low <= row[column] < high:
+                    rows.append(row)
+        return rows
+
+    @staticmethod
+    async def iter_rows(name: str, start: datetime, end: datetime, chunk_size: int = 2000) -> AsyncIterator[Dict[str, Any]]:
+        """Rows of `name` with start <= time < end, from archive files and the live table.
+
+        Archived rows come back in their JSON form (ISO timestamps, decimals
+        as strings); live rows as returned by the database driver.
+        """
+
+        spec = ArchiveService.get_table(name)
+        column = spec.time_column.key
+        table = spec.model.__table__
+        # Archive lines of months not dropped from the table yet, so those rows come back once
+        archived_live: Set[int] = set()
+        month = _month_start(start.date())
+        while month < end.date():
+            path = ArchiveService.archive_path(name, month)
+            if path.exists():
+                rows = await asyncio.to_thread(ArchiveService._read_file, path, column, start, end)
+                async with get_db_session() as session:
+                    still_live = (await session.execute(
+                        select(func.count()).select_from(table).where(and_(
+                            spec.time_column >= datetime.combine(month, datetime.min.time()),
+                            spec.time_column < datetime.combine(_add_months(month, 1), datetime.min.time()),
+                        ))
+                    )).scalar()
+                if still_live:
+                    archived_live.update(await asyncio.to_thread(ArchiveService._read_lines, path))
+                for row in rows:
+                    yield row
+            month = _add_months(month, 1)
+
+        query = (
+            select(table)
+            .where(and_(spec.time_column >= start, spec.time_column < end))
+            .order_by(table.c.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        async with get_db_session() as session:
+            result = await session.stream(query)
+            async for partition in result.partitions():
+                for row in partition:
+                    if not archived_live or hash(ArchiveService._archive_line(row)) not in archived_live:
+                        yield dict(row._mapping)
@@ -0,0 +1,225 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, func, and_, case, cast, Integer, literal
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.billing import Transaction
+from models.catalog import Plan, Server
+from models.service import Service
+from models.user import TelegramUser
+
+
+PERIODS = ("week", "month")
+DIMENSIONS = ("signup", "plan", "server", "referral")
+
+# Transactions that count as the user paying for a service (new or renewal)
+PAYING_TYPES = ("purchase", "purchase_receipt")
+
+
+def _period_index(session: AsyncSession, column, period: str):
+    """SQL expression numbering the week (Monday based) or month of a timestamp"""
+    if period == "month":
+        return cast(func.extract("year", column) * 12 + func.extract("month", column) - 1, Integer)
+    if session.get_bind().dialect.name == "mysql":
+        days = func.to_days(column) - 719528  # TO_DAYS('1970-01-01')
+    else:
+        days = cast(func.julianday(func.date(column)) - 2440587.5, Integer)
+    return cast(func.floor((days + 3) / 7), Integer)  # 1970-01-01 was a Thursday
+
+
+def _period_start(index: int, period: str) -> date:
+    if period == "month":
+        return date(index // 12, index % 12 + 1, 1)
+    return date(1970, 1, 1) + timedelta(days=index * 7 - 3)
+
+
+def _current_index(period: str, today: date) -> int:
+    if period == "month":
+        return today.year * 12 + today.month - 1
+    return ((today - date(1970, 1, 1)).days + 3) // 7
+
+
+class CohortReportService:
+    """Signup-cohort retention and renewal rates computed in SQL.
+
+    A user is retained in period N when they paid for a service (purchase or
+    renewal) N weeks/months after signing up. Cohorts can be split by the
+    plan or server of the user's first paid purchase (picked with a window
+    function) or by acquisition source. The database returns one row per
+    cohort x segment x offset, so cost in Python does not grow with the
+    number of services. Reports are cached until the day changes.
+    """
+
+    _cache: Dict[Tuple, Tuple[date, Dict[str, Any]]] = {}
+
+    @staticmethod
+    def _segment(dimension: str, since: datetime):
+        """(segment key column, first-purchase subquery or None)"""
+        if dimension == "signup":
+            return literal("all").label("segment"), None
+        if dimension == "referral":
+            return case(
+                (TelegramUser.referred_by_user_id.isnot(None), "referral"),
+                else_=func.coalesce(TelegramUser.registration_source, "bot")
+            ).label("segment"), None
+
+        # Plan/server segments hold the cohort users whose first paid purchase was on it
+        first_paid = (
+            select(
+                Transaction.user_id.label("user_id"),
+                Transaction.plan_id.label("plan_id"),
+                func.row_number().over(
+                    partition_by=Transaction.user_id,
+                    order_by=(Transaction.created_at, Transaction.id)
+                ).label("rn")
+            )
+            .where(
+                and_(
+                    Transaction.status == "approved",
+                    Transaction.type.in_(PAYING_TYPES),
+                    Transaction.plan_id.isnot(None),
+                    Transaction.created_at >= since
+                )
+            )
+            .subquery("first_paid")
+        )
+        key = first_paid.c.plan_id if dimension == "plan" else Plan.server_id
+        return key.label("segment"), first_paid
+
+    @staticmethod
+    async def build_report(
+        session: AsyncSession,
+        period: str = "month",
+        dimension: str = "signup",
+        cohorts: int = 12,
+        today: Optional[date] = None
+    ) -> Dict[str, Any]:
+        if period not in PERIODS:
+            raise ValueError(f"Unknown period: {period}")
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"Unknown dimension: {dimension}")
+
+        today = today or datetime.utcnow().date()
+        current = _current_index(period, today)
+        first_cohort = current - cohorts + 1
+        since = datetime.combine(_period_start(first_cohort, period), datetime.min.time())
+
+        cohort = _period_index(session, TelegramUser.created_at, period).label("cohort")
+        segment, first_paid = CohortReportService._segment(dimension, since)
+
+        def with_segment(query):
+            if first_paid is None:
+                return query
+            query = query.join(first_paid, and_(first_paid.c.user_id == TelegramUser.id, first_paid.c.rn == 1))
+            if dimension == "server":
+                query = query.join(Plan, Plan.id == first_paid.c.plan_id)
+            return query
+
+        in_cohorts = TelegramUser.created_at >= since
+
+        # Cohort sizes
+        size_rows = (await session.execute(
+            with_segment(select(cohort, segment, func.count(TelegramUser.id)).select_from(TelegramUser))
+            .where(in_cohorts)
+            .group_by(cohort, segment)
+        )).all()
+
+        # Distinct paying users per cohort, segment and offset
+        paid_period = _period_index(session, Transaction.created_at, period)
+        activity = (
+            select(Transaction.user_id.label("user_id"), paid_period.label("paid_period"))
+            .where(
+                and_(
+                    Transaction.status == "approved",
+                    Transaction.type.in_(PAYING_TYPES),
+                    Transaction.created_at >= since
+                )
+            )
+            .distinct()
+            .subquery("activity")
+        )
+        offset = (activity.c.paid_period - cohort).label("period_offset")
+        retention_rows = (await session.execute(
+            with_segment(
+                select(cohort, segment, offset, func.count(activity.c.user_id))
+                .select_from(TelegramUser)
+                .join(activity, activity.c.user_id == TelegramUser.id)
+            )
+            .where(in_cohorts)
+            .group_by(cohort, segment, offset)
+        )).all()
+
+        # Users with at least one renewed service (the renew handler bumps renewal_count)
+        renewed_users = (
+            select(Service.user_id.label("user_id"))
+            .where(Service.renewal_count > 0)
+            .distinct()
+            .subquery("renewed")
+        )
+        renewal_rows = (await session.execute(
+            with_segment(
+                select(cohort, segment, func.count(renewed_users.c.user_id))
+                .select_from(TelegramUser)
+                .join(renewed_users, renewed_users.c.user_id == TelegramUser.id)
+            )
+            .where(in_cohorts)
+            .group_by(cohort, segment)
+        )).all()
+
+        # Segment labels
+        labels: Dict[Any, str] = {}
+        if dimension == "plan":
+            labels = dict((await session.execute(select(Plan.id, Plan.title))).all())
+        elif dimension == "server":
+            labels = dict((await session.execute(select(Server.id, Server.name))).all())
+
+        max_offset = current - first_cohort
+        active: Dict[Tuple[int, Any], List[int]] = defaultdict(lambda: [0] * (max_offset + 1))
+        for cohort_index, key, off, users in retention_rows:
+            if off is not None and 0 <= int(off) <= max_offset:
+                active[(int(cohort_index), key)][int(off)] = users
+        renewed = {(int(c), key): users for c, key, users in renewal_rows}
+
+        rows = []
+        for cohort_index, key, size in sorted(size_rows, key=lambda r: (int(r[0]), str(r[1]))):
+            cohort_index = int(cohort_index)
+            observed = current - cohort_index + 1  # offsets that have already happened
+            counts = active[(cohort_index, key)][:observed]
+            rows.append({
+                "cohort": _period_start(cohort_index, period).isoformat(),
+                "segment": labels.get(key, key),
+                "size": size,
+                "retained": counts,
+                "retention": [round(users / size, 4) if size else 0 for users in counts],
+                "renewal_rate": round(renewed.get((cohort_index, key), 0) / size, 4) if size else 0,
+            })
+
+        return {
+            "period": period,
+            "dimension": dimension,
+            "generated_for": today.isoformat(),
+            "cohorts": rows,
+        }
+
+    @staticmethod
+    async def get_report(
+        session: AsyncSession,
+        period: str = "month",
+        dimension: str = "signup",
+        cohorts: int = 12
+    ) -> Dict[str, Any]:
+        """Cached report; recomputed once per UTC day"""
+
+        today = datetime.utcnow().date()
+        key = (period, dimension, cohorts)
+        cached = CohortReportService._cache.get(key)
+        if cached and cached[0] == today:
+            return cached[1]
+
+        report = await CohortReportService.build_report(session, period, dimension, cohorts, today)
+        # Drop reports of previous days
+        CohortReportService._cache = {k: v for k, v in CohortReportService._cache.items() if v[0] == today}
+        CohortReportService._cache[key] = (today, report)
+        return report
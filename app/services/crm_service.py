@@ -1,7 +1,7 @@
-import json
+import math
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any, Tuple
-from sqlalchemy import select, func, and_, or_, desc
+from sqlalchemy import select, update, func, and_, or_, desc, case, cast, text, Integer
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from models.crm import (
@@ -11,6 +11,30 @@ from models.crm import (
 from models.user import TelegramUser
 from models.billing import Transaction
 from models.service import Service
+from services.activity_log import activity_log
+from services.analytics_engine import AnalyticsEngine
+from services.analytics_snapshot import AnalyticsSnapshotService, SnapshotUnavailable
+
+
+# Engagement weight of each activity type. The score is the sum of the weights
+# decayed exponentially with a mean lifetime of ENGAGEMENT_DECAY_DAYS (the same
+# steady-state total as the old sum over the last 30 days), capped at 1.
+ACTIVITY_WEIGHTS = {
+    ActivityType.LOGIN: 0.1,
+    ActivityType.PURCHASE: 0.3,
+    ActivityType.WALLET_TOPUP: 0.2,
+    ActivityType.SERVICE_RENEWAL: 0.25,
+    ActivityType.REFERRAL: 0.15,
+}
+ENGAGEMENT_DECAY_DAYS = 30
+# Activities older than this contribute under 2% and are ignored on reconcile
+ENGAGEMENT_WINDOW_DAYS = 120
+# Engagement score ranges of the CRM dashboard, [low, high)
+ENGAGEMENT_RANGES = [
+    ("high", 0.7, 1.0),
+    ("medium", 0.4, 0.7),
+    ("low", 0.0, 0.4)
+]
 
 
 class CRMService:
@@ -29,16 +53,18 @@ class CRMService:
     ):
         """Track user activity for CRM"""
         
-        activity = UserActivity(
+        # Written in bulk by the background activity log writer once the session commits
+        activity_log.emit(
+            UserActivity,
+            session=session,
             user_id=user_id,
             activity_type=activity_type,
-            description=description,
-            metadata=json.dumps(metadata) if metadata else None,
+            description=description[:512],
+            activity_metadata=metadata,
             session_id=session_id,
             ip_address=ip_address,
             user_agent=user_agent
         )
-        session.add(activity)
         
         # Update user profile
         await CRMService._update_user_profile(session, user_id, activity_type)
@@ -66,8 +92,8 @@ class CRMService:
             # Check for churn risk
             await CRMService._assess_churn_risk(session, profile)
         
-        # Recalculate engagement score
-        profile.engagement_score = await CRMService._calculate_engagement_score(session, user_id)
+        # Update engagement score
+        CRMService._apply_engagement(profile, activity_type, profile.last_activity_at)
         
         # Update segmentation
         await CRMService._update_user_segmentation(session, profile)
@@ -90,42 +116,21 @@ class CRMService:
         return profile
     
     @staticmethod
-    async def _calculate_engagement_score(session: AsyncSession, user_id: int) -> float:
-        """Calculate user engagement score (0-1)"""
-        
-        # Get recent activities (last 30 days)
-        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        
-        activities = (await session.execute(
-            select(UserActivity)
-            .where(
-                and_(
-                    UserActivity.user_id == user_id,
-                    UserActivity.created_at >= thirty_days_ago
-                )
-            )
-        )).scalars().all()
-        
-        if not activities:
-            return 0.0
-        
-        # Calculate score based on activity types and frequency
-        score = 0.0
-        
-        for activity in activities:
-            if activity.activity_type == ActivityType.LOGIN:
-                score += 0.1
-            elif activity.activity_type == ActivityType.PURCHASE:
-                score += 0.3
-            elif activity.activity_type == ActivityType.WALLET_TOPUP:
-                score += 0.2
-            elif activity.activity_type == ActivityType.SERVICE_RENEWAL:
-                score += 0.25
-            elif activity.activity_type == ActivityType.REFERRAL:
-                score += 0.15
-        
-        # Normalize to 0-1 range
-        return min(score, 1.0)
+    def _apply_engagement(profile: UserProfile, activity_type: ActivityType, now: datetime):
+        """Decay the profile's engagement sum to now and add this activity, in O(1)"""
+        
+        if profile.engagement_decayed_at is None:
+            # Profile from before the decayed sum: start from its last score
+            decayed = float(profile.engagement_score or 0)
+        else:
+            decayed = float(profile.engagement_decayed_sum or 0)
+            age_days = max((now - profile.engagement_decayed_at).total_seconds(), 0) / 86400
+            decayed *= math.exp(-age_days / ENGAGEMENT_DECAY_DAYS)
+        decayed += ACTIVITY_WEIGHTS.get(activity_type, 0)
+        
+        profile.engagement_decayed_sum = round(decayed, 4)
+        profile.engagement_decayed_at = now
+        profile.engagement_score = round(min(decayed, 1.0), 2)
     
     @staticmethod
     async def _update_user_segmentation(session: AsyncSession, profile: UserProfile):
@@ -450,7 +455,23 @@ class CRMService:
     
     @staticmethod
     async def get_segment_analytics(session: AsyncSession) -> Dict[str, Any]:
-        """Get user segment analytics"""
+        """Get user segment analytics
+
+        Counted over the nightly analytics snapshot with numpy when one is
+        available (`as_of` is then its build time), otherwise in SQL.
+        """
+        
+        try:
+            engine = AnalyticsEngine(AnalyticsSnapshotService.open_current())
+        except SnapshotUnavailable:
+            engine = None
+        if engine:
+            analytics = engine.segment_distribution(ENGAGEMENT_RANGES)
+            analytics["segment_counts"] = {
+                UserSegment(segment): count for segment, count in analytics["segment_counts"].items()
+            }
+            analytics["as_of"] = engine.snapshot.created_at
+            return analytics
         
         # Get segment counts
         segment_counts = (await session.execute(
@@ -464,53 +485,163 @@ class CRMService:
             .group_by(UserProfile.lifecycle_stage)
         )).all()
         
-        # Get engagement distribution
-        engagement_ranges = [
-            ("high", 0.7, 1.0),
-            ("medium", 0.4, 0.7),
-            ("low", 0.0, 0.4)
-        ]
-        
-        engagement_distribution = {}
-        for label, min_score, max_score in engagement_ranges:
-            count = (await session.execute(
-                select(func.count(UserProfile.id))
-                .where(
-                    and_(
-                        UserProfile.engagement_score >= min_score,
-                        UserProfile.engagement_score < max_score
-                    )
-                )
-            )).scalar()
-            engagement_distribution[label] = count
+        # Get engagement distribution, all ranges in one pass
+        engagement_row = (await session.execute(
+            select(*(
+                func.sum(case((and_(
+                    UserProfile.engagement_score >= min_score,
+                    UserProfile.engagement_score < max_score
+                ), 1), else_=0))
+                for _label, min_score, max_score in ENGAGEMENT_RANGES
+            ))
+        )).one()
+        engagement_distribution = {
+            label: int(count or 0) for (label, _min, _max), count in zip(ENGAGEMENT_RANGES, engagement_row)
+        }
         
         return {
             "segment_counts": dict(segment_counts),
             "lifecycle_counts": dict(lifecycle_counts),
-            "engagement_distribution": engagement_distribution
+            "engagement_distribution": engagement_distribution,
+            "as_of": datetime.utcnow()
         }
     
     @staticmethod
-    async def update_daily_metrics(session: AsyncSession):
-        """Update daily CRM metrics"""
-        
-        # Update days since last activity for all users
-        profiles = (await session.execute(select(UserProfile))).scalars().all()
-        
-        for profile in profiles:
-            if profile.last_activity_at:
-                days_diff = (datetime.utcnow() - profile.last_activity_at).days
-                profile.days_since_last_activity = days_diff
-                
-                # Update lifecycle stage based on inactivity
-                if days_diff > 30 and profile.lifecycle_stage != "churned":
-                    profile.lifecycle_stage = "churned"
-                    profile.primary_segment = UserSegment.CHURNED_USER
-                elif days_diff > 14 and profile.lifecycle_stage == "active":
-                    profile.lifecycle_stage = "at_risk"
-        
-        # Reset weekly counters
-        if datetime.utcnow().weekday() == 0:  # Monday
-            for profile in profiles:
-                profile.login_frequency = 0
-                profile.purchase_frequency = 0
\ No newline at end of file
+    def _days_since(session: AsyncSession, column, now: datetime):
+        """Whole days between a timestamp column and now, evaluated in SQL"""
+        if session.get_bind().dialect.name == "mysql":
+            return func.timestampdiff(text("DAY"), column, now)
+        return cast(func.julianday(now) - func.julianday(column), Integer)
+    
+    @staticmethod
+    def _age_days(session: AsyncSession, column, now: datetime):
+        """Fractional days between a timestamp column and now, evaluated in SQL"""
+        if session.get_bind().dialect.name == "mysql":
+            return func.timestampdiff(text("SECOND"), column, now) / 86400.0
+        return func.julianday(now) - func.julianday(column)
+    
+    @staticmethod
+    async def reconcile_engagement_scores(session: AsyncSession, chunk_size: int = 5000) -> Dict[str, int]:
+        """Recompute every profile's decayed engagement sum from UserActivity.
+        
+        Corrects drift from activities written outside track_user_activity
+        and decays the scores of users who have gone quiet. Works per
+        profile id range; returns profiles updated and those whose score
+        was off by more than 0.01.
+        """
+        
+        now = datetime.utcnow()
+        since = now - timedelta(days=ENGAGEMENT_WINDOW_DAYS)
+        weight = case(
+            *((UserActivity.activity_type == activity_type, value) for activity_type, value in ACTIVITY_WEIGHTS.items()),
+            else_=0
+        )
+        decayed_weight = weight * func.exp(-CRMService._age_days(session, UserActivity.created_at, now) / ENGAGEMENT_DECAY_DAYS)
+        report = {"updated": 0, "corrected": 0}
+        
+        max_id = (await session.execute(select(func.max(UserProfile.id)))).scalar() or 0
+        for low in range(0, max_id, chunk_size):
+            profiles = (await session.execute(
+                select(
+                    UserProfile.id, UserProfile.user_id,
+                    UserProfile.engagement_decayed_sum, UserProfile.engagement_decayed_at
+                )
+                .where(and_(UserProfile.id > low, UserProfile.id <= low + chunk_size))
+            )).all()
+            if not profiles:
+                continue
+            
+            sums = dict((await session.execute(
+                select(UserActivity.user_id, func.sum(decayed_weight))
+                .where(
+                    and_(
+                        UserActivity.user_id.in_([row.user_id for row in profiles]),
+                        UserActivity.created_at >= since
+                    )
+                )
+                .group_by(UserActivity.user_id)
+            )).all())
+            
+            updates = []
+            for row in profiles:
+                stored = float(row.engagement_decayed_sum or 0)
+                if row.engagement_decayed_at:
+                    age_days = max((now - row.engagement_decayed_at).total_seconds(), 0) / 86400
+                    stored *= math.exp(-age_days / ENGAGEMENT_DECAY_DAYS)
+                actual = float(sums.get(row.user_id) or 0)
+                if not stored and not actual:
+                    continue
+                if abs(min(stored, 1.0) - min(actual, 1.0)) > 0.01:
+                    report["corrected"] += 1
+                updates.append({
+                    "id": row.id,
+                    "engagement_decayed_sum": round(actual, 4),
+                    "engagement_decayed_at": now,
+                    "engagement_score": round(min(actual, 1.0), 2),
+                })
+            
+            if updates:
+                # Bulk UPDATE by primary key (executemany)
+                await session.execute(update(UserProfile), updates)
+                report["updated"] += len(updates)
+            await session.commit()
+        
+        return report
+    
+    @staticmethod
+    async def update_daily_metrics(session: AsyncSession, chunk_size: int = 10000) -> Dict[str, int]:
+        """Update daily CRM metrics with set-based UPDATEs, committing per id range.
+        
+        Returns the number of profiles changed: activity days refreshed, moved
+        to each lifecycle stage and (on Mondays) weekly counters reset.
+        """
+        
+        now = datetime.utcnow()
+        reset_counters = now.weekday() == 0  # Monday
+        report = {"days_updated": 0, "churned": 0, "at_risk": 0, "counters_reset": 0}
+        
+        max_id = (await session.execute(select(func.max(UserProfile.id)))).scalar() or 0
+        days = CRMService._days_since(session, UserProfile.last_activity_at, now)
+        
+        for low in range(0, max_id, chunk_size):
+            in_chunk = and_(UserProfile.id > low, UserProfile.id <= low + chunk_size)
+            with_activity = and_(in_chunk, UserProfile.last_activity_at.isnot(None))
+            
+            result = await session.execute(
+                update(UserProfile)
+                .where(and_(with_activity, UserProfile.days_since_last_activity != days))
+                .values(days_since_last_activity=days)
+                .execution_options(synchronize_session=False)
+            )
+            report["days_updated"] += result.rowcount
+            
+            # Lifecycle transitions based on inactivity
+            result = await session.execute(
+                update(UserProfile)
+                .where(and_(with_activity, days > 30, UserProfile.lifecycle_stage != "churned"))
+                .values(lifecycle_stage="churned", primary_segment=UserSegment.CHURNED_USER)
+                .execution_options(synchronize_session=False)
+            )
+            report["churned"] += result.rowcount
+            result = await session.execute(
+                update(UserProfile)
+                .where(and_(with_activity, days > 14, UserProfile.lifecycle_stage == "active"))
+                .values(lifecycle_stage="at_risk")
+                .execution_options(synchronize_session=False)
+            )
+            report["at_risk"] += result.rowcount
+            
+            # Reset weekly counters
+            if reset_counters:
+                result = await session.execute(
+                    update(UserProfile)
+                    .where(and_(in_chunk, or_(UserProfile.login_frequency != 0, UserProfile.purchase_frequency != 0)))
+                    .values(login_frequency=0, purchase_frequency=0)
+                    .execution_options(synchronize_session=False)
+                )
+                report["counters_reset"] += result.rowcount
+            
+            # Short transactions keep row locks brief on large tables
+            await session.commit()
+        
+        return report
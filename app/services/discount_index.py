@@ -0,0 +1,172 @@
+import json
+import logging
+from bisect import bisect_right
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from sqlalchemy import select, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.smart_discounts import SmartDiscount, DiscountType
+from services.versioned_cache import VersionedCache
+
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "smart_discounts_version"
+HOURS = range(24)
+
+
+def _json(value: Optional[str]) -> Any:
+    # Unparseable conditions and targets never restricted a discount
+    if not value:
+        return None
+    try:
+        return json.loads(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _id_set(value: Optional[str]) -> Optional[FrozenSet]:
+    parsed = _json(value)
+    if isinstance(parsed, (list, tuple, dict)):
+        return frozenset(parsed)
+    return None
+
+
+@dataclass
+class CompiledDiscount:
+    """A SmartDiscount's static eligibility conditions, parsed once"""
+    id: int
+    rank: int  # position by priority, highest first
+    discount_type: DiscountType
+    min_purchase: float
+    valid_from: Optional[datetime]
+    valid_to: Optional[datetime]
+    hours: Optional[FrozenSet[int]]
+    min_loyalty_level: Optional[int]
+    target_groups: Optional[Dict[str, Any]]
+    target_plans: Optional[FrozenSet]
+    target_servers: Optional[FrozenSet]
+
+
+def compile_discount(discount: SmartDiscount, rank: int) -> CompiledDiscount:
+    conditions = _json(discount.trigger_conditions)
+    conditions = conditions if isinstance(conditions, dict) else {}
+    hours = None
+    if discount.discount_type == DiscountType.HOURLY and "hours" in conditions:
+        hours = frozenset(conditions["hours"]) if isinstance(conditions["hours"], list) else frozenset()
+    min_loyalty_level = None
+    if discount.discount_type == DiscountType.LOYALTY:
+        min_loyalty_level = conditions.get("min_loyalty_level")
+    target_groups = _json(discount.target_user_groups)
+    return CompiledDiscount(
+        id=discount.id,
+        rank=rank,
+        discount_type=discount.discount_type,
+        min_purchase=float(discount.min_purchase_amount or 0),
+        valid_from=discount.valid_from,
+        valid_to=discount.valid_to,
+        hours=hours,
+        min_loyalty_level=min_loyalty_level,
+        target_groups=target_groups if isinstance(target_groups, dict) else None,
+        target_plans=_id_set(discount.target_plans),
+        target_servers=_id_set(discount.target_servers),
+    )
+
+
+class _Bucket:
+    """Discounts sorted by minimum purchase, so those a purchase reaches are a prefix"""
+
+    def __init__(self, discounts: List[CompiledDiscount]):
+        self.discounts = sorted(discounts, key=lambda d: (d.min_purchase, d.rank))
+        self.minimums = [d.min_purchase for d in self.discounts]
+
+    def reachable(self, amount: float) -> List[CompiledDiscount]:
+        return self.discounts[:bisect_right(self.minimums, amount)]
+
+
+_EMPTY = _Bucket([])
+
+
+class DiscountEligibilityIndex:
+    """Active discounts bucketed by hour of day and target plan, each bucket ordered by minimum amount.
+
+    An hourly discount is only filed under its hours; a discount targeting
+    plans only under those plans (and the "no plan given" bucket, since a
+    target never excluded a purchase without a plan). A lookup takes the
+    one or two buckets for the hour and plan and cuts them at the purchase
+    amount, leaving only candidates whose static conditions already hold.
+    """
+
+    def __init__(self, discounts: List[CompiledDiscount]):
+        self.size = len(discounts)
+        any_plan: Dict[int, List[CompiledDiscount]] = defaultdict(list)
+        by_plan: Dict[Tuple[int, Any], List[CompiledDiscount]] = defaultdict(list)
+        for discount in discounts:
+            for hour in (HOURS if discount.hours is None else discount.hours):
+                if hour not in HOURS:
+                    continue
+                any_plan[hour].append(discount)
+                for plan in (discount.target_plans if discount.target_plans is not None else (None,)):
+                    by_plan[(hour, plan)].append(discount)
+        self._any_plan = {hour: _Bucket(items) for hour, items in any_plan.items()}
+        self._by_plan = {key: _Bucket(items) for key, items in by_plan.items()}
+
+    def candidates(self, hour: int, amount: float, plan_id: Optional[int] = None) -> List[CompiledDiscount]:
+        """Discounts the hour, amount and plan allow, by priority"""
+        if plan_id is None:
+            found = self._any_plan.get(hour, _EMPTY).reachable(amount)
+        else:
+            found = (
+                self._by_plan.get((hour, None), _EMPTY).reachable(amount)
+                + self._by_plan.get((hour, plan_id), _EMPTY).reachable(amount)
+            )
+        return sorted(found, key=lambda d: d.rank)
+
+
+class SmartDiscountIndex:
+    """The eligibility index over active smart discounts, shared by every lookup.
+
+    Built from the active discounts and kept in a VersionedCache under the
+    `smart_discounts_version` bot setting, which discount edits bump;
+    `smart_discount_index_check_seconds` bounds how long other processes
+    keep a stale index. Usage
+    counters are not part of the index; they are read from the rows of the
+    few candidates a lookup returns.
+    """
+
+    @staticmethod
+    def build(discounts: List[SmartDiscount]) -> DiscountEligibilityIndex:
+        ordered = sorted(discounts, key=lambda d: (-(d.priority or 0), d.id))
+        return DiscountEligibilityIndex([compile_discount(d, rank) for rank, d in enumerate(ordered)])
+
+    @staticmethod
+    async def load(session: AsyncSession) -> DiscountEligibilityIndex:
+        discounts = (await session.execute(
+            select(SmartDiscount).where(and_(
+                SmartDiscount.is_active == True,
+                or_(SmartDiscount.valid_to.is_(None), SmartDiscount.valid_to >= datetime.utcnow())
+            ))
+        )).scalars().all()
+        index = SmartDiscountIndex.build(discounts)
+        logger.info("Indexed %d smart discounts", index.size)
+        return index
+
+    @staticmethod
+    async def get(session: AsyncSession) -> DiscountEligibilityIndex:
+        return await _cache.get(session)
+
+    @staticmethod
+    def invalidate() -> None:
+        _cache.invalidate()
+
+    @staticmethod
+    async def bump_version(session: AsyncSession) -> None:
+        """Call in the session that adds or edits discounts; every process rebuilds once it commits"""
+        await _cache.bump(session)
+
+
+_cache = VersionedCache(VERSION_KEY, "smart discount set", "smart_discount_index_check_seconds", SmartDiscountIndex.load)
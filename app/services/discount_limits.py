@@ -0,0 +1,73 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import update, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.db import get_db_session
+from models.smart_discounts import SmartDiscount, CashbackRule
+
+
+class DiscountLimitReached(Exception):
+    """The discount's total or daily usage limit is used up"""
+
+
+@dataclass(frozen=True)
+class _Counted:
+    """Where a kind of discount keeps its usage counters and limits"""
+    model: Any
+    limit: str
+    daily_limit: Optional[str] = None
+    daily_used: Optional[str] = None
+
+
+KINDS: Dict[str, _Counted] = {
+    "smart": _Counted(SmartDiscount, "total_limit", "daily_limit", "daily_used_count"),
+    "cashback": _Counted(CashbackRule, "total_limit"),
+}
+
+
+def _under(counter, limit):
+    # A missing or zero limit means unlimited, as everywhere else in the app
+    return or_(limit.is_(None), limit == 0, counter < limit)
+
+
+class DiscountLimiter:
+    """Usage limits of smart discounts and cashback rules, enforced without read-modify-write.
+
+    A redemption is reserved with one conditional UPDATE that increments the
+    counters only while they are under their limits, so concurrent checkouts
+    can never push a discount past its limit; the reservation belongs to the
+    caller's transaction and disappears if it rolls back.
+    """
+
+    @staticmethod
+    async def reserve(session: AsyncSession, kind: str, row) -> bool:
+        """Count one redemption of `row` if its limits allow it; False when used up"""
+        spec = KINDS[kind]
+        model = spec.model
+        conditions = [model.id == row.id, _under(model.used_count, getattr(model, spec.limit))]
+        values = {"used_count": model.used_count + 1}
+        if spec.daily_limit:
+            daily_used = getattr(model, spec.daily_used)
+            conditions.append(_under(daily_used, getattr(model, spec.daily_limit)))
+            values[spec.daily_used] = daily_used + 1
+        result = await session.execute(
+            update(model).where(and_(*conditions)).values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount == 1
+
+    @staticmethod
+    async def reset_daily() -> Dict[str, int]:
+        """Daily job: zero the daily counters of smart discounts not reset yet today"""
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        async with get_db_session() as session:
+            result = await session.execute(
+                update(SmartDiscount)
+                .where(or_(SmartDiscount.last_reset_date.is_(None), SmartDiscount.last_reset_date < today))
+                .values(daily_used_count=0, last_reset_date=today)
+                .execution_options(synchronize_session=False)
+            )
+        return {"reset": result.rowcount}
@@ -0,0 +1,278 @@
+import csv
+import io
+import os
+import tempfile
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select, and_, Select
+
+from core.db import get_db_session
+from models.billing import Transaction
+from models.catalog import Plan, Server
+from models.service import Service
+from models.user import TelegramUser
+
+
+class ExportError(Exception):
+    pass
+
+
+@dataclass
+class ExportSpec:
+    columns: Sequence[Tuple[str, Any]]  # (header, column expression)
+    date_column: Any  # column the date range applies to
+    order_column: Any
+    joins: Optional[Callable[[Select], Select]] = None
+
+    def query(self, start: Optional[datetime], end: Optional[datetime]) -> Select:
+        conditions = []
+        if start:
+            conditions.append(self.date_column >= start)
+        if end:
+            conditions.append(self.date_column < end)
+        query = select(*(column for _header, column in self.columns))
+        if self.joins:
+            query = self.joins(query)
+        if conditions:
+            query = query.where(and_(*conditions))
+        return query.order_by(self.order_column)
+
+
+def _transactions_spec() -> ExportSpec:
+    columns = [
+        ("id", Transaction.id),
+        ("created_at", Transaction.created_at),
+        ("user_id", Transaction.user_id),
+        ("telegram_user_id", TelegramUser.telegram_user_id),
+        ("username", TelegramUser.username),
+        ("type", Transaction.type),
+        ("status", Transaction.status),
+        ("amount", Transaction.amount),
+        ("bonus_amount", Transaction.bonus_amount),
+        ("currency", Transaction.currency),
+        ("payment_gateway", Transaction.payment_gateway),
+        ("gateway_transaction_id", Transaction.gateway_transaction_id),
+        ("plan_id", Transaction.plan_id),
+        ("discount_code", Transaction.discount_code),
+        ("approved_at", Transaction.approved_at),
+        ("approved_by_admin_id", Transaction.approved_by_admin_id),
+        ("description", Transaction.description),
+    ]
+    return ExportSpec(
+        columns, Transaction.created_at, Transaction.id,
+        joins=lambda query: query.join(TelegramUser, TelegramUser.id == Transaction.user_id),
+    )
+
+
+def _users_spec() -> ExportSpec:
+    columns = [
+        ("id", TelegramUser.id),
+        ("telegram_user_id", TelegramUser.telegram_user_id),
+        ("username", TelegramUser.username),
+        ("first_name", TelegramUser.first_name),
+        ("last_name", TelegramUser.last_name),
+        ("phone_number", TelegramUser.phone_number),
+        ("wallet_balance", TelegramUser.wallet_balance),
+        ("total_spent", TelegramUser.total_spent),
+        ("total_services", TelegramUser.total_services),
+        ("is_blocked", TelegramUser.is_blocked),
+        ("is_verified", TelegramUser.is_verified),
+        ("referred_by_user_id", TelegramUser.referred_by_user_id),
+        ("registration_source", TelegramUser.registration_source),
+        ("created_at", TelegramUser.created_at),
+        ("last_seen_at", TelegramUser.last_seen_at),
+    ]
+    return ExportSpec(columns, TelegramUser.created_at, TelegramUser.id)
+
+
+def _services_spec() -> ExportSpec:
+    columns = [
+        ("id", Service.id),
+        ("user_id", Service.user_id),
+        ("telegram_user_id", TelegramUser.telegram_user_id),
+        ("plan_id", Service.plan_id),
+        ("plan", Plan.title),
+        ("server_id", Service.server_id),
+        ("server", Server.name),
+        ("remark", Service.remark),
+        ("is_active", Service.is_active),
+        ("is_test", Service.is_test),
+        ("purchased_at", Service.purchased_at),
+        ("expires_at", Service.expires_at),
+        ("traffic_used_gb", Service.traffic_used_gb),
+        ("traffic_limit_gb", Service.traffic_limit_gb),
+        ("renewal_count", Service.renewal_count),
+    ]
+    return ExportSpec(
+        columns, Service.purchased_at, Service.id,
+        joins=lambda query: (
+            query
+            .join(TelegramUser, TelegramUser.id == Service.user_id)
+            .outerjoin(Plan, Plan.id == Service.plan_id)
+            .outerjoin(Server, Server.id == Service.server_id)
+        ),
+    )
+
+
+EXPORTS: Dict[str, Callable[[], ExportSpec]] = {
+    "transactions": _transactions_spec,
+    "users": _users_spec,
+    "services": _services_spec,
+}
+
+FORMATS = ("csv", "xlsx")
+
+XLSX_MAX_ROWS = 1_048_575  # per sheet, excluding the header row
+
+FORMULA_PREFIXES = ("=", "+", "-", "@")
+
+
+def _escape_formula(value: str) -> str:
+    """Prefix text a spreadsheet would evaluate as a formula so it opens as plain text"""
+    return "'" + value if value.startswith(FORMULA_PREFIXES) else value
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat(sep=" ") if isinstance(value, datetime) else value.isoformat()
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, str):
+        return _escape_formula(value)
+    return value
+
+
+def _xlsx_value(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, str):
+        return _escape_formula(value)
+    return value
+
+
+class ExportService:
+    """Streams large tables to CSV/XLSX without holding the result set in memory.
+
+    Rows are read through a server-side cursor in `chunk_size` partitions and
+    written out chunk by chunk, so memory stays flat for full-year exports.
+    """
+
+    @staticmethod
+    def get_spec(kind: str) -> ExportSpec:
+        factory = EXPORTS.get(kind)
+        if factory is None:
+            raise ExportError(f"Unknown export: {kind}")
+        return factory()
+
+    @staticmethod
+    def file_name(kind: str, fmt: str, start: Optional[datetime] = None, end: Optional[datetime] = None) -> str:
+        period = ""
+        if start or end:
+            first = start.strftime("%Y%m%d") if start else "begin"
+            last = (end - timedelta(days=1)).strftime("%Y%m%d") if end else "now"
+            period = f"_{first}-{last}"
+        return f"{kind}{period}.{fmt}"
+
+    @staticmethod
+    async def iter_chunks(
+        kind: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        chunk_size: int = 2000
+    ) -> AsyncIterator[List[Tuple]]:
+        """Yield the export rows in lists of at most chunk_size"""
+
+        spec = ExportService.get_spec(kind)
+        query = spec.query(start, end).execution_options(yield_per=chunk_size)
+        async with get_db_session() as session:
+            result = await session.stream(query)
+            async for partition in result.partitions():
+                yield [tuple(row) for row in partition]
+
+    @staticmethod
+    def headers(kind: str) -> List[str]:
+        return [header for header, _column in ExportService.get_spec(kind).columns]
+
+    @staticmethod
+    async def iter_csv(
+        kind: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        chunk_size: int = 2000
+    ) -> AsyncIterator[bytes]:
+        """CSV bytes chunk by chunk, e.g. for a streaming HTTP response"""
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        # BOM so Excel opens the UTF-8 (Persian) text correctly
+        buffer.write("\ufeff")
+        writer.writerow(ExportService.headers(kind))
+        async for rows in ExportService.iter_chunks(kind, start, end, chunk_size):
+            writer.writerows([_csv_value(value) for value in row] for row in rows)
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+
+    @staticmethod
+    async def _write_xlsx(path: str, kind: str, start: Optional[datetime], end: Optional[datetime], chunk_size: int) -> int:
+        try:
+            from openpyxl import Workbook
+        except ImportError:
+            raise ExportError("XLSX export needs the openpyxl package; use CSV instead")
+
+        # write_only keeps only the current row in memory and spools the sheet to disk
+        workbook = Workbook(write_only=True)
+        headers = ExportService.headers(kind)
+        sheet, sheet_rows, total = None, 0, 0
+        async for rows in ExportService.iter_chunks(kind, start, end, chunk_size):
+            for row in rows:
+                if sheet is None or sheet_rows >= XLSX_MAX_ROWS:
+                    sheet = workbook.create_sheet(f"{kind}_{len(workbook.worksheets) + 1}")
+                    sheet.append(headers)
+                    sheet_rows = 0
+                sheet.append([_xlsx_value(value) for value in row])
+                sheet_rows += 1
+                total += 1
+        if sheet is None:
+            workbook.create_sheet(kind).append(headers)
+        workbook.save(path)
+        return total
+
+    @staticmethod
+    async def export_to_file(
+        kind: str,
+        fmt: str = "csv",
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        chunk_size: int = 2000
+    ) -> Tuple[str, int]:
+        """Write an export to a temp file; returns (path, row count). The caller deletes the file."""
+
+        if fmt not in FORMATS:
+            raise ExportError(f"Unknown format: {fmt}")
+        ExportService.get_spec(kind)
+
+        fd, path = tempfile.mkstemp(prefix=f"export_{kind}_", suffix=f".{fmt}")
+        os.close(fd)
+        try:
+            if fmt == "xlsx":
+                total = await ExportService._write_xlsx(path, kind, start, end, chunk_size)
+            else:
+                total = 0
+                with open(path, "w", encoding="utf-8-sig", newline="") as f:
+                    writer = csv.writer(f)
+                    writer.writerow(ExportService.headers(kind))
+                    async for rows in ExportService.iter_chunks(kind, start, end, chunk_size):
+                        writer.writerows([_csv_value(value) for value in row] for row in rows)
+                        total += len(rows)
+        except BaseException:
+            os.unlink(path)
+            raise
+        return path, total
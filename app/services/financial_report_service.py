@@ -1,82 +1,91 @@
 import json
-from datetime import datetime, timedelta
+from datetime import date as date_type, datetime, timedelta
 from typing import List, Optional, Dict, Any, Tuple
-from sqlalchemy import select, func, and_, or_, desc, extract
+from sqlalchemy import select, func, and_, or_, desc, extract, case
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from models.analytics import DailyStats, RevenueRollup, UserRevenueRollup
 from models.billing import Transaction
 from models.user import TelegramUser
-from models.service import Service
 from models.catalog import Plan, Category, Server
 from models.advanced_reseller import AdvancedReseller, ResellerCommission
+from services.analytics_engine import AnalyticsEngine
+from services.analytics_snapshot import AnalyticsSnapshotService, SnapshotUnavailable
 
 
 class FinancialReportService:
-    """Service for generating advanced financial reports"""
-    
+    """Service for generating advanced financial reports.
+
+    Transaction figures come from the daily rollups maintained by
+    services/revenue_rollup.py, so a report costs the same whatever the
+    transaction volume; days are bucketed by transaction creation date (UTC).
+    """
+
+    @staticmethod
+    def _in_days(start: date_type, end: date_type):
+        """Rollup rows of days start..end, both inclusive"""
+        return and_(RevenueRollup.date >= start, RevenueRollup.date <= end)
+
+    @staticmethod
+    async def _approved_revenue(session: AsyncSession, start: date_type, end: date_type) -> float:
+        return (await session.execute(
+            select(func.sum(RevenueRollup.total_amount))
+            .where(
+                and_(
+                    FinancialReportService._in_days(start, end),
+                    RevenueRollup.status == "approved"
+                )
+            )
+        )).scalar() or 0
+
     @staticmethod
     async def generate_daily_report(
         session: AsyncSession,
         date: Optional[datetime] = None
     ) -> Dict[str, Any]:
         """Generate daily financial report"""
-        
+
         if not date:
             date = datetime.utcnow().date()
-        
-        start_date = datetime.combine(date, datetime.min.time())
-        end_date = start_date + timedelta(days=1)
-        
-        # Daily transactions
-        daily_transactions = (await session.execute(
-            select(Transaction)
-            .where(
-                and_(
-                    Transaction.created_at >= start_date,
-                    Transaction.created_at < end_date
-                )
+        if isinstance(date, datetime):
+            date = date.date()
+
+        rows = (await session.execute(
+            select(
+                RevenueRollup.status,
+                RevenueRollup.payment_gateway,
+                func.sum(RevenueRollup.transaction_count),
+                func.sum(RevenueRollup.total_amount)
             )
-        )).scalars().all()
-        
+            .where(RevenueRollup.date == date)
+            .group_by(RevenueRollup.status, RevenueRollup.payment_gateway)
+        )).all()
+
         # Calculate metrics
-        total_revenue = sum(t.amount for t in daily_transactions if t.status == "approved")
-        total_transactions = len(daily_transactions)
-        approved_transactions = len([t for t in daily_transactions if t.status == "approved"])
-        pending_transactions = len([t for t in daily_transactions if t.status == "pending"])
-        rejected_transactions = len([t for t in daily_transactions if t.status == "rejected"])
-        
-        # Payment methods breakdown
+        status_counts: Dict[str, int] = {}
+        total_revenue = 0
         payment_methods = {}
-        for transaction in daily_transactions:
-            method = transaction.payment_method or "unknown"
+        for status, method, count, amount in rows:
+            count = int(count or 0)
+            status_counts[status] = status_counts.get(status, 0) + count
             if method not in payment_methods:
                 payment_methods[method] = {"count": 0, "amount": 0}
-            payment_methods[method]["count"] += 1
-            if transaction.status == "approved":
-                payment_methods[method]["amount"] += transaction.amount
-        
-        # New users
-        new_users = (await session.execute(
-            select(func.count(TelegramUser.id))
-            .where(
-                and_(
-                    TelegramUser.created_at >= start_date,
-                    TelegramUser.created_at < end_date
-                )
-            )
-        )).scalar()
-        
-        # New services
-        new_services = (await session.execute(
-            select(func.count(Service.id))
-            .where(
-                and_(
-                    Service.purchased_at >= start_date,
-                    Service.purchased_at < end_date
-                )
-            )
-        )).scalar()
-        
+            payment_methods[method]["count"] += count
+            if status == "approved":
+                payment_methods[method]["amount"] += amount or 0
+                total_revenue += amount or 0
+
+        total_transactions = sum(status_counts.values())
+        approved_transactions = status_counts.get("approved", 0)
+        pending_transactions = status_counts.get("pending", 0)
+        rejected_transactions = status_counts.get("rejected", 0)
+
+        # New users and services
+        stats = (await session.execute(
+            select(DailyStats.new_users, DailyStats.new_services)
+            .where(DailyStats.date == datetime.combine(date, datetime.min.time()))
+        )).first()
+
         return {
             "date": date.isoformat(),
             "revenue": {
@@ -91,94 +100,83 @@ class FinancialReportService:
             },
             "payment_methods": payment_methods,
             "growth": {
-                "new_users": new_users,
-                "new_services": new_services
+                "new_users": stats.new_users if stats else 0,
+                "new_services": stats.new_services if stats else 0
             }
         }
-    
+
     @staticmethod
     async def generate_weekly_report(
         session: AsyncSession,
         week_start: Optional[datetime] = None
     ) -> Dict[str, Any]:
         """Generate weekly financial report"""
-        
+
         if not week_start:
             # Get start of current week (Monday)
             today = datetime.utcnow().date()
             week_start = today - timedelta(days=today.weekday())
-        
+
         week_start = datetime.combine(week_start, datetime.min.time())
         week_end = week_start + timedelta(days=7)
-        
-        # Weekly transactions
-        weekly_transactions = (await session.execute(
-            select(Transaction)
-            .where(
-                and_(
-                    Transaction.created_at >= week_start,
-                    Transaction.created_at < week_end
-                )
-            )
-        )).scalars().all()
-        
+        first_day, last_day = week_start.date(), (week_end - timedelta(days=1)).date()
+        in_week = FinancialReportService._in_days(first_day, last_day)
+
         # Daily breakdown
+        daily_rows = (await session.execute(
+            select(
+                RevenueRollup.date,
+                func.sum(RevenueRollup.transaction_count),
+                func.sum(case((RevenueRollup.status == "approved", RevenueRollup.total_amount), else_=0))
+            )
+            .where(in_week)
+            .group_by(RevenueRollup.date)
+        )).all()
+        by_day = {row[0]: row for row in daily_rows}
+
         daily_breakdown = {}
         for i in range(7):
-            day_start = week_start + timedelta(days=i)
-            day_end = day_start + timedelta(days=1)
-            
-            day_transactions = [t for t in weekly_transactions if day_start <= t.created_at < day_end]
-            day_revenue = sum(t.amount for t in day_transactions if t.status == "approved")
-            
-            daily_breakdown[day_start.strftime('%Y-%m-%d')] = {
-                "revenue": day_revenue,
-                "transactions": len(day_transactions)
+            day = first_day + timedelta(days=i)
+            _day, transactions, revenue = by_day.get(day, (day, 0, 0))
+            daily_breakdown[day.strftime('%Y-%m-%d')] = {
+                "revenue": revenue or 0,
+                "transactions": int(transactions or 0)
             }
-        
+
+        approved_in_week = and_(in_week, RevenueRollup.status == "approved")
+        revenue = func.sum(RevenueRollup.total_amount)
+
         # Top performing plans
         plan_performance = (await session.execute(
-            select(Plan.id, Plan.title, func.count(Service.id), func.sum(Transaction.amount))
-            .join(Service, Plan.id == Service.plan_id)
-            .join(Transaction, Service.id == Transaction.service_id)
-            .where(
-                and_(
-                    Transaction.created_at >= week_start,
-                    Transaction.created_at < week_end,
-                    Transaction.status == "approved"
-                )
-            )
+            select(Plan.id, Plan.title, func.sum(RevenueRollup.transaction_count), revenue)
+            .select_from(RevenueRollup)
+            .join(Plan, Plan.id == RevenueRollup.plan_id)
+            .where(approved_in_week)
             .group_by(Plan.id, Plan.title)
-            .order_by(func.sum(Transaction.amount).desc())
+            .order_by(revenue.desc())
             .limit(10)
         )).all()
-        
+
         # Top performing servers
         server_performance = (await session.execute(
-            select(Server.id, Server.name, func.count(Service.id), func.sum(Transaction.amount))
-            .join(Service, Server.id == Service.server_id)
-            .join(Transaction, Service.id == Transaction.service_id)
-            .where(
-                and_(
-                    Transaction.created_at >= week_start,
-                    Transaction.created_at < week_end,
-                    Transaction.status == "approved"
-                )
-            )
+            select(Server.id, Server.name, func.sum(RevenueRollup.transaction_count), revenue)
+            .select_from(RevenueRollup)
+            .join(Server, Server.id == RevenueRollup.server_id)
+            .where(approved_in_week)
             .group_by(Server.id, Server.name)
-            .order_by(func.sum(Transaction.amount).desc())
+            .order_by(revenue.desc())
             .limit(10)
         )).all()
-        
+
         return {
-            "week_start": week_start.date().isoformat(),
-            "week_end": (week_end - timedelta(days=1)).date().isoformat(),
+            "week_start": first_day.isoformat(),
+            "week_end": last_day.isoformat(),
             "daily_breakdown": daily_breakdown,
             "plan_performance": [
                 {
                     "plan_id": plan_id,
                     "title": title,
-                    "sales_count": sales_count,
+                    "sales_count": int(sales_count or 0),
                     "revenue": revenue
                 }
                 for plan_id, title, sales_count, revenue in plan_performance
@@ -187,13 +185,13 @@ class FinancialReportService:
                 {
                     "server_id": server_id,
                     "name": name,
-                    "sales_count": sales_count,
+                    "sales_count": int(sales_count or 0),
                     "revenue": revenue
                 }
                 for server_id, name, sales_count, revenue in server_performance
             ]
         }
-    
+
     @staticmethod
     async def generate_monthly_report(
         session: AsyncSession,
@@ -201,58 +199,52 @@ class FinancialReportService:
         month: int
     ) -> Dict[str, Any]:
         """Generate monthly financial report"""
-        
+
         start_date = datetime(year, month, 1)
         if month == 12:
             end_date = datetime(year + 1, 1, 1)
         else:
             end_date = datetime(year, month + 1, 1)
-        
-        # Monthly transactions
-        monthly_transactions = (await session.execute(
-            select(Transaction)
-            .where(
-                and_(
-                    Transaction.created_at >= start_date,
-                    Transaction.created_at < end_date
-                )
-            )
-        )).scalars().all()
-        
+        first_day, last_day = start_date.date(), (end_date - timedelta(days=1)).date()
+        approved_in_month = and_(
+            FinancialReportService._in_days(first_day, last_day),
+            RevenueRollup.status == "approved"
+        )
+
         # Revenue by category
         category_revenue = (await session.execute(
-            select(Category.id, Category.title, func.sum(Transaction.amount))
-            .join(Plan, Category.id == Plan.category_id)
-            .join(Service, Plan.id == Service.plan_id)
-            .join(Transaction, Service.id == Transaction.service_id)
-            .where(
-                and_(
-                    Transaction.created_at >= start_date,
-                    Transaction.created_at < end_date,
-                    Transaction.status == "approved"
-                )
-            )
+            select(Category.id, Category.title, func.sum(RevenueRollup.total_amount))
+            .select_from(RevenueRollup)
+            .join(Category, Category.id == RevenueRollup.category_id)
+            .where(approved_in_month)
             .group_by(Category.id, Category.title)
-            .order_by(func.sum(Transaction.amount).desc())
+            .order_by(func.sum(RevenueRollup.total_amount).desc())
         )).all()
-        
-        # Customer analysis
-        customer_analysis = (await session.execute(
+
+        # Customer analysis (min/max are exact up to the last rollup reconcile)
+        totals = (await session.execute(
             select(
-                func.count(func.distinct(Transaction.user_id)),
-                func.avg(Transaction.amount),
-                func.max(Transaction.amount),
-                func.min(Transaction.amount)
+                func.sum(RevenueRollup.transaction_count),
+                func.sum(RevenueRollup.total_amount),
+                func.max(RevenueRollup.max_amount),
+                func.min(RevenueRollup.min_amount)
             )
+            .where(approved_in_month)
+        )).first()
+        approved_count = int(totals[0] or 0)
+        current_month_revenue = totals[1] or 0
+
+        total_customers = (await session.execute(
+            select(func.count(func.distinct(UserRevenueRollup.user_id)))
             .where(
                 and_(
-                    Transaction.created_at >= start_date,
-                    Transaction.created_at < end_date,
-                    Transaction.status == "approved"
+                    UserRevenueRollup.date >= first_day,
+                    UserRevenueRollup.date <= last_day,
+                    UserRevenueRollup.transaction_count > 0
                 )
             )
-        )).first()
-        
+        )).scalar() or 0
+
         # Reseller performance
         reseller_performance = (await session.execute(
             select(
@@ -273,27 +265,17 @@ class FinancialReportService:
             .order_by(func.sum(ResellerCommission.commission_amount).desc())
             .limit(10)
         )).all()
-        
+
         # Growth metrics
-        previous_month_start = start_date - timedelta(days=start_date.day)
-        previous_month_end = start_date
-        
-        current_month_revenue = sum(t.amount for t in monthly_transactions if t.status == "approved")
-        previous_month_revenue = (await session.execute(
-            select(func.sum(Transaction.amount))
-            .where(
-                and_(
-                    Transaction.created_at >= previous_month_start,
-                    Transaction.created_at < previous_month_end,
-                    Transaction.status == "approved"
-                )
-            )
-        )).scalar() or 0
-        
+        previous_last_day = first_day - timedelta(days=1)
+        previous_month_revenue = await FinancialReportService._approved_revenue(
+            session, previous_last_day.replace(day=1), previous_last_day
+        )
+
         revenue_growth = 0
         if previous_month_revenue > 0:
             revenue_growth = ((current_month_revenue - previous_month_revenue) / previous_month_revenue) * 100
-        
+
         return {
             "year": year,
             "month": month,
@@ -311,10 +293,10 @@ class FinancialReportService:
                 for cat_id, title, revenue in category_revenue
             ],
             "customer_analysis": {
-                "total_customers": customer_analysis[0] or 0,
-                "avg_transaction": customer_analysis[1] or 0,
-                "max_transaction": customer_analysis[2] or 0,
-                "min_transaction": customer_analysis[3] or 0
+                "total_customers": total_customers,
+                "avg_transaction": current_month_revenue / approved_count if approved_count else 0,
+                "max_transaction": totals[2] or 0,
+                "min_transaction": totals[3] or 0
             },
             "reseller_performance": [
                 {
@@ -326,7 +308,7 @@ class FinancialReportService:
                 for reseller_id, username, commission_count, total_commission in reseller_performance
             ]
         }
-    
+
     @staticmethod
     async def generate_custom_report(
         session: AsyncSession,
@@ -334,73 +316,52 @@ class FinancialReportService:
         end_date: datetime,
         filters: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
-        """Generate custom financial report with filters"""
-        
+        """Generate custom financial report with filters.
+
+        The range covers whole days. Amount filters cannot be answered from the
+        daily rollups, so they fall back to aggregating the transactions.
+        """
+
         if not filters:
             filters = {}
-        
-        # Build base query
-        query = select(Transaction).where(
-            and_(
-                Transaction.created_at >= start_date,
-                Transaction.created_at <= end_date
+
+        if filters.get("min_amount") or filters.get("max_amount"):
+            totals, daily_rows, top_customers = await FinancialReportService._custom_from_transactions(
+                session, start_date, end_date, filters
             )
-        )
-        
-        # Apply filters
-        if filters.get("status"):
-            query = query.where(Transaction.status.in_(filters["status"]))
-        
-        if filters.get("payment_method"):
-            query = query.where(Transaction.payment_method.in_(filters["payment_method"]))
-        
-        if filters.get("min_amount"):
-            query = query.where(Transaction.amount >= filters["min_amount"])
-        
-        if filters.get("max_amount"):
-            query = query.where(Transaction.amount <= filters["max_amount"])
-        
-        # Execute query
-        transactions = (await session.execute(query)).scalars().all()
-        
-        # Calculate metrics
-        total_revenue = sum(t.amount for t in transactions if t.status == "approved")
-        total_transactions = len(transactions)
-        
+        else:
+            totals, daily_rows, top_customers = await FinancialReportService._custom_from_rollups(
+                session, start_date.date(), end_date.date(), filters
+            )
+
+        total_transactions = int(totals[0] or 0)
+        total_revenue = totals[1] or 0
+
         # Revenue by day
         daily_revenue = {}
-        for transaction in transactions:
-            if transaction.status == "approved":
-                date_str = transaction.created_at.date().isoformat()
-                if date_str not in daily_revenue:
-                    daily_revenue[date_str] = 0
-                daily_revenue[date_str] += transaction.amount
-        
-        # Top customers
-        customer_revenue = {}
-        for transaction in transactions:
-            if transaction.status == "approved":
-                if transaction.user_id not in customer_revenue:
-                    customer_revenue[transaction.user_id] = 0
-                customer_revenue[transaction.user_id] += transaction.amount
-        
-        top_customers = sorted(customer_revenue.items(), key=lambda x: x[1], reverse=True)[:10]
-        
-        # Get customer details
-        top_customer_details = []
-        for user_id, revenue in top_customers:
-            user = (await session.execute(
-                select(TelegramUser).where(TelegramUser.id == user_id)
-            )).scalar_one_or_none()
-            
-            if user:
-                top_customer_details.append({
-                    "user_id": user_id,
-                    "username": user.username,
-                    "first_name": user.first_name,
-                    "revenue": revenue
-                })
-        
+        for day, revenue in daily_rows:
+            day_str = day.isoformat() if hasattr(day, "isoformat") else str(day)
+            daily_revenue[day_str] = revenue or 0
+
+        # Customer details in one query
+        users = {}
+        if top_customers:
+            users = {
+                user.id: user
+                for user in (await session.execute(
+                    select(TelegramUser).where(TelegramUser.id.in_([user_id for user_id, _ in top_customers]))
+                )).scalars().all()
+            }
+        top_customer_details = [
+            {
+                "user_id": user_id,
+                "username": users[user_id].username,
+                "first_name": users[user_id].first_name,
+                "revenue": revenue
+            }
+            for user_id, revenue in top_customers if user_id in users
+        ]
+
         return {
             "period": {
                 "start_date": start_date.isoformat(),
@@ -415,7 +376,94 @@ class FinancialReportService:
             "daily_revenue": daily_revenue,
             "top_customers": top_customer_details
         }
-    
+
+    @staticmethod
+    async def _custom_from_rollups(
+        session: AsyncSession,
+        start: date_type,
+        end: date_type,
+        filters: Dict[str, Any]
+    ) -> Tuple[Any, List[Any], List[Any]]:
+        conditions = [FinancialReportService._in_days(start, end)]
+        if filters.get("status"):
+            conditions.append(RevenueRollup.status.in_(filters["status"]))
+        if filters.get("payment_method"):
+            conditions.append(RevenueRollup.payment_gateway.in_(filters["payment_method"]))
+        matching = and_(*conditions)
+        approved_revenue = func.sum(case((RevenueRollup.status == "approved", RevenueRollup.total_amount), else_=0))
+
+        totals = (await session.execute(
+            select(func.sum(RevenueRollup.transaction_count), approved_revenue).where(matching)
+        )).first()
+
+        daily_rows = (await session.execute(
+            select(RevenueRollup.date, approved_revenue)
+            .where(and_(matching, RevenueRollup.status == "approved"))
+            .group_by(RevenueRollup.date)
+            .order_by(RevenueRollup.date)
+        )).all()
+
+        # Per-user rollups carry no gateway, so a gateway filter or a status
+        # filter excluding "approved" leaves no customer ranking
+        top_customers = []
+        statuses = filters.get("status")
+        if not filters.get("payment_method") and (not statuses or "approved" in statuses):
+            user_revenue = func.sum(UserRevenueRollup.total_amount)
+            top_customers = (await session.execute(
+                select(UserRevenueRollup.user_id, user_revenue)
+                .where(and_(UserRevenueRollup.date >= start, UserRevenueRollup.date <= end))
+                .group_by(UserRevenueRollup.user_id)
+                .order_by(user_revenue.desc())
+                .limit(10)
+            )).all()
+
+        return totals, daily_rows, top_customers
+
+    @staticmethod
+    async def _custom_from_transactions(
+        session: AsyncSession,
+        start_date: datetime,
+        end_date: datetime,
+        filters: Dict[str, Any]
+    ) -> Tuple[Any, List[Any], List[Any]]:
+        conditions = [
+            Transaction.created_at >= start_date,
+            Transaction.created_at <= end_date
+        ]
+        if filters.get("status"):
+            conditions.append(Transaction.status.in_(filters["status"]))
+        if filters.get("payment_method"):
+            conditions.append(Transaction.payment_gateway.in_(filters["payment_method"]))
+        if filters.get("min_amount"):
+            conditions.append(Transaction.amount >= filters["min_amount"])
+        if filters.get("max_amount"):
+            conditions.append(Transaction.amount <= filters["max_amount"])
+        matching = and_(*conditions)
+        approved = and_(matching, Transaction.status == "approved")
+
+        totals = (await session.execute(
+            select(
+                func.count(Transaction.id),
+                func.sum(case((Transaction.status == "approved", Transaction.amount), else_=0))
+            ).where(matching)
+        )).first()
+
+        day = func.date(Transaction.created_at)
+        daily_rows = (await session.execute(
+            select(day, func.sum(Transaction.amount)).where(approved).group_by(day).order_by(day)
+        )).all()
+
+        user_revenue = func.sum(Transaction.amount)
+        top_customers = (await session.execute(
+            select(Transaction.user_id, user_revenue)
+            .where(approved)
+            .group_by(Transaction.user_id)
+            .order_by(user_revenue.desc())
+            .limit(10)
+        )).all()
+
+        return totals, daily_rows, top_customers
+
     @staticmethod
     async def generate_profit_loss_report(
         session: AsyncSession,
@@ -423,19 +471,21 @@ class FinancialReportService:
         end_date: datetime
     ) -> Dict[str, Any]:
         """Generate profit and loss report"""
-        
-        # Revenue
-        total_revenue = (await session.execute(
-            select(func.sum(Transaction.amount))
+
+        # Revenue and refunds (expense)
+        totals = dict((await session.execute(
+            select(RevenueRollup.status, func.sum(RevenueRollup.total_amount))
             .where(
                 and_(
-                    Transaction.created_at >= start_date,
-                    Transaction.created_at <= end_date,
-                    Transaction.status == "approved"
+                    FinancialReportService._in_days(start_date.date(), end_date.date()),
+                    RevenueRollup.status.in_(["approved", "refunded"])
                 )
             )
-        )).scalar() or 0
-        
+            .group_by(RevenueRollup.status)
+        )).all())
+        total_revenue = totals.get("approved") or 0
+        total_refunds = totals.get("refunded") or 0
+
         # Reseller commissions (expense)
         total_commissions = (await session.execute(
             select(func.sum(ResellerCommission.commission_amount))
@@ -446,23 +496,11 @@ class FinancialReportService:
                 )
             )
         )).scalar() or 0
-        
-        # Refunds (expense)
-        total_refunds = (await session.execute(
-            select(func.sum(Transaction.amount))
-            .where(
-                and_(
-                    Transaction.created_at >= start_date,
-                    Transaction.created_at <= end_date,
-                    Transaction.status == "refunded"
-                )
-            )
-        )).scalar() or 0
-        
+
         # Calculate profit
         gross_profit = total_revenue - total_commissions - total_refunds
         profit_margin = (gross_profit / total_revenue * 100) if total_revenue > 0 else 0
-        
+
         return {
             "period": {
                 "start_date": start_date.isoformat(),
@@ -482,55 +520,87 @@ class FinancialReportService:
                 "profit_margin": profit_margin
             }
         }
-    
+
     @staticmethod
     async def generate_trend_analysis(
         session: AsyncSession,
         days: int = 30
     ) -> Dict[str, Any]:
-        """Generate trend analysis for specified days"""
-        
-        end_date = datetime.utcnow()
-        start_date = end_date - timedelta(days=days)
-        
+        """Generate trend analysis for specified days
+
+        Whole days in the nightly analytics snapshot come from its columns and
+        the growth math is vectorized; days since the snapshot (and every day
+        when no snapshot or numpy is available) come from the revenue rollups.
+        """
+
+        end_day = datetime.utcnow().date()
+        start_day = end_day - timedelta(days=days)
+
+        try:
+            engine = AnalyticsEngine(AnalyticsSnapshotService.open_current())
+        except SnapshotUnavailable:
+            engine = None
+
+        rollup_start = start_day
+        series: List[Tuple[date_type, float, int]] = []
+        if engine:
+            covered_until = min(end_day, engine.snapshot.created_at.date() - timedelta(days=1))
+            if covered_until >= start_day:
+                snapshot_days = engine.daily_revenue(start_day, covered_until)
+                series = [
+                    (date_type.fromisoformat(day), float(revenue), int(transactions))
+                    for day, revenue, transactions in zip(
+                        snapshot_days["days"], snapshot_days["revenue"], snapshot_days["transactions"]
+                    )
+                    if transactions > 0
+                ]
+                rollup_start = covered_until + timedelta(days=1)
+
         # Daily revenue trend
-        daily_revenue = (await session.execute(
-            select(
-                func.date(Transaction.created_at).label('date'),
-                func.sum(Transaction.amount).label('revenue'),
-                func.count(Transaction.id).label('transactions')
-            )
-            .where(
-                and_(
-                    Transaction.created_at >= start_date,
-                    Transaction.created_at <= end_date,
-                    Transaction.status == "approved"
-                )
-            )
-            .group_by(func.date(Transaction.created_at))
-            .order_by(func.date(Transaction.created_at))
-        )).all()
-        
+        if rollup_start <= end_day:
+            series += [
+                (day, float(revenue or 0), int(transactions or 0))
+                for day, revenue, transactions in (await session.execute(
+                    select(
+                        RevenueRollup.date,
+                        func.sum(RevenueRollup.total_amount).label('revenue'),
+                        func.sum(RevenueRollup.transaction_count).label('transactions')
+                    )
+                    .where(
+                        and_(
+                            FinancialReportService._in_days(rollup_start, end_day),
+                            RevenueRollup.status == "approved"
+                        )
+                    )
+                    .group_by(RevenueRollup.date)
+                    .having(func.sum(RevenueRollup.transaction_count) > 0)
+                    .order_by(RevenueRollup.date)
+                )).all()
+            ]
+
         # Calculate growth rates
-        revenue_trend = []
-        for i, (date, revenue, transactions) in enumerate(daily_revenue):
-            growth_rate = 0
-            if i > 0:
-                prev_revenue = daily_revenue[i-1][1] or 0
-                if prev_revenue > 0:
-                    growth_rate = ((revenue - prev_revenue) / prev_revenue) * 100
-            
-            revenue_trend.append({
-                "date": date.isoformat(),
-                "revenue": revenue or 0,
-                "transactions": transactions or 0,
+        if engine:
+            growth_rates = engine.growth_rates([revenue for _day, revenue, _transactions in series]).tolist()
+        else:
+            growth_rates = []
+            for i, (_day, revenue, _transactions) in enumerate(series):
+                prev_revenue = series[i-1][1] if i > 0 else 0
+                growth_rates.append(((revenue - prev_revenue) / prev_revenue) * 100 if prev_revenue > 0 else 0)
+
+        revenue_trend = [
+            {
+                "date": day.isoformat(),
+                "revenue": revenue,
+                "transactions": transactions,
                 "growth_rate": growth_rate
-            })
-        
+            }
+            for (day, revenue, transactions), growth_rate in zip(series, growth_rates)
+        ]
+
         # Weekly averages
         weekly_avg_revenue = sum(r["revenue"] for r in revenue_trend) / len(revenue_trend) if revenue_trend else 0
         weekly_avg_transactions = sum(r["transactions"] for r in revenue_trend) / len(revenue_trend) if revenue_trend else 0
-        
+
         return {
             "period_days": days,
             "daily_trend": revenue_trend,
@@ -538,4 +608,4 @@ class FinancialReportService:
                 "daily_revenue": weekly_avg_revenue,
                 "daily_transactions": weekly_avg_transactions
             }
-        }
\ No newline at end of file
+        }
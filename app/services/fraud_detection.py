@@ -1,13 +1,14 @@
 import hashlib
 import re
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Dict, List, Optional, Tuple
-from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from models.billing import Transaction
 from models.user import TelegramUser
 from core.config import settings
+from services.fraud_features import FraudFeatureService
+from services.receipt_hash import ReceiptHashService
+from services.risk_counters import RiskCounterService
 
 
 class FraudDetectionService:
@@ -18,84 +19,41 @@ class FraudDetectionService:
         session: AsyncSession, 
         user_id: int, 
         amount: float, 
-        receipt_file_id: str
+        receipt_file_id: str,
+        receipt_hash: Optional[str] = None
     ) -> float:
         """Calculate fraud probability score (0-1) for a transaction"""
-        score = 0.0
+        # Daily count and amount limits
+        score = await FraudDetectionService.velocity_score(session, user_id, amount)
         
-        # Check user transaction history
-        recent_tx_count = await FraudDetectionService._get_recent_transaction_count(session, user_id)
-        if recent_tx_count > settings.max_daily_transactions:
-            score += 0.3
-            
-        # Check daily amount limit
-        daily_amount = await FraudDetectionService._get_daily_amount(session, user_id)
-        if daily_amount + amount > settings.max_daily_amount:
-            score += 0.4
+        features = await FraudFeatureService.extract(
+            session, user_id, amount, receipt_file_id=receipt_file_id
+        )
             
-        # Check for duplicate receipts
-        if await FraudDetectionService._is_duplicate_receipt(session, receipt_file_id):
+        # Check for duplicate receipts: same Telegram file, or an earlier photo of
+        # the same amount that looks the same (once the backtest has cleared it)
+        if features.duplicate_receipt or (
+            receipt_hash and settings.receipt_hash_scoring
+            and await ReceiptHashService.find_similar(session, receipt_hash, amount)
+        ):
             score += 0.5
             
-        # Check for suspicious patterns
-        if await FraudDetectionService._has_suspicious_patterns(session, user_id):
+        # Check for suspicious patterns: transactions less than 1 minute apart
+        if features.recent_count >= 3 and features.min_recent_gap is not None and features.min_recent_gap < 60:
             score += 0.2
             
         return min(score, 1.0)
     
     @staticmethod
-    async def _get_recent_transaction_count(session: AsyncSession, user_id: int) -> int:
-        """Get transaction count in last 24 hours"""
-        yesterday = datetime.utcnow() - timedelta(days=1)
-        result = await session.execute(
-            select(func.count(Transaction.id))
-            .where(Transaction.user_id == user_id)
-            .where(Transaction.created_at >= yesterday)
-        )
-        return result.scalar() or 0
-    
-    @staticmethod
-    async def _get_daily_amount(session: AsyncSession, user_id: int) -> float:
-        """Get total transaction amount in last 24 hours"""
-        yesterday = datetime.utcnow() - timedelta(days=1)
-        result = await session.execute(
-            select(func.sum(Transaction.amount))
-            .where(Transaction.user_id == user_id)
-            .where(Transaction.created_at >= yesterday)
-            .where(Transaction.status == "approved")
-        )
-        return float(result.scalar() or 0)
-    
-    @staticmethod
-    async def _is_duplicate_receipt(session: AsyncSession, receipt_file_id: str) -> bool:
-        """Check if receipt has been used before"""
-        result = await session.execute(
-            select(Transaction.id)
-            .where(Transaction.receipt_image_file_id == receipt_file_id)
-            .where(Transaction.status.in_(["approved", "pending"]))
-        )
-        return result.scalar_one_or_none() is not None
-    
-    @staticmethod
-    async def _has_suspicious_patterns(session: AsyncSession, user_id: int) -> bool:
-        """Check for suspicious transaction patterns"""
-        # Check for rapid successive transactions
-        recent_txs = await session.execute(
-            select(Transaction.created_at)
-            .where(Transaction.user_id == user_id)
-            .where(Transaction.created_at >= datetime.utcnow() - timedelta(hours=1))
-            .order_by(Transaction.created_at.desc())
-            .limit(5)
-        )
-        
-        tx_times = [tx[0] for tx in recent_txs.fetchall()]
-        if len(tx_times) >= 3:
-            # Check if transactions are too close together
-            for i in range(len(tx_times) - 1):
-                if (tx_times[i] - tx_times[i + 1]).total_seconds() < 60:  # Less than 1 minute apart
-                    return True
-        
-        return False
+    async def velocity_score(session: AsyncSession, user_id: int, amount: float = 0) -> float:
+        """Daily count/amount part of the fraud score, from the in-memory rolling counters"""
+        velocity = await RiskCounterService.velocity(session, user_id)
+        score = 0.0
+        if velocity.count_24h > settings.max_daily_transactions:
+            score += 0.3
+        if velocity.approved_amount_24h + float(amount or 0) > settings.max_daily_amount:
+            score += 0.4
+        return score
     
     @staticmethod
     def validate_receipt_format(receipt_text: str) -> Dict[str, bool]:
@@ -0,0 +1,139 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import select, func, and_, or_, case, exists, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.billing import Transaction
+
+
+# Look-back windows (hours) always computed; rules may ask for more
+DEFAULT_WINDOWS = (1, 24)
+HISTORY_SIZE = 50  # transactions behind the amount statistics
+RECENT_SIZE = 5  # transactions checked for back-to-back gaps
+
+# Receipts still in play; a file id seen on one of these is a reused receipt
+OPEN_STATUSES = ("approved", "pending")
+
+
+@dataclass
+class FraudFeatures:
+    """A user's transaction history summarised at `as_of`.
+
+    The transaction being scored is never part of it, so rules can compare
+    it against what came before.
+    """
+    as_of: datetime
+    amount: float
+    counts: Dict[float, int] = field(default_factory=dict)  # transactions per window (hours)
+    same_amount: Dict[float, int] = field(default_factory=dict)  # of which for exactly `amount`
+    approved_sum_24h: float = 0.0
+    history_count: int = 0  # last HISTORY_SIZE transactions
+    avg_amount: float = 0.0
+    max_amount: float = 0.0
+    span_1h: Optional[float] = None  # seconds from the oldest transaction of the last hour to as_of
+    min_recent_gap: Optional[float] = None  # smallest gap (s) between the last RECENT_SIZE of the last hour
+    duplicate_receipt: bool = False
+
+    def count(self, hours: float) -> int:
+        return self.counts.get(hours, 0)
+
+    def same_amount_count(self, hours: float) -> int:
+        return self.same_amount.get(hours, 0)
+
+    @property
+    def recent_count(self) -> int:
+        """Transactions in the last hour that min_recent_gap looked at"""
+        return min(self.count(1), RECENT_SIZE)
+
+
+def _seconds_between(session: AsyncSession, start, end):
+    if session.get_bind().dialect.name == "mysql":
+        return func.timestampdiff(text("SECOND"), start, end)
+    return (func.julianday(end) - func.julianday(start)) * 86400
+
+
+class FraudFeatureService:
+    """Builds FraudFeatures with one aggregate query per scored transaction.
+
+    A window over the user's transactions numbers them newest first and
+    pairs each with the one before it; the outer query folds that into
+    conditional sums per look-back window, last-50 amount statistics and
+    inter-arrival gaps. The reused-receipt check rides along as an EXISTS,
+    so the cost no longer depends on how many rules are active.
+    """
+
+    @staticmethod
+    async def extract(
+        session: AsyncSession,
+        user_id: int,
+        amount: float,
+        windows: Iterable[float] = DEFAULT_WINDOWS,
+        exclude_id: Optional[int] = None,
+        receipt_file_id: Optional[str] = None,
+        as_of: Optional[datetime] = None
+    ) -> FraudFeatures:
+        as_of = as_of or datetime.utcnow()
+        windows = sorted(set(windows) | set(DEFAULT_WINDOWS))
+        last_hour = as_of - timedelta(hours=1)
+
+        conditions = [Transaction.user_id == user_id]
+        if exclude_id is not None:
+            conditions.append(Transaction.id != exclude_id)
+        newest_first = (Transaction.created_at.desc(), Transaction.id.desc())
+        previous_at = func.lead(Transaction.created_at).over(order_by=newest_first)
+        history = (
+            select(
+                Transaction.amount.label("amount"),
+                Transaction.status.label("status"),
+                Transaction.created_at.label("created_at"),
+                func.row_number().over(order_by=newest_first).label("rn"),
+                previous_at.label("previous_at"),
+                _seconds_between(session, previous_at, Transaction.created_at).label("gap"),
+            )
+            .where(and_(*conditions))
+            .subquery("history")
+        )
+        h = history.c
+
+        def since(hours: float):
+            return h.created_at >= as_of - timedelta(hours=hours)
+
+        in_history = h.rn <= HISTORY_SIZE
+        columns = []
+        for hours in windows:
+            columns.append(func.sum(case((since(hours), 1), else_=0)))
+            columns.append(func.sum(case((and_(since(hours), h.amount == amount), 1), else_=0)))
+        columns += [
+            func.sum(case((and_(since(24), h.status == "approved"), h.amount), else_=0)),
+            func.sum(case((in_history, 1), else_=0)),
+            func.avg(case((in_history, h.amount))),
+            func.max(case((in_history, h.amount))),
+            _seconds_between(session, func.min(case((since(1), h.created_at))), as_of),
+            # A gap counts when both ends are among the last RECENT_SIZE and inside the hour
+            func.min(case((and_(h.rn < RECENT_SIZE, h.previous_at >= last_hour), h.gap))),
+        ]
+        if receipt_file_id:
+            columns.append(exists().where(and_(
+                Transaction.receipt_image_file_id == receipt_file_id,
+                Transaction.status.in_(OPEN_STATUSES)
+            )))
+
+        row = (await session.execute(
+            select(*columns).select_from(history).where(or_(in_history, since(windows[-1])))
+        )).one()
+
+        features = FraudFeatures(as_of=as_of, amount=float(amount or 0))
+        for index, hours in enumerate(windows):
+            features.counts[hours] = int(row[2 * index] or 0)
+            features.same_amount[hours] = int(row[2 * index + 1] or 0)
+        (approved_sum, history_count, avg_amount, max_amount, span, min_gap) = row[2 * len(windows):2 * len(windows) + 6]
+        features.approved_sum_24h = float(approved_sum or 0)
+        features.history_count = int(history_count or 0)
+        features.avg_amount = float(avg_amount or 0)
+        features.max_amount = float(max_amount or 0)
+        features.span_1h = float(span) if span is not None else None
+        features.min_recent_gap = float(min_gap) if min_gap is not None else None
+        features.duplicate_receipt = bool(row[-1]) if receipt_file_id else False
+        return features
@@ -0,0 +1,199 @@
+import asyncio
+import hashlib
+import math
+import re
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Set
+
+from sqlalchemy import select, func, and_, or_, event
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from models.anti_fraud import FraudWhitelist, FraudBlacklist
+from models.user import TelegramUser
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (double hashing of one blake2b digest)"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value: str) -> Iterable[int]:
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, value: str) -> None:
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+def normalize_phone(phone: str) -> str:
+    # +98 912..., 0912..., 912... all end in the same 10 digits
+    return re.sub(r"\D", "", phone or "")[-10:]
+
+
+def _identifiers(phone: Optional[str] = None, email: Optional[str] = None, ip: Optional[str] = None) -> Dict[str, str]:
+    keys = {}
+    if phone and normalize_phone(phone):
+        keys["phone"] = f"phone:{normalize_phone(phone)}"
+    if email:
+        keys["email"] = f"email:{email.strip().lower()}"
+    if ip:
+        keys["ip"] = f"ip:{ip.strip()}"
+    return keys
+
+
+class FraudListService:
+    """In-memory view of the fraud whitelist and blacklist.
+
+    User entries are held in hashed sets (whitelist with its latest expiry),
+    so checking a user costs no query. Blacklisted phones, emails and IPs
+    go into a Bloom filter, which stays small however long the list gets;
+    only a hit is confirmed against the table. Entries added through
+    AntiFraudService go into memory when their session commits; everything
+    is reloaded every `fraud_lists_resync_seconds` to pick up other
+    processes' changes and deactivated entries.
+    """
+
+    _whitelist: Dict[int, Optional[datetime]] = {}  # user id -> expiry (None: never)
+    _blacklist: Set[int] = set()
+    _identifiers: Optional[BloomFilter] = None
+    _loaded_at: Optional[float] = None
+    _lock: Optional[asyncio.Lock] = None
+
+    @staticmethod
+    async def load(session: AsyncSession) -> None:
+        whitelist: Dict[int, Optional[datetime]] = {}
+        rows = (await session.execute(
+            select(FraudWhitelist.user_id, FraudWhitelist.expires_at)
+            .where(and_(
+                FraudWhitelist.is_active == True,
+                FraudWhitelist.user_id.isnot(None),
+                or_(FraudWhitelist.expires_at.is_(None), FraudWhitelist.expires_at > datetime.utcnow())
+            ))
+        )).all()
+        for user_id, expires_at in rows:
+            FraudListService._merge_whitelist(whitelist, user_id, expires_at)
+
+        blacklist: Set[int] = set((await session.execute(
+            select(FraudBlacklist.user_id)
+            .where(and_(FraudBlacklist.is_active == True, FraudBlacklist.user_id.isnot(None)))
+        )).scalars().all())
+
+        active = FraudBlacklist.is_active == True
+        count = (await session.execute(select(func.count(FraudBlacklist.id)).where(active))).scalar() or 0
+        bloom = BloomFilter(max(settings.fraud_blacklist_bloom_capacity, count * 2))
+        result = await session.stream(
+            select(FraudBlacklist.phone_number, FraudBlacklist.email, FraudBlacklist.ip_address)
+            .where(and_(active, or_(
+                FraudBlacklist.phone_number.isnot(None),
+                FraudBlacklist.email.isnot(None),
+                FraudBlacklist.ip_address.isnot(None)
+            )))
+            .execution_options(yield_per=10000)
+        )
+        async for partition in result.partitions():
+            for phone, email, ip in partition:
+                for key in _identifiers(phone, email, ip).values():
+                    bloom.add(key)
+
+        FraudListService._whitelist = whitelist
+        FraudListService._blacklist = blacklist
+        FraudListService._identifiers = bloom
+        FraudListService._loaded_at = time.monotonic()
+
+    @staticmethod
+    async def ensure_loaded(session: AsyncSession) -> None:
+        cls = FraudListService
+        if cls._loaded_at is not None and time.monotonic() - cls._loaded_at < settings.fraud_lists_resync_seconds:
+            return
+        if cls._lock is None:
+            cls._lock = asyncio.Lock()
+        async with cls._lock:
+            if cls._loaded_at is None or time.monotonic() - cls._loaded_at >= settings.fraud_lists_resync_seconds:
+                await cls.load(session)
+
+    @staticmethod
+    def _merge_whitelist(whitelist: Dict[int, Optional[datetime]], user_id: int, expires_at: Optional[datetime]) -> None:
+        if user_id not in whitelist:
+            whitelist[user_id] = expires_at
+        elif whitelist[user_id] is not None:
+            whitelist[user_id] = None if expires_at is None else max(whitelist[user_id], expires_at)
+
+    @staticmethod
+    async def is_whitelisted(session: AsyncSession, user_id: int) -> bool:
+        await FraudListService.ensure_loaded(session)
+        if user_id not in FraudListService._whitelist:
+            return False
+        expires_at = FraudListService._whitelist[user_id]
+        return expires_at is None or expires_at > datetime.utcnow()
+
+    @staticmethod
+    async def is_blacklisted(session: AsyncSession, user: TelegramUser) -> bool:
+        """User id on the blacklist, or the user's phone number is"""
+        await FraudListService.ensure_loaded(session)
+        if user.id in FraudListService._blacklist:
+            return True
+        if user.phone_number:
+            return await FraudListService.is_identifier_blacklisted(session, phone=user.phone_number)
+        return False
+
+    @staticmethod
+    def might_be_blacklisted(phone: Optional[str] = None, email: Optional[str] = None, ip: Optional[str] = None) -> bool:
+        """Bloom filter check without a query: False is certain, True may be a false positive"""
+        bloom = FraudListService._identifiers
+        return bloom is not None and any(key in bloom for key in _identifiers(phone, email, ip).values())
+
+    @staticmethod
+    async def is_identifier_blacklisted(
+        session: AsyncSession,
+        phone: Optional[str] = None,
+        email: Optional[str] = None,
+        ip: Optional[str] = None
+    ) -> bool:
+        await FraudListService.ensure_loaded(session)
+        if not FraudListService.might_be_blacklisted(phone, email, ip):
+            return False
+        conditions = []
+        if phone and normalize_phone(phone):
+            conditions.append(FraudBlacklist.phone_number.like(f"%{normalize_phone(phone)}"))
+        if email:
+            conditions.append(func.lower(FraudBlacklist.email) == email.strip().lower())
+        if ip:
+            conditions.append(FraudBlacklist.ip_address == ip.strip())
+        found = (await session.execute(
+            select(FraudBlacklist.id).where(and_(FraudBlacklist.is_active == True, or_(*conditions))).limit(1)
+        )).scalar_one_or_none()
+        return found is not None
+
+    @staticmethod
+    def _after_commit(session: AsyncSession, apply) -> None:
+        event.listen(session.sync_session, "after_commit", lambda _session: apply(), once=True)
+
+    @staticmethod
+    def whitelist_added(session: AsyncSession, entry: FraudWhitelist) -> None:
+        def apply():
+            if entry.user_id is not None:
+                FraudListService._merge_whitelist(FraudListService._whitelist, entry.user_id, entry.expires_at)
+        FraudListService._after_commit(session, apply)
+
+    @staticmethod
+    def blacklist_added(session: AsyncSession, entry: FraudBlacklist) -> None:
+        def apply():
+            if entry.user_id is not None:
+                FraudListService._blacklist.add(entry.user_id)
+            if FraudListService._identifiers is not None:
+                for key in _identifiers(entry.phone_number, entry.email, entry.ip_address).values():
+                    FraudListService._identifiers.add(key)
+        FraudListService._after_commit(session, apply)
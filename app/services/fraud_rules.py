@@ -0,0 +1,323 @@
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.anti_fraud import FraudRule, FraudType, FraudSeverity, FraudAction
+from models.billing import Transaction
+from services.fraud_features import FraudFeatures
+from services.risk_counters import RiskVelocity
+from services.versioned_cache import VersionedCache
+
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "fraud_rules_version"
+
+
+@dataclass
+class RuleContext:
+    """Everything a rule may look at; gathered once per transaction"""
+    transaction: Transaction
+    features: FraudFeatures
+    velocity: RiskVelocity
+    similar_receipts: List[Tuple[int, int]] = field(default_factory=list)  # (transaction id, distance)
+
+
+RuleResult = Tuple[float, Dict[str, Any]]
+
+
+def window_hours(fraud_type: FraudType, criteria: Dict[str, Any]) -> float:
+    default = 1 if fraud_type == FraudType.DUPLICATE_PAYMENT else 24
+    return criteria.get("time_window_hours", default)
+
+
+def check_fake_receipt(ctx: RuleContext, criteria: Dict[str, Any]) -> RuleResult:
+    """Check for fake receipt patterns"""
+
+    transaction = ctx.transaction
+    confidence = 0.0
+    evidence = {}
+
+    # Same or near-identical receipt image used before
+    max_distance = criteria.get("max_hash_distance")
+    similar = [
+        (transaction_id, distance) for transaction_id, distance in ctx.similar_receipts
+        if max_distance is None or distance <= max_distance
+    ]
+    if similar:
+        confidence += 0.8
+        evidence["duplicate_receipt_hash"] = transaction.receipt_image_hash
+        evidence["duplicate_count"] = len(similar)
+        evidence["similar_transactions"] = [
+            {"id": transaction_id, "distance": distance} for transaction_id, distance in similar[:10]
+        ]
+
+    # Check receipt amount vs transaction amount
+    if hasattr(transaction, 'receipt_amount') and transaction.receipt_amount:
+        if abs(transaction.receipt_amount - transaction.amount) > 1000:  # 1K IRR difference
+            confidence += 0.6
+            evidence["amount_mismatch"] = {
+                "receipt_amount": transaction.receipt_amount,
+                "transaction_amount": transaction.amount
+            }
+
+    # Check receipt date vs transaction date
+    if hasattr(transaction, 'receipt_date') and transaction.receipt_date:
+        time_diff = abs((transaction.created_at - transaction.receipt_date).total_seconds())
+        if time_diff > 3600:  # More than 1 hour difference
+            confidence += 0.4
+            evidence["date_mismatch"] = {
+                "receipt_date": transaction.receipt_date.isoformat(),
+                "transaction_date": transaction.created_at.isoformat()
+            }
+
+    return min(confidence, 1.0), evidence
+
+
+def check_duplicate_payment(ctx: RuleContext, criteria: Dict[str, Any]) -> RuleResult:
+    """Check for duplicate payments"""
+
+    confidence = 0.0
+    evidence = {}
+
+    # Same amount within time window
+    time_window_hours = window_hours(FraudType.DUPLICATE_PAYMENT, criteria)
+    duplicates = ctx.features.same_amount_count(time_window_hours)
+
+    if duplicates:
+        confidence = min(duplicates * 0.3, 1.0)
+        evidence["duplicate_transactions"] = {
+            "count": duplicates,
+            "amount": ctx.features.amount,
+            "time_window_hours": time_window_hours
+        }
+
+    return confidence, evidence
+
+
+def check_high_frequency(ctx: RuleContext, criteria: Dict[str, Any]) -> RuleResult:
+    """Check for high frequency transactions"""
+
+    confidence = 0.0
+    evidence = {}
+
+    # Transactions in the window, this one included; the rolling counters cover 1h and 24h
+    time_window_hours = window_hours(FraudType.HIGH_FREQUENCY, criteria)
+    if time_window_hours == 1:
+        recent_transactions = ctx.velocity.count_1h + 1
+    elif time_window_hours == 24:
+        recent_transactions = ctx.velocity.count_24h + 1
+    else:
+        recent_transactions = ctx.features.count(time_window_hours) + 1
+
+    max_transactions = criteria.get("max_transactions", 10)
+    if recent_transactions > max_transactions:
+        confidence = min((recent_transactions - max_transactions) / max_transactions, 1.0)
+        evidence["high_frequency"] = {
+            "transactions_count": recent_transactions,
+            "max_allowed": max_transactions,
+            "time_window_hours": time_window_hours
+        }
+
+    return confidence, evidence
+
+
+def check_unusual_amount(ctx: RuleContext, criteria: Dict[str, Any]) -> RuleResult:
+    """Check for unusual transaction amounts"""
+
+    features = ctx.features
+    confidence = 0.0
+    evidence = {}
+
+    if features.history_count >= 5:  # Need at least 5 transactions for analysis
+        avg_amount = features.avg_amount
+        max_amount = features.max_amount
+
+        # Check if current transaction is significantly higher than average
+        if features.amount > avg_amount * criteria.get("multiplier", 3):
+            confidence += 0.6
+            evidence["unusual_amount"] = {
+                "current_amount": features.amount,
+                "average_amount": avg_amount,
+                "max_previous_amount": max_amount
+            }
+
+        # Check if amount is higher than previous maximum
+        if features.amount > max_amount * 1.5:
+            confidence += 0.4
+            evidence["exceeds_maximum"] = {
+                "current_amount": features.amount,
+                "previous_maximum": max_amount
+            }
+
+    return min(confidence, 1.0), evidence
+
+
+def check_suspicious_pattern(ctx: RuleContext, criteria: Dict[str, Any]) -> RuleResult:
+    """Check for suspicious behavioral patterns"""
+
+    features = ctx.features
+    confidence = 0.0
+    evidence = {}
+
+    # Check for rapid successive transactions (this one and those of the last hour)
+    transaction_count = features.count(1) + 1
+    if transaction_count >= 3 and features.span_1h is not None:
+        avg_gap = features.span_1h / (transaction_count - 1)
+        if avg_gap < 300:  # Less than 5 minutes between transactions
+            confidence += 0.7
+            evidence["rapid_transactions"] = {
+                "transaction_count": transaction_count,
+                "average_gap_seconds": avg_gap
+            }
+
+    # Check for round number amounts (potential fake transactions)
+    if features.amount % 10000 == 0 and features.amount >= 100000:  # Round 10K amounts
+        confidence += 0.3
+        evidence["round_amount"] = features.amount
+
+    return min(confidence, 1.0), evidence
+
+
+# Fraud types that have a check; rules of other types are loaded but never fire
+RULE_CHECKS: Dict[FraudType, Callable[[RuleContext, Dict[str, Any]], RuleResult]] = {
+    FraudType.FAKE_RECEIPT: check_fake_receipt,
+    FraudType.DUPLICATE_PAYMENT: check_duplicate_payment,
+    FraudType.HIGH_FREQUENCY: check_high_frequency,
+    FraudType.UNUSUAL_AMOUNT: check_unusual_amount,
+    FraudType.SUSPICIOUS_PATTERN: check_suspicious_pattern,
+}
+
+
+@dataclass
+class RuleTiming:
+    calls: int = 0
+    triggered: int = 0
+    errors: int = 0
+    total_ns: int = 0
+    max_ns: int = 0
+
+    @property
+    def avg_us(self) -> float:
+        return self.total_ns / self.calls / 1000 if self.calls else 0.0
+
+
+@dataclass
+class CompiledRule:
+    """A FraudRule with its criteria parsed and its check resolved, detached from any session"""
+    id: int
+    name: str
+    fraud_type: FraudType
+    severity: FraudSeverity
+    action: FraudAction
+    threshold: float
+    auto_action: bool
+    criteria: Dict[str, Any]
+    check: Callable[[RuleContext, Dict[str, Any]], RuleResult]
+
+    def evaluate(self, ctx: RuleContext) -> Optional[RuleResult]:
+        """(confidence, evidence) when the rule fires, else None; timed per rule"""
+        timing = FraudRuleEngine.timings.setdefault(self.id, RuleTiming())
+        started = time.perf_counter_ns()
+        try:
+            confidence, evidence = self.check(ctx, self.criteria)
+        except Exception as e:
+            timing.errors += 1
+            logger.warning("Error checking fraud rule %s: %s", self.name, e)
+            return None
+        finally:
+            elapsed = time.perf_counter_ns() - started
+            timing.calls += 1
+            timing.total_ns += elapsed
+            timing.max_ns = max(timing.max_ns, elapsed)
+        if confidence >= self.threshold:
+            timing.triggered += 1
+            return confidence, evidence
+        return None
+
+
+def _parse_criteria(value: Any) -> Dict[str, Any]:
+    # Criteria historically store JSON-encoded strings in the JSON column
+    if isinstance(value, str):
+        value = json.loads(value)
+    return dict(value or {})
+
+
+class FraudRuleEngine:
+    """The active fraud rules, compiled once and shared by every analysis.
+
+    Rules are loaded with their criteria parsed and their check looked up
+    in RULE_CHECKS, so evaluating one is a plain function call. The set is
+    a VersionedCache under the `fraud_rules_version` bot setting, which
+    rule edits bump; `fraud_rules_check_seconds` bounds how long other
+    processes keep a stale set. Each rule keeps call/trigger counts and
+    evaluation time so slow rules show up.
+    """
+
+    timings: Dict[int, RuleTiming] = {}
+
+    @staticmethod
+    def compile(rule: FraudRule) -> Optional[CompiledRule]:
+        check = RULE_CHECKS.get(rule.fraud_type)
+        if check is None:
+            return None
+        try:
+            criteria = _parse_criteria(rule.criteria)
+        except (TypeError, ValueError) as e:
+            logger.error("Fraud rule %s has invalid criteria: %s", rule.name, e)
+            return None
+        return CompiledRule(
+            id=rule.id,
+            name=rule.name,
+            fraud_type=rule.fraud_type,
+            severity=rule.severity,
+            action=rule.action,
+            threshold=float(rule.threshold or 0.7),
+            auto_action=bool(rule.auto_action),
+            criteria=criteria,
+            check=check,
+        )
+
+    @staticmethod
+    async def load(session: AsyncSession) -> List[CompiledRule]:
+        rows = (await session.execute(
+            select(FraudRule).where(FraudRule.is_active == True).order_by(FraudRule.id)
+        )).scalars().all()
+        compiled = [FraudRuleEngine.compile(rule) for rule in rows]
+        rules = [rule for rule in compiled if rule is not None]
+        logger.info("Loaded %d fraud rules", len(rules))
+        return rules
+
+    @staticmethod
+    async def rules(session: AsyncSession) -> List[CompiledRule]:
+        return await _cache.get(session)
+
+    @staticmethod
+    def windows(rules: List[CompiledRule]) -> List[float]:
+        """Look-back windows the rules need in the feature vector"""
+        return [
+            window_hours(rule.fraud_type, rule.criteria)
+            for rule in rules
+            if rule.fraud_type in (FraudType.DUPLICATE_PAYMENT, FraudType.HIGH_FREQUENCY)
+        ]
+
+    @staticmethod
+    def invalidate() -> None:
+        _cache.invalidate()
+
+    @staticmethod
+    async def bump_version(session: AsyncSession) -> None:
+        """Call in the session that edits rules; every process reloads once it commits"""
+        await _cache.bump(session)
+
+    @staticmethod
+    def slowest(limit: int = 10) -> List[Tuple[int, RuleTiming]]:
+        return sorted(FraudRuleEngine.timings.items(), key=lambda item: item[1].total_ns, reverse=True)[:limit]
+
+
+_cache = VersionedCache(VERSION_KEY, "fraud rule set", "fraud_rules_check_seconds", FraudRuleEngine.load)
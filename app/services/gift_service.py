@@ -0,0 +1,323 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select, update, insert, func, and_, Select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.db import get_db_session
+from models.admin import Gift, GiftPanelPush
+from models.catalog import Server
+from models.notifications import Notification, NotificationType
+from models.service import Service
+from models.user import TelegramUser
+from services.panels.factory import get_panel_client_for_server
+from services.scheduled_message_service import ScheduledMessageService
+
+
+logger = logging.getLogger(__name__)
+
+PANEL_PUSH_MAX_ATTEMPTS = 8
+
+
+class GiftAmountError(ValueError):
+    """A gift amount the recipients cannot receive as given"""
+
+
+class GiftService:
+    """Bulk gifts applied in the background with set-based updates"""
+
+    @staticmethod
+    def _recipients_query(criteria: Dict[str, Any]) -> Select:
+        segment = (criteria or {}).get("segment", "active_users")
+        query = ScheduledMessageService._segment_query(segment)
+        if query is None:
+            raise ValueError(f"Unknown segment: {segment}")
+        return query
+
+    @staticmethod
+    def describe(gift_type: str, amount: float) -> str:
+        if gift_type == "wallet_balance":
+            return f"موجودی {amount:,.0f} تومان"
+        return f"{amount:,.0f} گیگ ترافیک"
+
+    @staticmethod
+    async def create_bulk_gift(
+        session: AsyncSession,
+        from_admin_id: int,
+        gift_type: str,
+        amount: float,
+        criteria: Dict[str, Any],
+        description: Optional[str] = None
+    ) -> Gift:
+        """Queue a bulk gift; the `gifts.process` job applies it in chunks"""
+
+        if gift_type != "wallet_balance":
+            GiftService.whole_gb(amount)
+
+        recipients = GiftService._recipients_query(criteria).subquery()
+        total = (await session.execute(select(func.count()).select_from(recipients))).scalar() or 0
+
+        gift = Gift(
+            from_admin_id=from_admin_id,
+            to_user_id=None,
+            type=gift_type,
+            amount=amount,
+            description=description,
+            is_bulk=True,
+            target_criteria=json.dumps(criteria) if criteria else None,
+            total_count=total,
+            processed_count=0,
+            last_processed_user_id=0,
+            status="pending"
+        )
+        session.add(gift)
+        await session.flush()
+        return gift
+
+    @staticmethod
+    def whole_gb(amount) -> int:
+        """Traffic gifts go to the panels in whole GB; anything else is refused, not truncated"""
+        if float(amount) != int(amount) or int(amount) <= 0:
+            raise GiftAmountError(f"Traffic gifts must be a positive whole number of GB, got {amount}")
+        return int(amount)
+
+    @staticmethod
+    async def _apply_chunk(session: AsyncSession, gift: Gift, chunk_size: int) -> List[int]:
+        """Apply the gift to the next chunk of recipients; returns the user ids processed.
+
+        Traffic the panels must also receive is queued as GiftPanelPush rows
+        in the same transaction.
+        """
+
+        criteria = json.loads(gift.target_criteria) if gift.target_criteria else {}
+        recipients = GiftService._recipients_query(criteria)
+        user_ids = list((await session.execute(
+            recipients
+            .where(TelegramUser.id > gift.last_processed_user_id)
+            .order_by(TelegramUser.id)
+            .limit(chunk_size)
+        )).scalars().all())
+        if not user_ids:
+            return []
+
+        if gift.type == "wallet_balance":
+            await session.execute(
+                update(TelegramUser)
+                .where(TelegramUser.id.in_(user_ids))
+                .values(wallet_balance=func.coalesce(TelegramUser.wallet_balance, 0) + gift.amount)
+                .execution_options(synchronize_session=False)
+            )
+        else:
+            add_gb = GiftService.whole_gb(gift.amount)
+            service_filter = and_(Service.user_id.in_(user_ids), Service.is_active == True)
+            await session.execute(
+                update(Service)
+                .where(service_filter)
+                .values(traffic_limit_gb=func.coalesce(Service.traffic_limit_gb, 0) + add_gb)
+                .execution_options(synchronize_session=False)
+            )
+            # Panels find a client by uuid or by its email (our remark)
+            by_server: Dict[int, set] = defaultdict(set)
+            for server_id, uuid, remark in (await session.execute(
+                select(Service.server_id, Service.uuid, Service.remark).where(service_filter)
+            )).all():
+                by_server[server_id].add((uuid, remark or None))
+            if by_server:
+                await session.execute(insert(GiftPanelPush), [
+                    {
+                        "gift_id": gift.id,
+                        "server_id": server_id,
+                        "identifiers": json.dumps(sorted(identifiers, key=lambda pair: pair[0])),
+                        "add_gb": add_gb,
+                    }
+                    for server_id, identifiers in by_server.items()
+                ])
+
+        now = datetime.utcnow()
+        text = GiftService.describe(gift.type, float(gift.amount))
+        await session.execute(insert(Notification), [
+            {
+                "user_id": user_id,
+                "notification_type": NotificationType.GIFT_RECEIVED,
+                "title": "🎁 هدیه",
+                "message": f"هدیه گروهی برای شما اعمال شد: {text}." + (f"\n{gift.description}" if gift.description else ""),
+                "priority": 1,
+                "scheduled_at": now,
+                "context_data": json.dumps({"gift_id": gift.id}),
+                "dedup_key": f"gift:{gift.id}:{user_id}",
+            }
+            for user_id in user_ids
+        ])
+
+        gift.processed_count = (gift.processed_count or 0) + len(user_ids)
+        gift.last_processed_user_id = user_ids[-1]
+        return user_ids
+
+    @staticmethod
+    async def push_to_panels(gift_id: Optional[int] = None) -> Dict[str, int]:
+        """Send due GiftPanelPush rows (of one gift, or all) to their panels.
+
+        Servers are pushed concurrently, each server's rows in order. A failed
+        push is retried with exponential backoff and marked failed after
+        PANEL_PUSH_MAX_ATTEMPTS. A crash between the panel call and recording
+        it can push a chunk twice; the panel API has no idempotency key.
+        """
+
+        now = datetime.utcnow()
+        async with get_db_session() as session:
+            query = (
+                select(GiftPanelPush)
+                .where(and_(GiftPanelPush.status == "pending", GiftPanelPush.next_attempt_at <= now))
+                .order_by(GiftPanelPush.id)
+            )
+            if gift_id is not None:
+                query = query.where(GiftPanelPush.gift_id == gift_id)
+            pushes = (await session.execute(query)).scalars().all()
+            servers = {
+                server.id: server
+                for server in (await session.execute(
+                    select(Server).where(Server.id.in_({push.server_id for push in pushes}))
+                )).scalars().all()
+            }
+
+        by_server: Dict[int, List[GiftPanelPush]] = defaultdict(list)
+        for push in pushes:
+            by_server[push.server_id].append(push)
+        report = {"done": 0, "retry": 0, "failed": 0}
+
+        async def record(push: GiftPanelPush, error: Optional[str], remaining: Optional[List] = None) -> None:
+            """Mark a push done, or count a failed attempt; `remaining` narrows a retry to the clients still owed"""
+            if error is None:
+                values = {"status": "done", "pushed_at": datetime.utcnow(), "last_error": None}
+                report["done"] += 1
+            else:
+                attempts = push.attempts + 1
+                values = {
+                    "attempts": attempts,
+                    "last_error": error[:1000],
+                    "next_attempt_at": datetime.utcnow() + timedelta(minutes=2 ** attempts),
+                }
+                if remaining is not None:
+                    values["identifiers"] = json.dumps(remaining)
+                if attempts >= PANEL_PUSH_MAX_ATTEMPTS:
+                    values["status"] = "failed"
+                    report["failed"] += 1
+                    logger.error("Gift %s: giving up pushing traffic to server %s: %s", push.gift_id, push.server_id, error)
+                else:
+                    report["retry"] += 1
+            async with get_db_session() as session:
+                await session.execute(update(GiftPanelPush).where(GiftPanelPush.id == push.id).values(**values))
+
+        async def push_server(server_id: int, server_pushes: List[GiftPanelPush]) -> None:
+            server = servers.get(server_id)
+            if server is None:
+                for push in server_pushes:
+                    await record(push, "Server not found")
+                return
+            client = get_panel_client_for_server(
+                base_url=server.api_base_url,
+                panel_type=server.panel_type,
+                auth_mode=server.auth_mode,
+                api_key=server.api_key,
+                username=server.auth_username,
+                password=server.auth_password,
+            )
+            for push in server_pushes:
+                clients = json.loads(push.identifiers)
+                try:
+                    missed = set(await client.add_traffic_bulk(
+                        [identifier for pair in clients for identifier in pair if identifier], push.add_gb
+                    ))
+                except Exception as e:
+                    logger.exception("Panel traffic push failed for server %s", server_id)
+                    await record(push, str(e) or type(e).__name__)
+                    continue
+                # A client was updated when the panel matched it by either identifier
+                remaining = [
+                    [uuid, remark] for uuid, remark in clients
+                    if uuid in missed and (remark is None or remark in missed)
+                ]
+                if remaining:
+                    logger.warning("Gift %s: server %s did not update %d clients", push.gift_id, server_id, len(remaining))
+                    await record(push, f"Panel did not update {len(remaining)} of {len(clients)} clients", remaining)
+                else:
+                    await record(push, None)
+
+        await asyncio.gather(*(push_server(server_id, items) for server_id, items in by_server.items()))
+        return report
+
+    @staticmethod
+    async def process_gift(gift_id: int, chunk_size: int = 1000) -> Optional[Gift]:
+        """Apply a bulk gift chunk by chunk, one short transaction per chunk.
+
+        Each chunk locks the gift row and advances its user-id cursor in the same
+        transaction as the balance/traffic updates, so a crashed or concurrent run
+        resumes exactly where the last committed chunk ended.
+        """
+
+        while True:
+            async with get_db_session() as session:
+                gift = (await session.execute(
+                    select(Gift).where(Gift.id == gift_id).with_for_update()
+                )).scalar_one_or_none()
+                if not gift or gift.status not in ("pending", "processing"):
+                    return gift
+
+                if gift.status == "pending":
+                    gift.status = "processing"
+                    gift.started_at = datetime.utcnow()
+
+                try:
+                    user_ids = await GiftService._apply_chunk(session, gift, chunk_size)
+                except ValueError as e:
+                    gift.status = "failed"
+                    gift.error_message = str(e)
+                    return gift
+
+                if not user_ids:
+                    gift.status = "completed"
+                    gift.completed_at = datetime.utcnow()
+                    if gift.from_admin_id:
+                        session.add(Notification(
+                            user_id=gift.from_admin_id,
+                            notification_type=NotificationType.GIFT_RECEIVED,
+                            title="✅ هدیه گروهی تکمیل شد",
+                            message=f"هدیه #{gift.id} ({GiftService.describe(gift.type, float(gift.amount))}) برای {gift.processed_count} کاربر اعمال شد.",
+                            priority=1,
+                            dedup_key=f"gift_done:{gift.id}"
+                        ))
+                    return gift
+
+            # Panel calls happen outside the DB transaction, from the committed push rows
+            if gift.type != "wallet_balance":
+                await GiftService.push_to_panels(gift_id)
+
+    @staticmethod
+    async def process_pending_gifts() -> int:
+        """Run every queued or interrupted bulk gift to completion"""
+
+        async with get_db_session() as session:
+            gift_ids = (await session.execute(
+                select(Gift.id)
+                .where(and_(Gift.is_bulk == True, Gift.status.in_(["pending", "processing"])))
+                .order_by(Gift.id)
+            )).scalars().all()
+
+        for gift_id in gift_ids:
+            try:
+                await GiftService.process_gift(gift_id)
+            except Exception as e:
+                # Left in "processing" so the next run resumes from the committed cursor
+                logger.exception("Bulk gift %s failed", gift_id)
+                async with get_db_session() as session:
+                    await session.execute(
+                        update(Gift).where(Gift.id == gift_id).values(error_message=str(e))
+                    )
+
+        # Panel pushes that failed earlier (or were cut off by a restart)
+        await GiftService.push_to_panels()
+        return len(gift_ids)
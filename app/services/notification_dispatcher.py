@@ -0,0 +1,249 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from sqlalchemy import select, and_, or_, insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.db import get_db_session
+from models.notifications import Notification, NotificationLog, NotificationStatus
+from models.user import TelegramUser
+from services.rate_limiter import AsyncRateLimiter
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ClaimedNotification:
+    id: int
+    user_id: int
+    chat_id: int
+    title: str
+    message: str
+    delivery_attempts: int
+
+
+@dataclass
+class DeliveryResult:
+    notification: ClaimedNotification
+    telegram_message_id: Optional[int] = None
+    error_message: Optional[str] = None
+    permanent: bool = False  # user blocked the bot, no point retrying
+    retry_later: bool = False  # rate limited, does not count as an attempt
+
+
+class NotificationDispatcher:
+    """Drains pending notifications in claimed batches.
+
+    A batch is claimed with ``SELECT ... FOR UPDATE SKIP LOCKED`` and flipped to
+    ``SENDING`` in a short transaction, so several workers can drain the queue
+    side by side. Messages are then sent concurrently through a shared rate
+    limiter and the outcome of the whole batch is written back with bulk
+    statements.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 500,
+        concurrency: int = 20,
+        rate_per_second: float = 25.0,
+        max_attempts: int = 3,
+        idle_interval: float = 5.0,
+        claim_timeout_minutes: int = 10,
+    ):
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.idle_interval = idle_interval
+        self.claim_timeout = timedelta(minutes=claim_timeout_minutes)
+        self.rate_limiter = AsyncRateLimiter(rate_per_second)
+        self._stop_event = asyncio.Event()
+
+    async def claim_batch(self, session: AsyncSession) -> List[ClaimedNotification]:
+        """Lock a batch of due notifications and mark them as SENDING"""
+
+        now = datetime.utcnow()
+        rows = (await session.execute(
+            select(
+                Notification.id,
+                Notification.user_id,
+                TelegramUser.telegram_user_id,
+                Notification.title,
+                Notification.message,
+                Notification.delivery_attempts,
+            )
+            .join(TelegramUser, TelegramUser.id == Notification.user_id)
+            .where(
+                or_(
+                    and_(
+                        Notification.status == NotificationStatus.PENDING,
+                        Notification.scheduled_at <= now
+                    ),
+                    # Claims abandoned by a crashed worker
+                    and_(
+                        Notification.status == NotificationStatus.SENDING,
+                        Notification.last_attempt_at < now - self.claim_timeout
+                    ),
+                )
+            )
+            .order_by(Notification.priority.desc(), Notification.scheduled_at)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True, of=Notification)
+        )).all()
+
+        if not rows:
+            return []
+
+        await session.execute(
+            update(Notification)
+            .where(Notification.id.in_([row.id for row in rows]))
+            .values(status=NotificationStatus.SENDING, last_attempt_at=now)
+            .execution_options(synchronize_session=False)
+        )
+
+        return [
+            ClaimedNotification(
+                id=row.id,
+                user_id=row.user_id,
+                chat_id=row.telegram_user_id,
+                title=row.title,
+                message=row.message,
+                delivery_attempts=row.delivery_attempts or 0,
+            )
+            for row in rows
+        ]
+
+    async def _deliver(self, bot: Bot, semaphore: asyncio.Semaphore, notification: ClaimedNotification) -> DeliveryResult:
+        async with semaphore:
+            await self.rate_limiter.acquire()
+            try:
+                sent_message = await bot.send_message(
+                    chat_id=notification.chat_id,
+                    text=f"🔔 {notification.title}\n\n{notification.message}",
+                    parse_mode="HTML"
+                )
+                return DeliveryResult(notification, telegram_message_id=sent_message.message_id)
+            except TelegramRetryAfter as e:
+                self.rate_limiter.pause(e.retry_after)
+                return DeliveryResult(notification, error_message=str(e), retry_later=True)
+            except TelegramForbiddenError as e:
+                return DeliveryResult(notification, error_message=str(e), permanent=True)
+            except Exception as e:
+                return DeliveryResult(notification, error_message=str(e))
+
+    async def send_batch(self, bot: Bot, claimed: List[ClaimedNotification]) -> List[DeliveryResult]:
+        """Send a claimed batch concurrently, bounded by the rate limiter"""
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        return await asyncio.gather(*(self._deliver(bot, semaphore, n) for n in claimed))
+
+    async def apply_results(self, session: AsyncSession, results: List[DeliveryResult]) -> int:
+        """Write statuses and delivery logs for a sent batch with bulk statements"""
+
+        now = datetime.utcnow()
+        delivered_ids = [r.notification.id for r in results if r.telegram_message_id is not None]
+        rate_limited_ids = [r.notification.id for r in results if r.retry_later]
+
+        if delivered_ids:
+            await session.execute(
+                update(Notification)
+                .where(Notification.id.in_(delivered_ids))
+                .values(status=NotificationStatus.DELIVERED, sent_at=now, delivered_at=now)
+                .execution_options(synchronize_session=False)
+            )
+
+        if rate_limited_ids:
+            await session.execute(
+                update(Notification)
+                .where(Notification.id.in_(rate_limited_ids))
+                .values(status=NotificationStatus.PENDING)
+                .execution_options(synchronize_session=False)
+            )
+
+        # Failed rows are owned by this worker while SENDING, so per-row values can
+        # be computed here and written as a single executemany by primary key.
+        failed_rows = []
+        for r in results:
+            if r.telegram_message_id is not None or r.retry_later:
+                continue
+            attempts = r.notification.delivery_attempts + 1
+            exhausted = r.permanent or attempts >= self.max_attempts
+            failed_rows.append({
+                "id": r.notification.id,
+                "delivery_attempts": attempts,
+                "last_attempt_at": now,
+                "error_message": r.error_message,
+                "status": NotificationStatus.FAILED if exhausted else NotificationStatus.PENDING,
+            })
+        if failed_rows:
+            await session.execute(update(Notification), failed_rows)
+
+        logs = [
+            {
+                "notification_id": r.notification.id,
+                "user_id": r.notification.user_id,
+                "attempt_number": r.notification.delivery_attempts + 1,
+                "status": NotificationStatus.DELIVERED if r.telegram_message_id is not None else NotificationStatus.FAILED,
+                "attempted_at": now,
+                "delivered_at": now if r.telegram_message_id is not None else None,
+                "telegram_message_id": r.telegram_message_id,
+                "error_message": r.error_message,
+            }
+            for r in results if not r.retry_later
+        ]
+        if logs:
+            await session.execute(insert(NotificationLog), logs)
+
+        return len(delivered_ids)
+
+    async def dispatch_batch(self, session: AsyncSession, bot: Bot) -> int:
+        """Claim, send and record one batch; returns the number delivered"""
+
+        claimed = await self.claim_batch(session)
+        # Release the row locks before talking to Telegram
+        await session.commit()
+        if not claimed:
+            return 0
+
+        results = await self.send_batch(bot, claimed)
+        return await self.apply_results(session, results)
+
+    async def run(self, bot: Bot) -> None:
+        """Drain the queue continuously until stop() is called"""
+
+        self._stop_event.clear()
+        while not self._stop_event.is_set():
+            claimed_full_batch = False
+            try:
+                async with get_db_session() as session:
+                    claimed = await self.claim_batch(session)
+                if claimed:
+                    results = await self.send_batch(bot, claimed)
+                    async with get_db_session() as session:
+                        await self.apply_results(session, results)
+                    claimed_full_batch = len(claimed) >= self.batch_size
+            except Exception:
+                logger.exception("Notification dispatch failed")
+
+            if claimed_full_batch:
+                continue
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=self.idle_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+
+notification_dispatcher = NotificationDispatcher(
+    batch_size=settings.notification_batch_size,
+    concurrency=settings.notification_concurrency,
+    rate_per_second=settings.notification_rate_per_second,
+)
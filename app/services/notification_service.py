@@ -1,11 +1,11 @@
 import json
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any
-from sqlalchemy import select, and_, or_, func
+from sqlalchemy import select, and_, or_, func, case, insert, update, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from models.notifications import (
-    Notification, NotificationTemplate, NotificationSettings, NotificationLog,
+    Notification, NotificationTemplate, NotificationSettings,
     NotificationType, NotificationStatus
 )
 from models.user import TelegramUser
@@ -75,9 +75,15 @@ class NotificationService:
         session.add(notification)
         await session.flush()
         
-        # Update user settings
-        settings.notifications_today += 1
-        settings.last_notification_at = datetime.utcnow()
+        # Update counters in SQL rather than read-modify-write on the ORM row
+        await session.execute(
+            update(NotificationSettings)
+            .where(NotificationSettings.id == settings.id)
+            .values(
+                notifications_today=NotificationSettings.notifications_today + 1,
+                last_notification_at=datetime.utcnow()
+            )
+        )
         
         return notification
     
@@ -192,151 +198,161 @@ class NotificationService:
     
     @staticmethod
     async def process_pending_notifications(session: AsyncSession) -> int:
-        """Process pending notifications and send them"""
-        
-        # Get pending notifications
-        pending_notifications = (await session.execute(
-            select(Notification)
-            .where(
-                and_(
-                    Notification.status == NotificationStatus.PENDING,
-                    Notification.scheduled_at <= datetime.utcnow()
-                )
-            )
-            .order_by(Notification.priority.desc(), Notification.scheduled_at)
-            .limit(100)  # Process in batches
-        )).scalars().all()
+        """Send one batch of pending notifications (the bot also drains the queue continuously)"""
         
-        sent_count = 0
-        
-        for notification in pending_notifications:
-            try:
-                success = await NotificationService._send_telegram_notification(
-                    session, notification
-                )
-                
-                if success:
-                    notification.status = NotificationStatus.SENT
-                    notification.sent_at = datetime.utcnow()
-                    sent_count += 1
-                else:
-                    notification.delivery_attempts += 1
-                    notification.last_attempt_at = datetime.utcnow()
-                    
-                    # Mark as failed if too many attempts
-                    if notification.delivery_attempts >= 3:
-                        notification.status = NotificationStatus.FAILED
-            
-            except Exception as e:
-                notification.delivery_attempts += 1
-                notification.last_attempt_at = datetime.utcnow()
-                notification.error_message = str(e)
-                
-                if notification.delivery_attempts >= 3:
-                    notification.status = NotificationStatus.FAILED
+        from aiogram import Bot
+        from services.notification_dispatcher import notification_dispatcher
         
-        return sent_count
+        bot = Bot(token=settings.bot_token)
+        try:
+            return await notification_dispatcher.dispatch_batch(session, bot)
+        finally:
+            await bot.session.close()
     
     @staticmethod
-    async def _send_telegram_notification(
-        session: AsyncSession,
-        notification: Notification
-    ) -> bool:
-        """Send notification via Telegram"""
+    def _settings_default(column_name: str) -> Any:
+        """Python-side default of a NotificationSettings column (for users without a row)"""
         
-        try:
-            from aiogram import Bot
-            bot = Bot(token=settings.bot_token)
-            
-            # Get user
-            user = (await session.execute(
-                select(TelegramUser).where(TelegramUser.id == notification.user_id)
-            )).scalar_one()
-            
-            # Format message
-            message_text = f"🔔 {notification.title}\n\n{notification.message}"
-            
-            # Send message
-            sent_message = await bot.send_message(
-                chat_id=user.telegram_user_id,
-                text=message_text,
-                parse_mode="HTML"
-            )
-            
-            # Log delivery
-            log = NotificationLog(
-                notification_id=notification.id,
-                user_id=notification.user_id,
-                attempt_number=notification.delivery_attempts + 1,
-                status=NotificationStatus.DELIVERED,
-                delivered_at=datetime.utcnow(),
-                telegram_message_id=sent_message.message_id
-            )
-            session.add(log)
-            
-            notification.status = NotificationStatus.DELIVERED
-            notification.delivered_at = datetime.utcnow()
-            
-            return True
-            
-        except Exception as e:
-            # Log failure
-            log = NotificationLog(
-                notification_id=notification.id,
-                user_id=notification.user_id,
-                attempt_number=notification.delivery_attempts + 1,
-                status=NotificationStatus.FAILED,
-                error_message=str(e)
-            )
-            session.add(log)
-            
-            return False
+        return NotificationSettings.__table__.c[column_name].default.arg
     
     @staticmethod
-    async def check_service_expiries(session: AsyncSession):
-        """Check for expiring services and send notifications"""
+    async def check_service_expiries(session: AsyncSession, chunk_size: int = 1000) -> int:
+        """Check for expiring services and queue notifications.
+        
+        The whole scan is set-based: one joined query picks services inside each
+        user's own warning window (honouring enabled flags, daily limit and
+        cooldown), one lookup drops already-notified services by dedup key, and
+        notifications plus settings counters are written with bulk statements.
+        """
         
-        # Get services expiring in the next 7 days
-        seven_days_from_now = datetime.utcnow() + timedelta(days=7)
+        now = datetime.utcnow()
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        default = NotificationService._settings_default
+        
+        # Upper bound for the sargable range on Service.expires_at
+        max_days_before = (await session.execute(
+            select(func.max(NotificationSettings.service_expiry_days_before))
+        )).scalar()
+        window_days = max(max_days_before or 0, default("service_expiry_days_before"))
+        
+        days_until_expiry = func.timestampdiff(text("DAY"), now, Service.expires_at)
+        notifications_today = case(
+            (or_(
+                NotificationSettings.last_reset_date.is_(None),
+                NotificationSettings.last_reset_date < today
+            ), 0),
+            else_=NotificationSettings.notifications_today
+        )
         
-        expiring_services = (await session.execute(
-            select(Service, TelegramUser)
-            .join(TelegramUser, Service.user_id == TelegramUser.id)
+        rows = (await session.execute(
+            select(
+                Service.id.label("service_id"),
+                Service.user_id,
+                Service.remark,
+                Service.expires_at,
+                days_until_expiry.label("days_until_expiry"),
+                NotificationSettings.id.label("settings_id"),
+                NotificationSettings.quiet_hours_start,
+                NotificationSettings.quiet_hours_end,
+            )
+            .outerjoin(NotificationSettings, NotificationSettings.user_id == Service.user_id)
             .where(
                 and_(
                     Service.is_active == True,
-                    Service.expires_at.isnot(None),
-                    Service.expires_at <= seven_days_from_now,
-                    Service.expires_at > datetime.utcnow()
+                    Service.expires_at > now,
+                    Service.expires_at <= now + timedelta(days=window_days + 1),
+                    func.coalesce(NotificationSettings.notifications_enabled, True) == True,
+                    func.coalesce(NotificationSettings.service_expiry_enabled, True) == True,
+                    days_until_expiry <= func.coalesce(
+                        NotificationSettings.service_expiry_days_before,
+                        default("service_expiry_days_before")
+                    ),
+                    or_(
+                        NotificationSettings.id.is_(None),
+                        notifications_today < NotificationSettings.max_notifications_per_day
+                    ),
+                    or_(
+                        NotificationSettings.last_notification_at.is_(None),
+                        func.timestampdiff(text("MINUTE"), NotificationSettings.last_notification_at, now)
+                        >= NotificationSettings.notification_cooldown_minutes
+                    ),
                 )
             )
+            .order_by(Service.expires_at)
         )).all()
         
-        for service, user in expiring_services:
-            days_until_expiry = (service.expires_at - datetime.utcnow()).days
+        if not rows:
+            return 0
+        
+        # One warning per service per remaining-day bucket; a renewal changes
+        # expires_at and therefore the key, so renewed services warn again.
+        def dedup_key(row) -> str:
+            return f"service_expiry:{row.service_id}:{row.expires_at:%Y%m%d%H%M}:{row.days_until_expiry}"
+        
+        keys = [dedup_key(row) for row in rows]
+        already_sent = set()
+        for i in range(0, len(keys), chunk_size):
+            already_sent.update((await session.execute(
+                select(Notification.dedup_key).where(Notification.dedup_key.in_(keys[i:i + chunk_size]))
+            )).scalars().all())
+        
+        # The per-user cooldown allows a single notification per run; rows are
+        # ordered by expiry so the most urgent service wins.
+        notifications = []
+        notified_users = {}
+        for row, key in zip(rows, keys):
+            if key in already_sent or row.user_id in notified_users:
+                continue
+            notified_users[row.user_id] = row.settings_id is not None
             
-            # Get user settings to check notification preferences
-            settings = await NotificationService._get_user_settings(session, user.id)
+            scheduled_at = now
+            if await NotificationService._is_quiet_hours(row):
+                scheduled_at = await NotificationService._get_next_available_time(row)
             
-            if not settings.service_expiry_enabled:
-                continue
+            message = f"سرویس شما '{row.remark}' در {row.days_until_expiry} روز منقضی می‌شود.\n"
+            message += f"تاریخ انقضا: {row.expires_at.strftime('%Y/%m/%d %H:%M')}\n\n"
+            message += "برای تمدید سرویس از منوی 'سرویس‌های من' استفاده کنید."
             
-            # Send notification based on days before expiry
-            if days_until_expiry <= settings.service_expiry_days_before:
-                title = "⚠️ هشدار انقضای سرویس"
-                message = f"سرویس شما '{service.remark}' در {days_until_expiry} روز منقضی می‌شود.\n"
-                message += f"تاریخ انقضا: {service.expires_at.strftime('%Y/%m/%d %H:%M')}\n\n"
-                message += "برای تمدید سرویس از منوی 'سرویس‌های من' استفاده کنید."
-                
-                await NotificationService.send_notification(
-                    session=session,
-                    user_id=user.id,
-                    notification_type=NotificationType.SERVICE_EXPIRY_WARNING,
-                    title=title,
-                    message=message,
-                    related_service_id=service.id,
-                    context_data={"days_until_expiry": days_until_expiry}
+            notifications.append({
+                "user_id": row.user_id,
+                "notification_type": NotificationType.SERVICE_EXPIRY_WARNING,
+                "title": "⚠️ هشدار انقضای سرویس",
+                "message": message,
+                "priority": 0,
+                "context_data": json.dumps({"days_until_expiry": row.days_until_expiry}),
+                "related_service_id": row.service_id,
+                "dedup_key": key,
+                "scheduled_at": scheduled_at,
+            })
+        
+        if not notifications:
+            return 0
+        
+        for i in range(0, len(notifications), chunk_size):
+            await session.execute(insert(Notification), notifications[i:i + chunk_size])
+        
+        # Bump counters for users that already have settings, create rows for the rest
+        existing_ids = [user_id for user_id, has_settings in notified_users.items() if has_settings]
+        for i in range(0, len(existing_ids), chunk_size):
+            await session.execute(
+                update(NotificationSettings)
+                .where(NotificationSettings.user_id.in_(existing_ids[i:i + chunk_size]))
+                .values(
+                    notifications_today=notifications_today + 1,
+                    last_notification_at=now,
+                    last_reset_date=today
                 )
+                .execution_options(synchronize_session=False)
+            )
+        
+        new_settings = [
+            {"user_id": user_id, "notifications_today": 1, "last_notification_at": now, "last_reset_date": today}
+            for user_id, has_settings in notified_users.items() if not has_settings
+        ]
+        for i in range(0, len(new_settings), chunk_size):
+            await session.execute(insert(NotificationSettings), new_settings[i:i + chunk_size])
+        
+        return len(notifications)
     
     @staticmethod
     async def check_low_wallet_balances(session: AsyncSession):
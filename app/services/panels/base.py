@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Optional, Protocol
+from typing import Iterable, List, Optional, Protocol
 
 
 @dataclass
@@ -43,6 +43,8 @@ class PanelClient(Protocol):
 
     async def add_traffic(self, uuid: str, add_gb: int) -> None: ...
 
+    async def add_traffic_bulk(self, identifiers: Iterable[str], add_gb: int) -> List[str]: ...  # returns identifiers not updated
+
     async def get_usage(self, uuid: str) -> dict: ...
 
     async def reset_uuid(self, uuid: str) -> str: ...  # returns new uuid
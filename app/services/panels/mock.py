@@ -1,4 +1,5 @@
 import uuid as uuid_lib
+from typing import Iterable, List
 
 from .base import PanelClient, CreateServiceRequest, CreateServiceResult
 
@@ -23,6 +24,9 @@ class MockPanelClient(PanelClient):
     async def add_traffic(self, uuid: str, add_gb: int) -> None:
         return None
 
+    async def add_traffic_bulk(self, identifiers: Iterable[str], add_gb: int) -> List[str]:
+        return []
+
     async def get_usage(self, uuid: str) -> dict:
         return {"used_gb": 0, "remaining_gb": 0, "days_left": 0}
 
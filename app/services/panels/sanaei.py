@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import time
 import uuid as uuid_lib
-from typing import Optional
+from typing import Iterable, List, Optional
 from urllib.parse import urlparse
 
 import httpx
@@ -388,6 +388,74 @@ class SanaeiPanelClient(PanelClient):
                     continue
             return None
 
+    async def add_traffic_bulk(self, identifiers: Iterable[str], add_gb: int) -> List[str]:
+        """Add traffic to many clients with one login and one pass over the inbounds
+
+        Returns the identifiers that were not updated: not found on any
+        inbound, or every updateClient endpoint refused the change. Login
+        and inbound listing failures raise.
+        """
+        import json as _json
+
+        wanted = {i for i in identifiers if i}
+        if not wanted:
+            return []
+        async with httpx.AsyncClient(timeout=30, follow_redirects=True) as client:
+            await self._login_get_cookie(client)
+            inbounds = await self._list_inbounds(client)
+            for ib in inbounds:
+                ib_id = ib.get("id")
+                if ib_id is None or not wanted:
+                    continue
+                detail = await self._get_inbound_detail(client, int(ib_id))
+                try:
+                    settings = detail.get("settings") or {}
+                    if isinstance(settings, str):
+                        settings = _json.loads(settings) or {}
+                    clients = settings.get("clients") or []
+                except Exception:
+                    continue
+                for c in clients:
+                    cid = c.get("id") or c.get("uuid") or c.get("password")
+                    cmail = c.get("email")
+                    matched = cid if cid in wanted else (cmail if cmail in wanted else None)
+                    if matched is None:
+                        continue
+                    cur_total = int(c.get("totalGB") or c.get("total") or 0)
+                    client_id = cid or matched
+                    client_settings = {
+                        "id": client_id,
+                        "flow": c.get("flow") or "",
+                        "email": cmail or matched,
+                        "limitIp": int(c.get("limitIp") or 0),
+                        "totalGB": int(cur_total + int(add_gb) * 1024 * 1024 * 1024),
+                        "expiryTime": int(c.get("expiryTime") or 0),
+                        "enable": c.get("enable", True),
+                        "reset": int(c.get("reset") or 0),
+                    }
+                    form_data = {
+                        "id": str(int(ib_id)),
+                        "settings": _json.dumps({"clients": [client_settings]}),
+                    }
+                    headers = dict(self._auth_headers())
+                    headers["Content-Type"] = "application/x-www-form-urlencoded; charset=UTF-8"
+                    for ep in (
+                        f"/panel/api/inbounds/updateClient/{client_id}",
+                        f"/api/inbounds/updateClient/{client_id}",
+                        f"/inbounds/updateClient/{client_id}",
+                        f"/updateClient/{client_id}",
+                    ):
+                        try:
+                            r = await client.post(f"{self._base()}{ep}", data=form_data, headers=headers)
+                            if r.status_code == 200:
+                                wanted.discard(cid)
+                                wanted.discard(cmail)
+                                wanted.discard(matched)
+                                break
+                        except Exception:
+                            continue
+        return sorted(wanted)
+
     async def get_usage(self, uuid: str) -> dict:
         identifier = uuid  # may be email(remark) or uuid
         async with httpx.AsyncClient(timeout=20, follow_redirects=True) as client:
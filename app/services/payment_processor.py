@@ -50,7 +50,8 @@ class PaymentProcessor:
         user: TelegramUser,
         amount: float,
         receipt_file_id: str,
-        description: Optional[str] = None
+        description: Optional[str] = None,
+        receipt_hash: Optional[str] = None
     ) -> Transaction:
         """Process wallet top-up transaction"""
         
@@ -58,7 +59,7 @@ class PaymentProcessor:
         fraud_score = 0.0
         if settings.enable_fraud_detection:
             fraud_score = await FraudDetectionService.calculate_fraud_score(
-                session, user.id, amount, receipt_file_id
+                session, user.id, amount, receipt_file_id, receipt_hash
             )
         
         # Create transaction
@@ -69,6 +70,7 @@ class PaymentProcessor:
             status="pending" if not settings.auto_approve_receipts else "approved",
             description=description or f"شارژ کیف پول - {amount:,.0f} تومان",
             receipt_image_file_id=receipt_file_id,
+            receipt_image_hash=receipt_hash,
             fraud_score=fraud_score,
             payment_gateway="card_to_card"
         )
@@ -89,7 +91,8 @@ class PaymentProcessor:
         session: AsyncSession,
         user: TelegramUser,
         purchase_intent: PurchaseIntent,
-        receipt_file_id: Optional[str] = None
+        receipt_file_id: Optional[str] = None,
+        receipt_hash: Optional[str] = None
     ) -> Transaction:
         """Process purchase payment transaction"""
         
@@ -99,7 +102,7 @@ class PaymentProcessor:
         fraud_score = 0.0
         if receipt_file_id and settings.enable_fraud_detection:
             fraud_score = await FraudDetectionService.calculate_fraud_score(
-                session, user.id, amount, receipt_file_id
+                session, user.id, amount, receipt_file_id, receipt_hash
             )
         
         # Create transaction
@@ -110,9 +113,11 @@ class PaymentProcessor:
             status="pending" if receipt_file_id and not settings.auto_approve_receipts else "approved",
             description=f"خرید سرویس - {amount:,.0f} تومان",
             receipt_image_file_id=receipt_file_id,
+            receipt_image_hash=receipt_hash,
             fraud_score=fraud_score,
             payment_gateway="card_to_card",
-            related_transaction_id=purchase_intent.id
+            related_transaction_id=purchase_intent.id,
+            plan_id=purchase_intent.plan_id
         )
         
         session.add(transaction)
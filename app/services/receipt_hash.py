@@ -0,0 +1,176 @@
+import asyncio
+import logging
+from collections import defaultdict
+from io import BytesIO
+from typing import Dict, List, Optional, Set, Tuple
+
+from PIL import Image
+from sqlalchemy import select, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from models.billing import Transaction
+
+
+logger = logging.getLogger(__name__)
+
+HASH_SIZE = 16
+HASH_BITS = HASH_SIZE * HASH_SIZE
+
+
+def dhash(data: bytes, size: int = HASH_SIZE) -> int:
+    """256-bit difference hash: brightness gradients of a 17x16 grayscale thumbnail.
+
+    Survives re-encoding, rescaling and small crops, which is what a receipt
+    screenshot goes through when it is saved and sent again. A 9x8 thumbnail
+    is too coarse for receipts: every screenshot of the same banking app
+    hashes within a few bits of the others, whatever the amount on it.
+    """
+    with Image.open(BytesIO(data)) as image:
+        pixels = list(image.convert("L").resize((size + 1, size), Image.LANCZOS).getdata())
+    value = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def to_hex(value: int) -> str:
+    return f"{value:0{HASH_BITS // 4}x}"
+
+
+def from_hex(value: str) -> int:
+    return int(value, 16)
+
+
+class ReceiptHashIndex:
+    """Multi-index hash table for Hamming-radius queries over receipt hashes.
+
+    The bits are cut into radius + 1 chunks, each with its own exact-match
+    table. Two hashes at most `radius` bits apart agree exactly on at least
+    one chunk, so a query only checks the few entries sharing a chunk value
+    instead of walking every stored hash. Each transaction's amount is kept
+    so a query can ask only for receipts of the same amount.
+    """
+
+    def __init__(self, radius: int):
+        self.radius = radius
+        chunks = radius + 1
+        width, extra = divmod(HASH_BITS, chunks)
+        self._chunks: List[Tuple[int, int]] = []  # (shift, mask)
+        shift = 0
+        for index in range(chunks):
+            bits = width + (1 if index < extra else 0)
+            self._chunks.append((shift, (1 << bits) - 1))
+            shift += bits
+        self._tables: List[Dict[int, Set[int]]] = [defaultdict(set) for _ in self._chunks]
+        self._ids: Dict[int, Set[int]] = defaultdict(set)  # hash -> transaction ids
+        self._amounts: Dict[int, float] = {}  # transaction id -> amount
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, value: int, transaction_id: int, amount: Optional[float] = None) -> None:
+        if value not in self._ids:
+            for table, (shift, mask) in zip(self._tables, self._chunks):
+                table[(value >> shift) & mask].add(value)
+        self._ids[value].add(transaction_id)
+        if amount is not None:
+            self._amounts[transaction_id] = amount
+
+    def search(
+        self, value: int, radius: Optional[int] = None, amount: Optional[float] = None
+    ) -> List[Tuple[int, int]]:
+        """(transaction id, distance) of stored hashes within `radius` bits, closest first
+
+        With `amount`, only transactions of that amount match.
+        """
+        radius = self.radius if radius is None else min(radius, self.radius)
+        candidates: Set[int] = set()
+        for table, (shift, mask) in zip(self._tables, self._chunks):
+            candidates.update(table.get((value >> shift) & mask, ()))
+        matches = []
+        for candidate in candidates:
+            distance = (candidate ^ value).bit_count()
+            if distance <= radius:
+                matches.extend(
+                    (transaction_id, distance) for transaction_id in self._ids[candidate]
+                    if amount is None or self._amounts.get(transaction_id) == amount
+                )
+        return sorted(matches, key=lambda match: (match[1], match[0]))
+
+
+class ReceiptHashService:
+    """Near-duplicate receipt detection by perceptual hash.
+
+    A receipt photo is downloaded once when the user sends it, hashed in a
+    worker thread, and the hash stored on the transaction. An in-memory
+    multi-index table over all stored hashes answers "has a similar image
+    been sent before" without a query per stored hash; it is loaded on
+    first use and extended with newer transactions (by id) before each
+    lookup. A reused receipt shows the amount it was paid for, so matches
+    are limited to transactions of the same amount.
+    """
+
+    _index: Optional[ReceiptHashIndex] = None
+    _last_id: int = 0
+    _lock: Optional[asyncio.Lock] = None
+
+    @staticmethod
+    async def hash_bytes(data: bytes) -> Optional[str]:
+        try:
+            return to_hex(await asyncio.to_thread(dhash, data))
+        except Exception as e:
+            logger.warning("Could not hash receipt image: %s", e)
+            return None
+
+    @staticmethod
+    async def hash_telegram_file(bot, file_id: str) -> Optional[str]:
+        """Download a Telegram photo and return its hash (None if disabled or it fails)"""
+        if not settings.receipt_hash_enabled:
+            return None
+        try:
+            data = (await bot.download(file_id)).getvalue()
+        except Exception as e:
+            logger.warning("Could not download receipt %s: %s", file_id, e)
+            return None
+        return await ReceiptHashService.hash_bytes(data)
+
+    @staticmethod
+    async def _refresh(session: AsyncSession, chunk_size: int = 20000) -> ReceiptHashIndex:
+        cls = ReceiptHashService
+        if cls._lock is None:
+            cls._lock = asyncio.Lock()
+        async with cls._lock:
+            if cls._index is None or cls._index.radius != settings.receipt_hash_max_distance:
+                cls._index = ReceiptHashIndex(settings.receipt_hash_max_distance)
+                cls._last_id = 0
+            result = await session.stream(
+                select(Transaction.id, Transaction.receipt_image_hash, Transaction.amount)
+                .where(and_(Transaction.id > cls._last_id, Transaction.receipt_image_hash.isnot(None)))
+                .order_by(Transaction.id)
+                .execution_options(yield_per=chunk_size)
+            )
+            async for partition in result.partitions():
+                for transaction_id, value, amount in partition:
+                    cls._index.add(from_hex(value), transaction_id, float(amount or 0))
+                cls._last_id = partition[-1][0]
+            return cls._index
+
+    @staticmethod
+    async def find_similar(
+        session: AsyncSession,
+        receipt_hash: str,
+        amount: float,
+        exclude_id: Optional[int] = None,
+        max_distance: Optional[int] = None
+    ) -> List[Tuple[int, int]]:
+        """(transaction id, Hamming distance) of earlier receipts for `amount` that look the same"""
+        index = await ReceiptHashService._refresh(session)
+        return [
+            (transaction_id, distance)
+            for transaction_id, distance in index.search(from_hex(receipt_hash), max_distance, float(amount or 0))
+            if transaction_id != exclude_id
+        ]
+
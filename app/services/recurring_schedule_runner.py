@@ -0,0 +1,143 @@
+import asyncio
+import heapq
+import logging
+from datetime import datetime
+from typing import List, Tuple
+
+from sqlalchemy import select, and_, event
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.db import get_db_session
+from models.scheduled_messages import MessageSchedule
+from services.scheduled_message_service import ScheduledMessageService
+from services.versioned_cache import VersionedCache
+
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "message_schedules_version"
+
+
+class RecurringScheduleRunner:
+    """Executes recurring MessageSchedules on time without polling the table.
+
+    Active schedules sit in a heap ordered by next_execution_at and a single
+    timer sleeps until the earliest one is due. The heap is refilled from the
+    (is_active, next_execution_at) index whenever the `message_schedules_version`
+    bot setting changes: schedule edits bump it, the editing process refills
+    as soon as the edit commits and other processes notice within
+    `recurring_schedule_check_seconds`. A full refill every `refresh_interval`
+    (10 minutes by default) catches anything the stamp missed, such as a
+    schedule row changed directly in the database.
+    """
+
+    def __init__(self, refresh_interval: float = 600.0, refill_limit: int = 1000):
+        self.refresh_interval = refresh_interval
+        self.refill_limit = refill_limit
+        self._heap: List[Tuple[datetime, int]] = []
+        self._truncated = False
+        self._changed = asyncio.Event()
+        self._stop_event = asyncio.Event()
+        self._schedules = VersionedCache(VERSION_KEY, "message schedule set", "recurring_schedule_check_seconds", self._load)
+        self._loaded = None
+
+    def notify_changed(self) -> None:
+        self._schedules.invalidate()
+        self._changed.set()
+
+    async def bump_version(self, session: AsyncSession) -> None:
+        """Call in the session that edits schedules; every runner refills once it commits"""
+        await self._schedules.bump(session)
+        event.listen(session.sync_session, "after_commit", lambda _session: self.notify_changed(), once=True)
+
+    async def _load(self, session: AsyncSession) -> List[Tuple[datetime, int]]:
+        rows = (await session.execute(
+            select(MessageSchedule.next_execution_at, MessageSchedule.id)
+            .where(
+                and_(
+                    MessageSchedule.is_active == True,
+                    MessageSchedule.next_execution_at.isnot(None)
+                )
+            )
+            .order_by(MessageSchedule.next_execution_at)
+            .limit(self.refill_limit)
+        )).all()
+        return [(row.next_execution_at, row.id) for row in rows]
+
+    async def refill(self, force: bool = False) -> None:
+        """Reload the earliest upcoming fires of active schedules if they changed (always when forced)"""
+
+        if force:
+            self._schedules.invalidate()
+        async with get_db_session() as session:
+            rows = await self._schedules.get(session)
+        if rows is self._loaded:
+            return
+
+        self._loaded = rows
+        self._heap = list(rows)
+        heapq.heapify(self._heap)
+        self._truncated = len(rows) >= self.refill_limit
+
+    async def _fire(self, schedule_id: int, due_at: datetime) -> None:
+        async with get_db_session() as session:
+            schedule = (await session.execute(
+                select(MessageSchedule).where(MessageSchedule.id == schedule_id)
+            )).scalar_one_or_none()
+
+            # Deactivated or already advanced by someone else since the refill
+            if not schedule or not schedule.is_active or schedule.next_execution_at != due_at:
+                if schedule and schedule.is_active and schedule.next_execution_at:
+                    heapq.heappush(self._heap, (schedule.next_execution_at, schedule.id))
+                return
+
+            next_execution = await ScheduledMessageService.execute_recurring_schedule(session, schedule)
+
+        if next_execution:
+            heapq.heappush(self._heap, (next_execution, schedule_id))
+
+    async def _wait(self, timeout: float) -> None:
+        waiters = [asyncio.ensure_future(self._changed.wait()), asyncio.ensure_future(self._stop_event.wait())]
+        try:
+            await asyncio.wait(waiters, timeout=max(0.0, timeout), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+
+    async def run(self) -> None:
+        self._stop_event.clear()
+        loop = asyncio.get_running_loop()
+        next_refresh = 0.0
+
+        while not self._stop_event.is_set():
+            try:
+                self._changed.clear()
+                if loop.time() >= next_refresh or (not self._heap and self._truncated):
+                    await self.refill(force=True)
+                    next_refresh = loop.time() + self.refresh_interval
+                else:
+                    await self.refill()
+
+                now = datetime.utcnow()
+                while self._heap and self._heap[0][0] <= now:
+                    due_at, schedule_id = heapq.heappop(self._heap)
+                    try:
+                        await self._fire(schedule_id, due_at)
+                    except Exception:
+                        logger.exception("Recurring schedule %s failed", schedule_id)
+
+                timeout = min(next_refresh - loop.time(), settings.recurring_schedule_check_seconds)
+                if self._heap:
+                    timeout = min(timeout, (self._heap[0][0] - datetime.utcnow()).total_seconds())
+            except Exception:
+                logger.exception("Recurring schedule runner error")
+                timeout = 30.0
+
+            await self._wait(timeout)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+
+recurring_schedule_runner = RecurringScheduleRunner()
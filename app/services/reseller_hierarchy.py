@@ -0,0 +1,260 @@
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, insert, delete, func, and_, literal, true
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from core.db import get_db_session
+from models.advanced_reseller import AdvancedReseller, ResellerClosure
+from models.user import TelegramUser
+
+
+logger = logging.getLogger(__name__)
+
+# Guards the recursive queries against a parent_reseller_id cycle
+MAX_DEPTH = 64
+
+
+class ResellerHierarchyService:
+    """The reseller tree as a closure table, with a recursive CTE fallback.
+
+    ResellerClosure holds one row per (ancestor, descendant) pair, so a
+    subtree or an ancestor chain is one indexed query however deep or wide
+    the network is. Rows are written with set-based INSERT ... SELECTs when
+    a reseller is created or moved; the nightly reconcile rebuilds the
+    table from parent_reseller_id. A reseller missing from the table (not
+    reconciled yet, or changed outside the service) is answered with a
+    recursive CTE over parent_reseller_id instead.
+    """
+
+    @staticmethod
+    async def add(session: AsyncSession, reseller_id: int, parent_id: Optional[int]) -> None:
+        """Link a new (flushed) reseller under its parent"""
+        if parent_id and not (await session.execute(
+            select(ResellerClosure.id).where(ResellerClosure.descendant_id == parent_id).limit(1)
+        )).first():
+            # Parent not in the table yet: leave both to the CTE fallback until the reconcile
+            return
+        rows = select(literal(reseller_id), literal(reseller_id), literal(0))
+        if parent_id:
+            rows = rows.union_all(
+                select(ResellerClosure.ancestor_id, literal(reseller_id), ResellerClosure.depth + 1)
+                .where(ResellerClosure.descendant_id == parent_id)
+            )
+        await session.execute(
+            insert(ResellerClosure).from_select(["ancestor_id", "descendant_id", "depth"], rows)
+        )
+
+    @staticmethod
+    async def move(session: AsyncSession, reseller_id: int, new_parent_id: Optional[int]) -> None:
+        """Re-link a reseller and its whole subtree under a new parent (None: make it a root)"""
+        subtree = (await session.execute(
+            select(ResellerClosure.descendant_id).where(ResellerClosure.ancestor_id == reseller_id)
+        )).scalars().all()
+        if not subtree:
+            # Not in the table yet: take the subtree from parent_reseller_id
+            await ResellerHierarchyService._link_untracked(session, reseller_id, new_parent_id)
+            return
+        if new_parent_id in subtree:
+            raise ValueError("Cannot move a reseller under its own sub-reseller")
+
+        # Drop the links from the old ancestors into the subtree
+        await session.execute(
+            delete(ResellerClosure)
+            .where(and_(
+                ResellerClosure.descendant_id.in_(subtree),
+                ResellerClosure.ancestor_id.notin_(subtree)
+            ))
+            .execution_options(synchronize_session=False)
+        )
+        if new_parent_id:
+            above = aliased(ResellerClosure)
+            below = aliased(ResellerClosure)
+            await session.execute(
+                insert(ResellerClosure).from_select(
+                    ["ancestor_id", "descendant_id", "depth"],
+                    select(above.ancestor_id, below.descendant_id, above.depth + below.depth + 1)
+                    .select_from(above)
+                    .join(below, true())
+                    .where(and_(above.descendant_id == new_parent_id, below.ancestor_id == reseller_id))
+                )
+            )
+
+    @staticmethod
+    async def _link_untracked(session: AsyncSession, reseller_id: int, new_parent_id: Optional[int]) -> None:
+        """Write the closure rows of a reseller missing from the table, under its new parent
+
+        The subtree comes from the recursive CTE. When the new parent is
+        itself untracked, everything is left to the CTE fallback as in `add`.
+        """
+        tree = ResellerHierarchyService._subtree_cte(reseller_id)
+        members = (await session.execute(select(tree.c.descendant_id, tree.c.depth))).all()
+        if new_parent_id and any(member_id == new_parent_id for member_id, _depth in members):
+            raise ValueError("Cannot move a reseller under its own sub-reseller")
+        if new_parent_id and not (await session.execute(
+            select(ResellerClosure.id).where(ResellerClosure.descendant_id == new_parent_id).limit(1)
+        )).first():
+            return
+
+        member_ids = list({member_id for member_id, _depth in members})
+        # Drop partial rows left by an earlier write, then link the subtree internally ...
+        await session.execute(
+            delete(ResellerClosure)
+            .where(ResellerClosure.descendant_id.in_(member_ids))
+            .execution_options(synchronize_session=False)
+        )
+        await session.execute(
+            insert(ResellerClosure).from_select(
+                ["ancestor_id", "descendant_id", "depth"],
+                ResellerHierarchyService._pairs(ResellerHierarchyService._tree_cte(member_ids))
+            )
+        )
+        # ... and under every ancestor of the new parent
+        if new_parent_id:
+            above = aliased(ResellerClosure)
+            tree = ResellerHierarchyService._subtree_cte(reseller_id)
+            await session.execute(
+                insert(ResellerClosure).from_select(
+                    ["ancestor_id", "descendant_id", "depth"],
+                    select(above.ancestor_id, tree.c.descendant_id, func.min(above.depth + tree.c.depth + 1))
+                    .select_from(above)
+                    .join(tree, true())
+                    .where(above.descendant_id == new_parent_id)
+                    .group_by(above.ancestor_id, tree.c.descendant_id)
+                )
+            )
+
+    @staticmethod
+    def _pairs(tree):
+        """One row per (ancestor, descendant) of a tree CTE; a parent cycle repeats pairs at growing depths"""
+        return (
+            select(tree.c.ancestor_id, tree.c.descendant_id, func.min(tree.c.depth))
+            .group_by(tree.c.ancestor_id, tree.c.descendant_id)
+        )
+
+    @staticmethod
+    def _tree_cte(root_ids: Optional[List[int]] = None):
+        """(ancestor_id, descendant_id, depth) for every reseller (or those in `root_ids`), from parent_reseller_id"""
+        anchor = select(
+            AdvancedReseller.id.label("ancestor_id"),
+            AdvancedReseller.id.label("descendant_id"),
+            literal(0).label("depth"),
+        )
+        if root_ids is not None:
+            anchor = anchor.where(AdvancedReseller.id.in_(root_ids))
+        tree = anchor.cte("reseller_tree", recursive=True)
+        child = aliased(AdvancedReseller)
+        return tree.union_all(
+            select(tree.c.ancestor_id, child.id, tree.c.depth + 1)
+            .join(child, child.parent_reseller_id == tree.c.descendant_id)
+            .where(tree.c.depth < MAX_DEPTH)
+        )
+
+    @staticmethod
+    def _subtree_cte(reseller_id: int):
+        tree = (
+            select(AdvancedReseller.id.label("descendant_id"), literal(0).label("depth"))
+            .where(AdvancedReseller.id == reseller_id)
+            .cte("reseller_subtree", recursive=True)
+        )
+        child = aliased(AdvancedReseller)
+        return tree.union_all(
+            select(child.id, tree.c.depth + 1)
+            .join(child, child.parent_reseller_id == tree.c.descendant_id)
+            .where(tree.c.depth < MAX_DEPTH)
+        )
+
+    @staticmethod
+    def _ancestors_cte(reseller_id: int):
+        chain = (
+            select(AdvancedReseller.id.label("ancestor_id"), AdvancedReseller.parent_reseller_id.label("parent_id"), literal(0).label("depth"))
+            .where(AdvancedReseller.id == reseller_id)
+            .cte("reseller_ancestors", recursive=True)
+        )
+        parent = aliased(AdvancedReseller)
+        return chain.union_all(
+            select(parent.id, parent.parent_reseller_id, chain.c.depth + 1)
+            .join(parent, parent.id == chain.c.parent_id)
+            .where(chain.c.depth < MAX_DEPTH)
+        )
+
+    @staticmethod
+    async def subtree(
+        session: AsyncSession,
+        reseller_id: int,
+        max_depth: Optional[int] = None
+    ) -> List[Tuple[AdvancedReseller, TelegramUser, int]]:
+        """(reseller, user, depth) of a reseller and everyone below it, shallowest first"""
+
+        def query(source, descendant, depth):
+            q = (
+                select(AdvancedReseller, TelegramUser, depth)
+                .select_from(source)
+                .join(AdvancedReseller, AdvancedReseller.id == descendant)
+                .join(TelegramUser, TelegramUser.id == AdvancedReseller.user_id)
+                .order_by(depth, AdvancedReseller.id)
+            )
+            return q.where(depth <= max_depth) if max_depth is not None else q
+
+        rows = (await session.execute(
+            query(ResellerClosure, ResellerClosure.descendant_id, ResellerClosure.depth)
+            .where(ResellerClosure.ancestor_id == reseller_id)
+        )).all()
+        if not rows:
+            tree = ResellerHierarchyService._subtree_cte(reseller_id)
+            rows = (await session.execute(query(tree, tree.c.descendant_id, tree.c.depth))).all()
+        return [(reseller, user, depth) for reseller, user, depth in rows]
+
+    @staticmethod
+    async def ancestors(
+        session: AsyncSession,
+        reseller_id: int,
+        max_depth: Optional[int] = None
+    ) -> List[AdvancedReseller]:
+        """The reseller, its parent, grandparent, ... (up to `max_depth` levels up)"""
+
+        def query(source, ancestor, depth):
+            q = (
+                select(AdvancedReseller)
+                .select_from(source)
+                .join(AdvancedReseller, AdvancedReseller.id == ancestor)
+                .order_by(depth)
+            )
+            return q.where(depth <= max_depth) if max_depth is not None else q
+
+        rows = (await session.execute(
+            query(ResellerClosure, ResellerClosure.ancestor_id, ResellerClosure.depth)
+            .where(ResellerClosure.descendant_id == reseller_id)
+        )).scalars().all()
+        # A chain that stops short of a root is missing links; the CTE is authoritative then
+        complete = rows and (rows[-1].parent_reseller_id is None or (max_depth is not None and len(rows) > max_depth))
+        if not complete:
+            chain = ResellerHierarchyService._ancestors_cte(reseller_id)
+            rows = (await session.execute(query(chain, chain.c.ancestor_id, chain.c.depth))).scalars().all()
+        return list(rows)
+
+    @staticmethod
+    async def rebuild() -> Dict[str, int]:
+        """Recompute the whole closure table from parent_reseller_id (nightly reconcile)"""
+        async with get_db_session() as session:
+            # A reseller that is its own descendant sits on a parent_reseller_id cycle
+            tree = ResellerHierarchyService._tree_cte()
+            cyclic = (await session.execute(
+                select(tree.c.ancestor_id)
+                .where(and_(tree.c.ancestor_id == tree.c.descendant_id, tree.c.depth > 0))
+                .distinct()
+            )).scalars().all()
+            if cyclic:
+                logger.warning("parent_reseller_id contains a cycle through resellers %s", sorted(cyclic))
+
+            await session.execute(delete(ResellerClosure).execution_options(synchronize_session=False))
+            await session.execute(
+                insert(ResellerClosure).from_select(
+                    ["ancestor_id", "descendant_id", "depth"],
+                    ResellerHierarchyService._pairs(ResellerHierarchyService._tree_cte())
+                )
+            )
+            rows = (await session.execute(select(func.count(ResellerClosure.id)))).scalar() or 0
+            deepest = (await session.execute(select(func.max(ResellerClosure.depth)))).scalar() or 0
+        return {"pairs": rows, "max_depth": deepest, "cyclic": len(cyclic)}
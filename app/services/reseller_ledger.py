@@ -0,0 +1,186 @@
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import select, update, func, case, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.db import get_db_session
+from models.advanced_reseller import AdvancedReseller, ResellerActivity, ResellerCommission, ResellerPayment, ResellerSettlement
+from services.activity_log import activity_log
+
+
+logger = logging.getLogger(__name__)
+
+
+class ResellerLedgerService:
+    """Reseller commissions as an append-only ledger, settled into the reseller totals in batches.
+
+    A purchase only inserts ResellerCommission rows, so concurrent purchases
+    under the same top resellers never wait on each other's row locks. The
+    settlement job claims the unsettled rows (oldest first, at most
+    `reseller_settlement_batch_size` per transaction) into a
+    ResellerSettlement and adds their sums to every reseller involved with
+    one set-based UPDATE. Payments take a reseller's settled, pending rows
+    the same way, so `pending_commission` always equals what they sum to.
+    """
+
+    @staticmethod
+    async def settle_batch(session: AsyncSession, batch_size: int) -> Dict[str, Any]:
+        """Settle up to `batch_size` of the oldest unsettled commissions; empty dict when none are left"""
+        oldest = (
+            select(ResellerCommission.id)
+            .where(ResellerCommission.settlement_id.is_(None))
+            .order_by(ResellerCommission.id)
+            .limit(batch_size)
+            .subquery()
+        )
+        last_id = (await session.execute(select(func.max(oldest.c.id)))).scalar()
+        if last_id is None:
+            return {}
+
+        settlement = ResellerSettlement()
+        session.add(settlement)
+        await session.flush()
+        # Claim first: a concurrent run blocks on these rows and then skips them
+        claimed = await session.execute(
+            update(ResellerCommission)
+            .where(and_(ResellerCommission.settlement_id.is_(None), ResellerCommission.id <= last_id))
+            .values(settlement_id=settlement.id)
+            .execution_options(synchronize_session=False)
+        )
+        if not claimed.rowcount:
+            await session.delete(settlement)
+            return {}
+
+        in_batch = ResellerCommission.settlement_id == settlement.id
+        sums = (
+            select(
+                ResellerCommission.reseller_id.label("reseller_id"),
+                func.count(ResellerCommission.id).label("commissions"),
+                func.sum(ResellerCommission.base_amount).label("sales"),
+                func.sum(ResellerCommission.commission_amount).label("commission"),
+                func.sum(case((ResellerCommission.status == "pending", ResellerCommission.commission_amount), else_=0)).label("pending"),
+                func.max(ResellerCommission.created_at).label("last_at"),
+            )
+            .where(in_batch)
+            .group_by(ResellerCommission.reseller_id)
+            .subquery()
+        )
+        await session.execute(
+            update(AdvancedReseller)
+            .where(AdvancedReseller.id == sums.c.reseller_id)
+            .values(
+                total_sales=AdvancedReseller.total_sales + sums.c.sales,
+                total_commission_earned=AdvancedReseller.total_commission_earned + sums.c.commission,
+                pending_commission=AdvancedReseller.pending_commission + sums.c.pending,
+                monthly_sales=AdvancedReseller.monthly_sales + sums.c.sales,
+                monthly_commission=AdvancedReseller.monthly_commission + sums.c.commission,
+                last_activity_at=case(
+                    (AdvancedReseller.last_activity_at > sums.c.last_at, AdvancedReseller.last_activity_at),
+                    else_=sums.c.last_at
+                ),
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+        per_reseller = (await session.execute(
+            select(sums.c.reseller_id, sums.c.commissions, sums.c.sales, sums.c.commission)
+        )).all()
+        for reseller_id, count, _sales, commission in per_reseller:
+            activity_log.emit(
+                ResellerActivity,
+                session=session,
+                reseller_id=reseller_id,
+                activity_type="commission_settled",
+                description=f"{count} commissions settled: {float(commission or 0):,.0f} IRR",
+                amount=commission
+            )
+
+        settlement.first_commission_id = (await session.execute(
+            select(func.min(ResellerCommission.id)).where(in_batch)
+        )).scalar()
+        settlement.last_commission_id = last_id
+        settlement.commissions = sum(count for _id, count, _sales, _commission in per_reseller)
+        settlement.resellers = len(per_reseller)
+        settlement.sales_amount = sum(float(sales or 0) for _id, _count, sales, _commission in per_reseller)
+        settlement.commission_amount = sum(float(commission or 0) for _id, _count, _sales, commission in per_reseller)
+        return {
+            "settlement_id": settlement.id,
+            "commissions": settlement.commissions,
+            "resellers": settlement.resellers,
+            "commission_amount": settlement.commission_amount,
+        }
+
+    @staticmethod
+    async def settle(batch_size: Optional[int] = None) -> Dict[str, Any]:
+        """Periodic job: settle every unsettled commission, one short transaction per batch"""
+        batch_size = batch_size or settings.reseller_settlement_batch_size
+        report = {"settlements": 0, "commissions": 0, "resellers": 0, "commission_amount": 0.0}
+        while True:
+            async with get_db_session() as session:
+                batch = await ResellerLedgerService.settle_batch(session, batch_size)
+            if not batch:
+                break
+            report["settlements"] += 1
+            report["commissions"] += batch["commissions"]
+            report["resellers"] += batch["resellers"]
+            report["commission_amount"] += batch["commission_amount"]
+            if batch["commissions"] < batch_size:
+                break
+        if report["commissions"]:
+            logger.info("Settled %d reseller commissions in %d batches", report["commissions"], report["settlements"])
+        return report
+
+    @staticmethod
+    async def pay_batch(session: AsyncSession, payment: ResellerPayment) -> Dict[str, Any]:
+        """Attach the reseller's settled, pending commissions to a flushed payment and mark them paid
+
+        Returns the count, amount and period of the batch (count 0 when there
+        was nothing to pay) and moves the amount from `pending_commission` to
+        `total_paid`.
+        """
+        now = datetime.utcnow()
+        claimed = await session.execute(
+            update(ResellerCommission)
+            .where(and_(
+                ResellerCommission.reseller_id == payment.reseller_id,
+                ResellerCommission.status == "pending",
+                ResellerCommission.settlement_id.isnot(None),
+                ResellerCommission.payment_id.is_(None),
+            ))
+            .values(status="paid", paid_at=now, payment_id=payment.id)
+            .execution_options(synchronize_session=False)
+        )
+        if not claimed.rowcount:
+            return {"commissions": 0, "amount": 0.0}
+
+        in_batch = ResellerCommission.payment_id == payment.id
+        count, amount, period_start, period_end = (await session.execute(
+            select(
+                func.count(ResellerCommission.id),
+                func.sum(ResellerCommission.commission_amount),
+                func.min(ResellerCommission.created_at),
+                func.max(ResellerCommission.created_at),
+            ).where(in_batch)
+        )).one()
+        amount = amount or 0
+        await session.execute(
+            update(AdvancedReseller)
+            .where(AdvancedReseller.id == payment.reseller_id)
+            .values(
+                total_paid=AdvancedReseller.total_paid + amount,
+                pending_commission=AdvancedReseller.pending_commission - amount,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        return {
+            "commissions": count,
+            "amount": amount,
+            "period_start": period_start,
+            "period_end": period_end,
+            "commission_ids": (await session.execute(
+                select(ResellerCommission.id).where(in_batch).order_by(ResellerCommission.id)
+            )).scalars().all(),
+        }
@@ -0,0 +1,368 @@
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, delete, insert, func, and_, event, inspect
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.orm import Session
+
+from models.analytics import DailyStats, RevenueRollup, UserRevenueRollup
+from models.billing import Transaction
+from models.catalog import Plan
+from models.orders import PurchaseIntent
+from models.service import Service
+from models.user import TelegramUser
+
+
+logger = logging.getLogger(__name__)
+
+# Transaction columns that place it in a rollup bucket
+_TRACKED = ("created_at", "status", "payment_gateway", "type", "plan_id", "user_id", "amount")
+
+_STATS_FIELDS = (
+    "new_users", "new_services", "total_transactions",
+    "successful_transactions", "total_revenue", "wallet_topups",
+)
+
+
+def _to_date(value: Any) -> date:
+    if value is None:
+        return datetime.utcnow().date()
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])  # sqlite returns DATE() as text
+
+
+def _amount(value: Any) -> Decimal:
+    return Decimal(str(value or 0))
+
+
+@dataclass
+class RollupDelta:
+    """Pending increments for the rollup tables, keyed like their unique constraints"""
+    revenue: Dict[Tuple, List] = field(default_factory=lambda: defaultdict(lambda: [0, Decimal(0), None, None]))
+    users: Dict[Tuple[date, int], List] = field(default_factory=lambda: defaultdict(lambda: [0, Decimal(0)]))
+    stats: Dict[date, Dict[str, Any]] = field(default_factory=lambda: defaultdict(lambda: defaultdict(int)))
+
+    def add_transaction(self, snapshot: Dict[str, Any], sign: int) -> None:
+        day = _to_date(snapshot["created_at"])
+        status = snapshot["status"] or "pending"
+        amount = _amount(snapshot["amount"])
+        key = (day, status, snapshot["payment_gateway"] or "card_to_card", snapshot["type"] or "", snapshot["plan_id"] or 0)
+
+        bucket = self.revenue[key]
+        bucket[0] += sign
+        bucket[1] += sign * amount
+        if sign > 0:
+            bucket[2] = amount if bucket[2] is None else min(bucket[2], amount)
+            bucket[3] = amount if bucket[3] is None else max(bucket[3], amount)
+
+        stats = self.stats[day]
+        stats["total_transactions"] += sign
+        if status == "approved":
+            user_bucket = self.users[(day, snapshot["user_id"])]
+            user_bucket[0] += sign
+            user_bucket[1] += sign * amount
+            stats["successful_transactions"] += sign
+            stats["total_revenue"] += sign * amount
+            if snapshot["type"] == "wallet_topup":
+                stats["wallet_topups"] += sign * amount
+
+    def __bool__(self) -> bool:
+        return bool(self.revenue or self.users or self.stats)
+
+
+def _snapshot(obj: Transaction, previous: bool = False) -> Dict[str, Any]:
+    state = inspect(obj)
+    snapshot = {}
+    for name in _TRACKED:
+        history = state.attrs[name].history
+        if previous and history.deleted:
+            snapshot[name] = history.deleted[0]
+        else:
+            snapshot[name] = getattr(obj, name)
+    return snapshot
+
+
+def _upsert(
+    session: Session,
+    model,
+    rows: List[Dict[str, Any]],
+    key_columns: Iterable[str],
+    add_columns: Iterable[str],
+    least_columns: Iterable[str] = (),
+    greatest_columns: Iterable[str] = (),
+) -> None:
+    """Insert rows or add their counters onto the existing ones in a single statement"""
+
+    if not rows:
+        return
+    is_mysql = session.get_bind().dialect.name == "mysql"
+    stmt = mysql.insert(model) if is_mysql else sqlite.insert(model)
+    incoming = stmt.inserted if is_mysql else stmt.excluded
+    least, greatest = (func.least, func.greatest) if is_mysql else (func.min, func.max)
+
+    values = {"updated_at": func.now()}
+    for name in add_columns:
+        values[name] = getattr(model, name) + incoming[name]
+    for name in least_columns:
+        current = getattr(model, name)
+        values[name] = least(func.coalesce(current, incoming[name]), func.coalesce(incoming[name], current))
+    for name in greatest_columns:
+        current = getattr(model, name)
+        values[name] = greatest(func.coalesce(current, incoming[name]), func.coalesce(incoming[name], current))
+
+    if is_mysql:
+        stmt = stmt.on_duplicate_key_update(**values)
+    else:
+        stmt = stmt.on_conflict_do_update(index_elements=list(key_columns), set_=values)
+    session.execute(stmt, rows)
+
+
+class RevenueRollupService:
+    """Daily revenue rollups read by the financial reports.
+
+    Every flush that inserts, deletes or re-buckets a Transaction (status,
+    amount, gateway, plan...) adds the difference to the rollup rows of the
+    transaction's creation day in the same DB transaction, so reports never
+    scan `transaction`. `rebuild` recomputes a range from scratch for backfills
+    and the nightly reconciliation of changes made outside the ORM.
+
+    Some fields are reconcile-only. A flush can only widen
+    `min_amount`/`max_amount`: when a transaction leaves a bucket, its
+    amount stays as the bound until the day is rebuilt. DailyStats
+    `total_users`, `total_services` and `active_users` are written only by
+    `rebuild`; flushes leave them at their last rebuilt value (0 for days
+    not rebuilt yet).
+    """
+
+    @staticmethod
+    def _plan_dimensions(session: Session, plan_ids: Iterable[int]) -> Dict[int, Tuple[int, int]]:
+        plan_ids = [plan_id for plan_id in set(plan_ids) if plan_id]
+        if not plan_ids:
+            return {}
+        rows = session.execute(
+            select(Plan.id, Plan.server_id, Plan.category_id).where(Plan.id.in_(plan_ids))
+        ).all()
+        return {row.id: (row.server_id or 0, row.category_id or 0) for row in rows}
+
+    @staticmethod
+    def collect(session: Session) -> RollupDelta:
+        """Rollup increments implied by the objects pending in this flush"""
+
+        delta = RollupDelta()
+        today = datetime.utcnow().date()
+
+        for obj in session.new:
+            if isinstance(obj, Transaction):
+                delta.add_transaction(_snapshot(obj), +1)
+            elif isinstance(obj, TelegramUser):
+                delta.stats[today]["new_users"] += 1
+            elif isinstance(obj, Service):
+                delta.stats[_to_date(obj.purchased_at)]["new_services"] += 1
+
+        for obj in session.dirty:
+            if not isinstance(obj, Transaction):
+                continue
+            state = inspect(obj)
+            if not any(state.attrs[name].history.deleted for name in _TRACKED):
+                continue
+            delta.add_transaction(_snapshot(obj, previous=True), -1)
+            delta.add_transaction(_snapshot(obj), +1)
+
+        for obj in session.deleted:
+            if isinstance(obj, Transaction):
+                delta.add_transaction(_snapshot(obj, previous=True), -1)
+
+        return delta
+
+    @staticmethod
+    def apply(session: Session, delta: RollupDelta) -> None:
+        dimensions = RevenueRollupService._plan_dimensions(session, (key[4] for key in delta.revenue))
+
+        revenue_rows = []
+        for (day, status, gateway, tx_type, plan_id), (count, amount, low, high) in delta.revenue.items():
+            if not count and not amount:
+                continue  # moved out and back within the same flush
+            server_id, category_id = dimensions.get(plan_id, (0, 0))
+            revenue_rows.append({
+                "date": day, "status": status, "payment_gateway": gateway, "transaction_type": tx_type,
+                "plan_id": plan_id, "server_id": server_id, "category_id": category_id,
+                "transaction_count": count, "total_amount": amount, "min_amount": low, "max_amount": high,
+            })
+        _upsert(
+            session, RevenueRollup, revenue_rows,
+            key_columns=("date", "status", "payment_gateway", "transaction_type", "plan_id"),
+            add_columns=("transaction_count", "total_amount"),
+            least_columns=("min_amount",), greatest_columns=("max_amount",),
+        )
+
+        user_rows = [
+            {"date": day, "user_id": user_id, "transaction_count": count, "total_amount": amount}
+            for (day, user_id), (count, amount) in delta.users.items() if count or amount
+        ]
+        _upsert(
+            session, UserRevenueRollup, user_rows,
+            key_columns=("date", "user_id"), add_columns=("transaction_count", "total_amount"),
+        )
+
+        stats_rows = []
+        for day, counters in delta.stats.items():
+            row = {name: counters.get(name, 0) for name in _STATS_FIELDS}
+            if any(row.values()):
+                row["date"] = datetime.combine(day, datetime.min.time())
+                stats_rows.append(row)
+        _upsert(session, DailyStats, stats_rows, key_columns=("date",), add_columns=_STATS_FIELDS)
+
+    @staticmethod
+    def before_flush(session: Session, flush_context, instances) -> None:
+        delta = RevenueRollupService.collect(session)
+        if delta:
+            RevenueRollupService.apply(session, delta)
+
+    @staticmethod
+    async def rebuild(session, start: date, end: date) -> Dict[str, int]:
+        """Recompute the rollups of days start..end (inclusive) from the source tables"""
+
+        start_at = datetime.combine(start, datetime.min.time())
+        end_at = datetime.combine(end + timedelta(days=1), datetime.min.time())
+
+        # Delete first so concurrent flushes on these days queue behind this transaction
+        await session.execute(delete(RevenueRollup).where(and_(RevenueRollup.date >= start, RevenueRollup.date <= end)))
+        await session.execute(delete(UserRevenueRollup).where(and_(UserRevenueRollup.date >= start, UserRevenueRollup.date <= end)))
+        await session.execute(delete(DailyStats).where(and_(DailyStats.date >= start_at, DailyStats.date < end_at)))
+
+        in_range = and_(Transaction.created_at >= start_at, Transaction.created_at < end_at)
+        day = func.date(Transaction.created_at)
+        status = func.coalesce(Transaction.status, "pending")
+        gateway = func.coalesce(Transaction.payment_gateway, "card_to_card")
+        tx_type = func.coalesce(Transaction.type, "")
+        # Older purchase receipts only link to their plan through the purchase intent
+        plan_id = func.coalesce(Transaction.plan_id, PurchaseIntent.plan_id, 0)
+
+        revenue = (await session.execute(
+            select(
+                day, status, gateway, tx_type, plan_id,
+                func.count(Transaction.id), func.sum(Transaction.amount),
+                func.min(Transaction.amount), func.max(Transaction.amount),
+            )
+            .outerjoin(PurchaseIntent, PurchaseIntent.receipt_transaction_id == Transaction.id)
+            .where(in_range)
+            .group_by(day, status, gateway, tx_type, plan_id)
+        )).all()
+
+        plan_rows = (await session.execute(select(Plan.id, Plan.server_id, Plan.category_id))).all()
+        dimensions = {row.id: (row.server_id or 0, row.category_id or 0) for row in plan_rows}
+
+        stats: Dict[date, Dict[str, Any]] = defaultdict(lambda: defaultdict(int))
+        revenue_rows = []
+        for tx_day, tx_status, tx_gateway, kind, plan, count, amount, low, high in revenue:
+            tx_day = _to_date(tx_day)
+            server_id, category_id = dimensions.get(plan, (0, 0))
+            revenue_rows.append({
+                "date": tx_day, "status": tx_status, "payment_gateway": tx_gateway, "transaction_type": kind,
+                "plan_id": plan, "server_id": server_id, "category_id": category_id,
+                "transaction_count": count, "total_amount": amount or 0, "min_amount": low, "max_amount": high,
+            })
+            stats[tx_day]["total_transactions"] += count
+            if tx_status == "approved":
+                stats[tx_day]["successful_transactions"] += count
+                stats[tx_day]["total_revenue"] += _amount(amount)
+                if kind == "wallet_topup":
+                    stats[tx_day]["wallet_topups"] += _amount(amount)
+        if revenue_rows:
+            await session.execute(insert(RevenueRollup), revenue_rows)
+
+        users = (await session.execute(
+            select(day, Transaction.user_id, func.count(Transaction.id), func.sum(Transaction.amount))
+            .where(and_(in_range, Transaction.status == "approved"))
+            .group_by(day, Transaction.user_id)
+        )).all()
+        if users:
+            await session.execute(insert(UserRevenueRollup), [
+                {"date": _to_date(tx_day), "user_id": user_id, "transaction_count": count, "total_amount": amount or 0}
+                for tx_day, user_id, count, amount in users
+            ])
+
+        user_day = func.date(TelegramUser.created_at)
+        for created_day, count in (await session.execute(
+            select(user_day, func.count(TelegramUser.id))
+            .where(and_(TelegramUser.created_at >= start_at, TelegramUser.created_at < end_at))
+            .group_by(user_day)
+        )).all():
+            stats[_to_date(created_day)]["new_users"] = count
+
+        service_day = func.date(Service.purchased_at)
+        for purchased_day, count in (await session.execute(
+            select(service_day, func.count(Service.id))
+            .where(and_(Service.purchased_at >= start_at, Service.purchased_at < end_at))
+            .group_by(service_day)
+        )).all():
+            stats[_to_date(purchased_day)]["new_services"] = count
+
+        seen_day = func.date(TelegramUser.last_seen_at)
+        for seen, count in (await session.execute(
+            select(seen_day, func.count(TelegramUser.id))
+            .where(and_(TelegramUser.last_seen_at >= start_at, TelegramUser.last_seen_at < end_at))
+            .group_by(seen_day)
+        )).all():
+            stats[_to_date(seen)]["active_users"] = count
+
+        # Running totals as of the end of each day
+        total_users = (await session.execute(
+            select(func.count(TelegramUser.id)).where(TelegramUser.created_at < start_at)
+        )).scalar() or 0
+        total_services = (await session.execute(
+            select(func.count(Service.id)).where(Service.purchased_at < start_at)
+        )).scalar() or 0
+
+        stats_rows = []
+        current = start
+        while current <= end:
+            counters = stats.get(current, {})
+            total_users += counters.get("new_users", 0)
+            total_services += counters.get("new_services", 0)
+            row = {name: counters.get(name, 0) for name in _STATS_FIELDS}
+            row.update(
+                date=datetime.combine(current, datetime.min.time()),
+                total_users=total_users,
+                total_services=total_services,
+                active_users=counters.get("active_users", 0),
+            )
+            stats_rows.append(row)
+            current += timedelta(days=1)
+        await session.execute(insert(DailyStats), stats_rows)
+
+        return {"days": len(stats_rows), "revenue_rows": len(revenue_rows), "user_rows": len(users)}
+
+    @staticmethod
+    async def backfill(start: date, end: Optional[date] = None, days_per_batch: int = 7) -> Dict[str, int]:
+        """Rebuild a long range in short per-batch transactions"""
+
+        from core.db import get_db_session
+
+        end = end or datetime.utcnow().date()
+        totals: Dict[str, int] = defaultdict(int)
+        batch_start = start
+        while batch_start <= end:
+            batch_end = min(end, batch_start + timedelta(days=days_per_batch - 1))
+            async with get_db_session() as session:
+                result = await RevenueRollupService.rebuild(session, batch_start, batch_end)
+            for name, value in result.items():
+                totals[name] += value
+            logger.info("Rebuilt rollups %s..%s", batch_start, batch_end)
+            batch_start = batch_end + timedelta(days=1)
+        return dict(totals)
+
+    @staticmethod
+    async def reconcile_recent(days: int = 2) -> Dict[str, int]:
+        today = datetime.utcnow().date()
+        return await RevenueRollupService.backfill(today - timedelta(days=days - 1), today, days_per_batch=days)
+
+
+event.listen(Session, "before_flush", RevenueRollupService.before_flush)
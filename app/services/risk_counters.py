@@ -0,0 +1,192 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select, event, and_, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from models.billing import Transaction
+from services.revenue_rollup import _snapshot, _amount
+
+
+_EVENTS_KEY = "risk_counter_events"
+
+
+class RollingCounter:
+    """Count and amount over a sliding window, kept in a ring of time buckets.
+
+    Running totals are adjusted as buckets fall out of the window, so adding
+    and reading are O(1) amortised; precision is one bucket.
+    """
+
+    def __init__(self, window_seconds: int, buckets: int):
+        self.bucket_seconds = window_seconds / buckets
+        self.size = buckets
+        self.counts = [0] * buckets
+        self.amounts = [0.0] * buckets
+        self.count = 0
+        self.amount = 0.0
+        self._head: Optional[int] = None  # absolute index of the newest bucket
+
+    def _index(self, at: float) -> int:
+        return int(at // self.bucket_seconds)
+
+    def _advance(self, index: int) -> None:
+        if self._head is None:
+            self._head = index
+            return
+        if index <= self._head:
+            return
+        for expired in range(self._head + 1, min(index, self._head + self.size) + 1):
+            slot = expired % self.size
+            self.count -= self.counts[slot]
+            self.amount -= self.amounts[slot]
+            self.counts[slot] = 0
+            self.amounts[slot] = 0.0
+        self._head = index
+
+    def add(self, at: float, amount: float, sign: int = 1) -> None:
+        index = self._index(at)
+        self._advance(index)
+        if index <= self._head - self.size:
+            return  # already outside the window
+        slot = index % self.size
+        self.counts[slot] += sign
+        self.amounts[slot] += sign * amount
+        self.count += sign
+        self.amount += sign * amount
+
+    def totals(self, now: float) -> Tuple[int, float]:
+        self._advance(self._index(now))
+        return self.count, self.amount
+
+
+@dataclass
+class RiskVelocity:
+    count_1h: int
+    amount_1h: float
+    count_24h: int
+    amount_24h: float
+    approved_count_24h: int
+    approved_amount_24h: float
+
+
+class UserRiskCounters:
+    """Sliding 1h/24h totals of one user's transactions (all statuses, and approved ones)"""
+
+    def __init__(self):
+        self.created_1h = RollingCounter(3600, 60)
+        self.created_24h = RollingCounter(86400, 96)
+        self.approved_24h = RollingCounter(86400, 96)
+        self.loaded_at = time.monotonic()
+
+    def add(self, at: datetime, amount: float, created: int = 0, approved: int = 0) -> None:
+        """Count (+1) or uncount (-1) a transaction created at `at` in the all/approved windows"""
+        ts = at.timestamp()
+        if created:
+            self.created_1h.add(ts, amount, created)
+            self.created_24h.add(ts, amount, created)
+        if approved:
+            self.approved_24h.add(ts, amount, approved)
+
+    def velocity(self, now: Optional[datetime] = None) -> RiskVelocity:
+        ts = (now or datetime.utcnow()).timestamp()
+        count_1h, amount_1h = self.created_1h.totals(ts)
+        count_24h, amount_24h = self.created_24h.totals(ts)
+        approved_count, approved_amount = self.approved_24h.totals(ts)
+        return RiskVelocity(count_1h, amount_1h, count_24h, amount_24h, approved_count, approved_amount)
+
+
+class RiskCounterService:
+    """Per-user transaction velocity held in memory and maintained on write.
+
+    A user's counters are loaded from the last 24 hours of transactions the
+    first time they are needed and then kept current by a flush hook: new
+    transactions and approvals (or reversals) are collected in before_flush
+    and applied once the session commits, so rolled back work never counts.
+    Velocity checks then cost no query and can run on any update, not only
+    when a receipt arrives. Counters are reloaded after
+    `risk_counters_resync_seconds` to pick up writes made by other processes,
+    and the least recently used users are evicted past
+    `risk_counters_max_users`.
+    """
+
+    _users: "OrderedDict[int, UserRiskCounters]" = OrderedDict()
+
+    @staticmethod
+    async def _load(session: AsyncSession, user_id: int) -> UserRiskCounters:
+        since = datetime.utcnow() - timedelta(days=1)
+        rows = (await session.execute(
+            select(Transaction.created_at, Transaction.amount, Transaction.status)
+            .where(and_(Transaction.user_id == user_id, Transaction.created_at >= since))
+        )).all()
+        counters = UserRiskCounters()
+        for created_at, amount, status in rows:
+            counters.add(created_at, float(amount or 0), created=1, approved=int(status == "approved"))
+        # This session's flushed but uncommitted changes are in the rows and get applied again on commit
+        for event_user_id, at, amount, created, approved in session.sync_session.info.get(_EVENTS_KEY, ()):
+            if event_user_id == user_id:
+                counters.add(at, amount, -created, -approved)
+        return counters
+
+    @staticmethod
+    async def get(session: AsyncSession, user_id: int) -> UserRiskCounters:
+        users = RiskCounterService._users
+        counters = users.get(user_id)
+        if counters is None or time.monotonic() - counters.loaded_at > settings.risk_counters_resync_seconds:
+            counters = await RiskCounterService._load(session, user_id)
+            users[user_id] = counters
+            while len(users) > settings.risk_counters_max_users:
+                users.popitem(last=False)
+        users.move_to_end(user_id)
+        return counters
+
+    @staticmethod
+    async def velocity(session: AsyncSession, user_id: int) -> RiskVelocity:
+        return (await RiskCounterService.get(session, user_id)).velocity()
+
+    @staticmethod
+    def record(user_id: int, at: datetime, amount: float, created: int = 0, approved: int = 0) -> None:
+        """Apply a committed change; users not in memory are loaded fresh when next needed"""
+        counters = RiskCounterService._users.get(user_id)
+        if counters is not None:
+            counters.add(at, amount, created, approved)
+
+    @staticmethod
+    def before_flush(session: Session, flush_context, instances) -> None:
+        now = datetime.utcnow()
+        events: List[Tuple] = session.info.setdefault(_EVENTS_KEY, [])
+        for obj in session.new:
+            if isinstance(obj, Transaction):
+                snapshot = _snapshot(obj)
+                events.append((
+                    snapshot["user_id"], snapshot["created_at"] or now,
+                    float(_amount(snapshot["amount"])), 1, int(snapshot["status"] == "approved")
+                ))
+        for obj in session.dirty:
+            if isinstance(obj, Transaction) and inspect(obj).attrs.status.history.deleted:
+                before, after = _snapshot(obj, previous=True), _snapshot(obj)
+                was_approved, is_approved = before["status"] == "approved", after["status"] == "approved"
+                if was_approved != is_approved:
+                    events.append((
+                        after["user_id"], after["created_at"] or now,
+                        float(_amount(after["amount"])), 0, 1 if is_approved else -1
+                    ))
+
+    @staticmethod
+    def after_commit(session: Session) -> None:
+        for event_args in session.info.pop(_EVENTS_KEY, ()):
+            RiskCounterService.record(*event_args)
+
+    @staticmethod
+    def after_rollback(session: Session) -> None:
+        session.info.pop(_EVENTS_KEY, None)
+
+
+event.listen(Session, "before_flush", RiskCounterService.before_flush)
+event.listen(Session, "after_commit", RiskCounterService.after_commit)
+event.listen(Session, "after_rollback", RiskCounterService.after_rollback)
@@ -0,0 +1,220 @@
+import logging
+from collections import defaultdict
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Tuple
+
+from sqlalchemy import select, update, func, and_, event, inspect, bindparam
+from sqlalchemy.orm import Session
+
+from models.analytics import SalesCounter
+from models.billing import Transaction
+from models.catalog import Plan
+from models.service import Service
+from services.revenue_rollup import RevenueRollupService, _snapshot, _amount, _upsert
+
+
+logger = logging.getLogger(__name__)
+
+SCOPES = ("plan", "server", "category")
+
+# Service columns that decide whether and where it counts as active
+_SERVICE_TRACKED = ("plan_id", "server_id", "is_active", "is_test")
+
+
+def _service_snapshot(obj: Service, previous: bool = False) -> Dict[str, Any]:
+    state = inspect(obj)
+    snapshot = {}
+    for name in _SERVICE_TRACKED:
+        history = state.attrs[name].history
+        snapshot[name] = history.deleted[0] if previous and history.deleted else getattr(obj, name)
+    return snapshot
+
+
+class SalesCounterService:
+    """All-time sales, revenue and active services per plan, server and category.
+
+    Counters follow the weekly report's definitions: a sale is an approved
+    transaction tied to a plan and revenue is its amount; a service is
+    active while is_active and not a test. Like the revenue rollups they are
+    adjusted in a before_flush hook, inside the same DB transaction as the
+    purchase, with additive upserts (Plan.sales_count is kept in step). The
+    views that rank plans or show server load read a handful of rows by key
+    instead of aggregating transactions and services. `reconcile` rebuilds
+    everything to fix changes made outside the ORM.
+    """
+
+    @staticmethod
+    def collect(session: Session) -> Tuple[Dict[int, List], Dict[int, int], Dict[int, int]]:
+        """(per-plan [sales, revenue], active services per plan, per server) pending in this flush"""
+
+        sales: Dict[int, List] = defaultdict(lambda: [0, Decimal(0)])
+        active_by_plan: Dict[int, int] = defaultdict(int)
+        active_by_server: Dict[int, int] = defaultdict(int)
+
+        def add_transaction(snapshot: Dict[str, Any], sign: int) -> None:
+            if snapshot["status"] == "approved" and snapshot["plan_id"]:
+                bucket = sales[snapshot["plan_id"]]
+                bucket[0] += sign
+                bucket[1] += sign * _amount(snapshot["amount"])
+
+        def add_service(snapshot: Dict[str, Any], sign: int) -> None:
+            if snapshot["is_active"] and not snapshot["is_test"]:
+                active_by_plan[snapshot["plan_id"] or 0] += sign
+                active_by_server[snapshot["server_id"] or 0] += sign
+
+        for obj in session.new:
+            if isinstance(obj, Transaction):
+                add_transaction(_snapshot(obj), +1)
+            elif isinstance(obj, Service):
+                add_service(_service_snapshot(obj), +1)
+
+        for obj in session.dirty:
+            if isinstance(obj, Transaction):
+                state = inspect(obj)
+                if any(state.attrs[name].history.deleted for name in ("status", "plan_id", "amount")):
+                    add_transaction(_snapshot(obj, previous=True), -1)
+                    add_transaction(_snapshot(obj), +1)
+            elif isinstance(obj, Service):
+                state = inspect(obj)
+                if any(state.attrs[name].history.deleted for name in _SERVICE_TRACKED):
+                    add_service(_service_snapshot(obj, previous=True), -1)
+                    add_service(_service_snapshot(obj), +1)
+
+        for obj in session.deleted:
+            if isinstance(obj, Transaction):
+                add_transaction(_snapshot(obj, previous=True), -1)
+            elif isinstance(obj, Service):
+                add_service(_service_snapshot(obj, previous=True), -1)
+
+        return sales, active_by_plan, active_by_server
+
+    @staticmethod
+    def apply(session: Session, sales: Dict[int, List], active_by_plan: Dict[int, int], active_by_server: Dict[int, int]) -> None:
+        dimensions = RevenueRollupService._plan_dimensions(session, list(sales) + list(active_by_plan))
+        counters: Dict[Tuple[str, int], List] = defaultdict(lambda: [0, Decimal(0), 0])
+
+        for plan_id, (count, amount) in sales.items():
+            server_id, category_id = dimensions.get(plan_id, (0, 0))
+            for key in (("plan", plan_id), ("server", server_id), ("category", category_id)):
+                counters[key][0] += count
+                counters[key][1] += amount
+        for plan_id, count in active_by_plan.items():
+            _server_id, category_id = dimensions.get(plan_id, (0, 0))
+            counters[("plan", plan_id)][2] += count
+            counters[("category", category_id)][2] += count
+        for server_id, count in active_by_server.items():
+            counters[("server", server_id)][2] += count
+
+        rows = [
+            {"scope": scope, "scope_id": scope_id, "sales_count": count, "revenue": amount, "active_services": active}
+            for (scope, scope_id), (count, amount, active) in counters.items()
+            if scope_id and (count or amount or active)
+        ]
+        _upsert(
+            session, SalesCounter, rows,
+            key_columns=("scope", "scope_id"), add_columns=("sales_count", "revenue", "active_services"),
+        )
+
+        plan_sales = [{"plan": plan_id, "delta": count} for plan_id, (count, _amount) in sales.items() if count]
+        if plan_sales:
+            session.connection().execute(
+                update(Plan.__table__)
+                .where(Plan.__table__.c.id == bindparam("plan"))
+                .values(sales_count=func.coalesce(Plan.__table__.c.sales_count, 0) + bindparam("delta")),
+                plan_sales,
+            )
+
+    @staticmethod
+    def before_flush(session: Session, flush_context, instances) -> None:
+        sales, active_by_plan, active_by_server = SalesCounterService.collect(session)
+        if sales or active_by_plan or active_by_server:
+            SalesCounterService.apply(session, sales, active_by_plan, active_by_server)
+
+    @staticmethod
+    async def get_many(session, scope: str, ids: Iterable[int]) -> Dict[int, SalesCounter]:
+        ids = list(ids)
+        if not ids:
+            return {}
+        rows = (await session.execute(
+            select(SalesCounter).where(and_(SalesCounter.scope == scope, SalesCounter.scope_id.in_(ids)))
+        )).scalars().all()
+        return {row.scope_id: row for row in rows}
+
+    @staticmethod
+    async def reconcile(session) -> Dict[str, int]:
+        """Recompute every counter from transactions and services; returns counters that changed
+
+        The totals and the current counters are read in the same transaction
+        (one snapshot under REPEATABLE READ) and only the differences are
+        added, with the same upsert the flush hook uses. A purchase that
+        commits meanwhile keeps its own increment instead of being
+        overwritten by a DELETE and re-INSERT.
+        """
+
+        approved = and_(Transaction.status == "approved", Transaction.plan_id.isnot(None))
+        active = and_(Service.is_active == True, Service.is_test == False)
+        computed: Dict[Tuple[str, int], List] = defaultdict(lambda: [0, Decimal(0), 0])
+
+        for scope, column in (("plan", Plan.id), ("server", Plan.server_id), ("category", Plan.category_id)):
+            rows = (await session.execute(
+                select(column, func.count(Transaction.id), func.sum(Transaction.amount))
+                .select_from(Transaction)
+                .join(Plan, Plan.id == Transaction.plan_id)
+                .where(approved)
+                .group_by(column)
+            )).all()
+            for scope_id, count, amount in rows:
+                computed[(scope, scope_id)][0] = count
+                computed[(scope, scope_id)][1] = _amount(amount)
+
+        for scope, column, join in (
+            ("plan", Service.plan_id, False),
+            ("server", Service.server_id, False),
+            ("category", Plan.category_id, True),
+        ):
+            query = select(column, func.count(Service.id)).select_from(Service)
+            if join:
+                query = query.join(Plan, Plan.id == Service.plan_id)
+            for scope_id, count in (await session.execute(query.where(active).group_by(column))).all():
+                computed[(scope, scope_id)][2] = count
+
+        current = {
+            (row.scope, row.scope_id): (row.sales_count, _amount(row.revenue), row.active_services)
+            for row in (await session.execute(select(SalesCounter))).scalars().all()
+        }
+        changed = {scope: 0 for scope in SCOPES}
+        rows = []
+        for key in set(current) | set(computed):
+            count, amount, active_count = computed.get(key, (0, Decimal(0), 0))
+            old_count, old_amount, old_active = current.get(key, (0, Decimal(0), 0))
+            if (old_count, old_amount, old_active) == (count, amount, active_count) or not key[1]:
+                continue
+            changed[key[0]] += 1
+            rows.append({
+                "scope": key[0], "scope_id": key[1], "sales_count": count - old_count,
+                "revenue": amount - old_amount, "active_services": active_count - old_active,
+            })
+        await session.run_sync(lambda sync_session: _upsert(
+            sync_session, SalesCounter, rows,
+            key_columns=("scope", "scope_id"), add_columns=("sales_count", "revenue", "active_services"),
+        ))
+
+        plan_sales = [
+            {"plan": plan_id, "delta": computed.get(("plan", plan_id), (0,))[0] - (sales_count or 0)}
+            for plan_id, sales_count in (await session.execute(select(Plan.id, Plan.sales_count))).all()
+        ]
+        plan_sales = [row for row in plan_sales if row["delta"]]
+        if plan_sales:
+            await session.execute(
+                update(Plan.__table__)
+                .where(Plan.__table__.c.id == bindparam("plan"))
+                .values(sales_count=func.coalesce(Plan.__table__.c.sales_count, 0) + bindparam("delta")),
+                plan_sales,
+            )
+
+        if any(changed.values()):
+            logger.info("Sales counters corrected: %s", changed)
+        return changed
+
+
+event.listen(Session, "before_flush", SalesCounterService.before_flush)
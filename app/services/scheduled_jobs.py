@@ -0,0 +1,185 @@
+from core.config import settings
+from core.db import get_db_session
+from core.scheduler import JobScheduler, IntervalTrigger, CronTrigger
+from services.activity_log import ActivityLogService
+from services.analytics_snapshot import AnalyticsSnapshotService
+from services.archive_service import ArchiveService
+from services.backup_service import backup_service
+from services.crm_service import CRMService
+from services.discount_limits import DiscountLimiter
+from services.gift_service import GiftService
+from services.notification_service import NotificationService
+from services.revenue_rollup import RevenueRollupService
+from services.sales_counters import SalesCounterService
+from services.scheduled_message_service import ScheduledMessageService
+from services.recurring_schedule_runner import recurring_schedule_runner
+from services.reseller_hierarchy import ResellerHierarchyService
+from services.reseller_ledger import ResellerLedgerService
+
+
+async def check_service_expiries_job():
+    async with get_db_session() as session:
+        return await NotificationService.check_service_expiries(session)
+
+
+async def check_low_wallet_balances_job():
+    async with get_db_session() as session:
+        await NotificationService.check_low_wallet_balances(session)
+
+
+async def process_scheduled_messages_job():
+    async with get_db_session() as session:
+        return await ScheduledMessageService.process_scheduled_messages(session)
+
+
+async def process_bulk_gifts_job():
+    return await GiftService.process_pending_gifts()
+
+
+async def reconcile_revenue_rollups_job():
+    return await RevenueRollupService.reconcile_recent(settings.report_rollup_reconcile_days)
+
+
+async def update_crm_metrics_job():
+    async with get_db_session() as session:
+        return await CRMService.update_daily_metrics(session)
+
+
+async def reconcile_engagement_scores_job():
+    async with get_db_session() as session:
+        return await CRMService.reconcile_engagement_scores(session)
+
+
+async def activity_rollup_job():
+    return await ActivityLogService.rollup_and_prune(settings.activity_retention_days)
+
+
+async def archive_maintenance_job():
+    return await ArchiveService.maintain()
+
+
+async def reconcile_sales_counters_job():
+    async with get_db_session() as session:
+        return await SalesCounterService.reconcile(session)
+
+
+async def reset_discount_counters_job():
+    return await DiscountLimiter.reset_daily()
+
+
+async def rebuild_reseller_closure_job():
+    return await ResellerHierarchyService.rebuild()
+
+
+async def settle_reseller_commissions_job():
+    return await ResellerLedgerService.settle()
+
+
+async def build_analytics_snapshot_job():
+    return await AnalyticsSnapshotService.build()
+
+
+async def daily_backup_job():
+    await backup_service.create_database_backup("daily", compress=True)
+
+
+async def weekly_backup_job():
+    await backup_service.create_database_backup("weekly", compress=True)
+
+
+async def monthly_backup_job():
+    await backup_service.create_database_backup("monthly", compress=True)
+
+
+async def backup_cleanup_job():
+    await backup_service.cleanup_old_backups({
+        "daily": 7,
+        "weekly": 4,
+        "monthly": 12,
+        "manual": 30
+    })
+
+
+def register_default_jobs(scheduler: JobScheduler) -> JobScheduler:
+    """Register every periodic job of the app on the given scheduler"""
+
+    # Notifications (the dispatcher itself runs continuously, see notification_dispatcher)
+    scheduler.add_job(
+        "notifications.service_expiry", check_service_expiries_job,
+        IntervalTrigger(settings.notification_scan_interval_seconds), jitter=30, timeout=600,
+    )
+    scheduler.add_job(
+        "notifications.low_wallet", check_low_wallet_balances_job,
+        IntervalTrigger(settings.notification_scan_interval_seconds), jitter=30, timeout=600,
+    )
+
+    # Scheduled messages
+    scheduler.add_job(
+        "scheduled_messages.process", process_scheduled_messages_job,
+        IntervalTrigger(settings.scheduled_message_interval_seconds), jitter=2,
+    )
+    # Recurring schedules sleep until the next fire instead of polling; concurrent
+    # replicas are safe because each fire is claimed with a conditional UPDATE.
+    scheduler.add_worker(
+        "scheduled_messages.recurring", recurring_schedule_runner.run, recurring_schedule_runner.stop,
+    )
+
+    # Bulk gifts queued from the admin panel
+    scheduler.add_job("gifts.process", process_bulk_gifts_job, IntervalTrigger(10), jitter=2)
+
+    # Report rollups are maintained on every flush; this corrects drift from
+    # changes made outside the ORM (manual SQL, bulk updates)
+    scheduler.add_job(
+        "reports.rollup_reconcile", reconcile_revenue_rollups_job, CronTrigger("30 0 * * *"), timeout=1800,
+    )
+    # Same for the per plan/server/category sales counters
+    scheduler.add_job(
+        "reports.sales_counters_reconcile", reconcile_sales_counters_job, CronTrigger("35 */6 * * *"), timeout=1800,
+    )
+
+    # CRM inactivity days, lifecycle stages and the Monday counter reset
+    scheduler.add_job("crm.daily_metrics", update_crm_metrics_job, CronTrigger("15 0 * * *"), timeout=1800)
+    # Engagement scores are updated incrementally per activity; this recomputes them
+    # from the activity log and decays the scores of inactive users
+    scheduler.add_job(
+        "crm.engagement_reconcile", reconcile_engagement_scores_job, CronTrigger("45 0 * * *"), timeout=1800,
+    )
+
+    # Daily discount usage counters
+    scheduler.add_job("discounts.daily_reset", reset_discount_counters_job, CronTrigger("0 0 * * *"), timeout=600)
+
+    # Reseller closure table is maintained on create/move; this rebuilds it from
+    # parent_reseller_id to pick up changes made outside the service
+    scheduler.add_job(
+        "resellers.closure_reconcile", rebuild_reseller_closure_job, CronTrigger("40 0 * * *"), timeout=600,
+    )
+    # Purchases only append to the commission ledger; this adds it to the reseller totals
+    scheduler.add_job(
+        "resellers.commission_settlement", settle_reseller_commissions_job,
+        IntervalTrigger(settings.reseller_settlement_interval_seconds), jitter=10, timeout=600,
+    )
+
+    # Daily counts of the activity logs, then pruning past the retention period
+    scheduler.add_job("activity.rollup", activity_rollup_job, CronTrigger("50 0 * * *"), timeout=3600)
+
+    # Monthly partitions of the append-only tables (MySQL) and archival of cold months
+    scheduler.add_job("archive.maintenance", archive_maintenance_job, CronTrigger("20 1 * * *"), timeout=3600)
+
+    # Columnar snapshot for services/analytics_engine.py (optional numpy dependency)
+    if settings.analytics_snapshot_enabled and AnalyticsSnapshotService.is_available():
+        scheduler.add_job(
+            "analytics.snapshot", build_analytics_snapshot_job, CronTrigger("0 1 * * *"), timeout=3600,
+        )
+
+    # Backups (same times as the old hourly cron check)
+    if settings.backup_jobs_enabled:
+        scheduler.add_job("backup.daily", daily_backup_job, CronTrigger("0 2 * * *"), timeout=3600)
+        scheduler.add_job("backup.weekly", weekly_backup_job, CronTrigger("0 3 * * 0"), timeout=3600)
+        scheduler.add_job("backup.monthly", monthly_backup_job, CronTrigger("0 4 1 * *"), timeout=3600)
+        scheduler.add_job("backup.cleanup", backup_cleanup_job, CronTrigger("0 5 * * *"), timeout=600)
+
+    return scheduler
+
+
+def build_scheduler() -> JobScheduler:
+    return register_default_jobs(JobScheduler())
@@ -1,8 +1,9 @@
 import json
 import asyncio
+import calendar
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any, Tuple
-from sqlalchemy import select, func, and_, or_, desc
+from sqlalchemy import select, func, and_, or_, desc, update, Select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from models.scheduled_messages import (
@@ -91,66 +92,69 @@ class ScheduledMessageService:
             # Get users by segments
             user_ids = []
             for segment in target_segments:
-                if segment == "new_users":
-                    # Users registered in last 7 days
-                    cutoff_date = datetime.utcnow() - timedelta(days=7)
-                    users = (await session.execute(
-                        select(TelegramUser.id)
-                        .where(
-                            and_(
-                                TelegramUser.is_blocked == False,
-                                TelegramUser.created_at >= cutoff_date
-                            )
-                        )
-                    )).scalars().all()
-                    user_ids.extend(users)
-                
-                elif segment == "active_users":
-                    # Users with high engagement
-                    users = (await session.execute(
-                        select(TelegramUser.id)
-                        .join(UserProfile, TelegramUser.id == UserProfile.user_id)
-                        .where(
-                            and_(
-                                TelegramUser.is_blocked == False,
-                                UserProfile.engagement_score > 0.7
-                            )
-                        )
-                    )).scalars().all()
-                    user_ids.extend(users)
-                
-                elif segment == "vip_users":
-                    # High-value users
-                    users = (await session.execute(
-                        select(TelegramUser.id)
-                        .where(
-                            and_(
-                                TelegramUser.is_blocked == False,
-                                TelegramUser.total_spent > 500000  # 500K IRR
-                            )
-                        )
-                    )).scalars().all()
-                    user_ids.extend(users)
-                
-                elif segment == "churned_users":
-                    # Users who haven't been active
-                    cutoff_date = datetime.utcnow() - timedelta(days=30)
-                    users = (await session.execute(
-                        select(TelegramUser.id)
-                        .join(UserProfile, TelegramUser.id == UserProfile.user_id)
-                        .where(
-                            and_(
-                                TelegramUser.is_blocked == False,
-                                UserProfile.last_activity_at < cutoff_date
-                            )
-                        )
-                    )).scalars().all()
-                    user_ids.extend(users)
+                query = ScheduledMessageService._segment_query(segment)
+                if query is not None:
+                    user_ids.extend((await session.execute(query)).scalars().all())
             
             return list(set(user_ids))  # Remove duplicates
         
         return []
     
+    @staticmethod
+    def _segment_query(segment: str) -> Optional[Select]:
+        """SELECT of TelegramUser ids in a targeting segment (None for unknown segments)"""
+        
+        if segment == "all":
+            return select(TelegramUser.id).where(TelegramUser.is_blocked == False)
+        
+        elif segment == "new_users":
+            # Users registered in last 7 days
+            cutoff_date = datetime.utcnow() - timedelta(days=7)
+            return select(TelegramUser.id).where(
+                and_(
+                    TelegramUser.is_blocked == False,
+                    TelegramUser.created_at >= cutoff_date
+                )
+            )
+        
+        elif segment == "active_users":
+            # Users with high engagement
+            return (
+                select(TelegramUser.id)
+                .join(UserProfile, TelegramUser.id == UserProfile.user_id)
+                .where(
+                    and_(
+                        TelegramUser.is_blocked == False,
+                        UserProfile.engagement_score > 0.7
+                    )
+                )
+            )
+        
+        elif segment == "vip_users":
+            # High-value users
+            return select(TelegramUser.id).where(
+                and_(
+                    TelegramUser.is_blocked == False,
+                    TelegramUser.total_spent > 500000  # 500K IRR
+                )
+            )
+        
+        elif segment == "churned_users":
+            # Users who haven't been active
+            cutoff_date = datetime.utcnow() - timedelta(days=30)
+            return (
+                select(TelegramUser.id)
+                .join(UserProfile, TelegramUser.id == UserProfile.user_id)
+                .where(
+                    and_(
+                        TelegramUser.is_blocked == False,
+                        UserProfile.last_activity_at < cutoff_date
+                    )
+                )
+            )
+        
+        return None
+    
     @staticmethod
     async def process_scheduled_messages(session: AsyncSession) -> int:
         """Process and send scheduled messages"""
@@ -398,17 +402,38 @@ class ScheduledMessageService:
         )
         session.add(schedule)
         
+        await ScheduledMessageService.notify_schedules_changed(session)
+        
         return schedule
     
     @staticmethod
-    def _calculate_next_execution(schedule_type: str, config: Dict[str, Any]) -> datetime:
-        """Calculate next execution time for recurring schedule"""
+    async def notify_schedules_changed(session: AsyncSession) -> None:
+        """Make every recurring schedule runner refill its heap once this session commits"""
         
-        now = datetime.utcnow()
+        from services.recurring_schedule_runner import recurring_schedule_runner
+        
+        await recurring_schedule_runner.bump_version(session)
+    
+    @staticmethod
+    def _load_json(value: Any) -> Any:
+        # JSON columns here historically store JSON-encoded strings
+        if isinstance(value, str):
+            return json.loads(value)
+        return value
+    
+    @staticmethod
+    def _calculate_next_execution(
+        schedule_type: str,
+        config: Dict[str, Any],
+        after: Optional[datetime] = None
+    ) -> datetime:
+        """Calculate the first execution time of a recurring schedule strictly after `after` (default now)"""
+        
+        now = after or datetime.utcnow()
+        hour = config.get("hour", 9)
+        minute = config.get("minute", 0)
         
         if schedule_type == "daily":
-            hour = config.get("hour", 9)
-            minute = config.get("minute", 0)
             next_execution = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
             if next_execution <= now:
                 next_execution += timedelta(days=1)
@@ -416,34 +441,127 @@ class ScheduledMessageService:
         
         elif schedule_type == "weekly":
             weekday = config.get("weekday", 0)  # 0 = Monday
-            hour = config.get("hour", 9)
-            minute = config.get("minute", 0)
-            
-            days_ahead = weekday - now.weekday()
-            if days_ahead <= 0:  # Target day already happened this week
-                days_ahead += 7
             
-            next_execution = now + timedelta(days=days_ahead)
-            next_execution = next_execution.replace(hour=hour, minute=minute, second=0, microsecond=0)
+            days_ahead = (weekday - now.weekday()) % 7
+            next_execution = (now + timedelta(days=days_ahead)).replace(
+                hour=hour, minute=minute, second=0, microsecond=0
+            )
+            if next_execution <= now:  # Target time already passed this week
+                next_execution += timedelta(days=7)
             return next_execution
         
         elif schedule_type == "monthly":
             day = config.get("day", 1)
-            hour = config.get("hour", 9)
-            minute = config.get("minute", 0)
-            
-            if now.month == 12:
-                next_month = now.replace(year=now.year + 1, month=1, day=day, hour=hour, minute=minute, second=0, microsecond=0)
-            else:
-                next_month = now.replace(month=now.month + 1, day=day, hour=hour, minute=minute, second=0, microsecond=0)
             
-            return next_month
+            year, month = now.year, now.month
+            while True:
+                last_day = calendar.monthrange(year, month)[1]
+                next_execution = datetime(year, month, min(day, last_day), hour, minute)
+                if next_execution > now:
+                    return next_execution
+                year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        
+        elif schedule_type == "custom" and config.get("interval_minutes"):
+            return (now + timedelta(minutes=int(config["interval_minutes"]))).replace(microsecond=0)
+        
+        return (now + timedelta(hours=1)).replace(microsecond=0)  # Default to 1 hour from now
+    
+    @staticmethod
+    def _due_fire_times(
+        schedule_type: str,
+        config: Dict[str, Any],
+        due_at: datetime,
+        now: datetime,
+        max_catch_up: int = 10
+    ) -> Tuple[List[datetime], datetime]:
+        """Apply the schedule's catch-up policy to a (possibly missed) fire.
+        
+        Returns the fire times to execute now and the next execution time.
+        `schedule_config["catch_up"]` is one of:
+          - "once" (default): run a single time for any number of missed fires
+          - "skip": run only if the fire is less than `misfire_grace_seconds` late
+          - "all": run every missed fire, at most `max_catch_up` of them; the
+            sends are `catch_up_spacing_seconds` (default 300) apart instead
+            of all going out at once
+        """
+        
+        calculate = ScheduledMessageService._calculate_next_execution
+        next_execution = calculate(schedule_type, config, after=now)
+        policy = config.get("catch_up", "once")
+        
+        if policy == "skip":
+            grace = timedelta(seconds=config.get("misfire_grace_seconds", 300))
+            return ([due_at] if now - due_at <= grace else []), next_execution
+        
+        if policy == "all":
+            fires = []
+            fire_at = due_at
+            while fire_at <= now and len(fires) < max_catch_up:
+                fires.append(fire_at)
+                fire_at = calculate(schedule_type, config, after=fire_at)
+            return fires, next_execution
+        
+        return [due_at], next_execution
+    
+    @staticmethod
+    async def execute_recurring_schedule(
+        session: AsyncSession,
+        schedule: MessageSchedule,
+        now: Optional[datetime] = None
+    ) -> Optional[datetime]:
+        """Execute one due schedule and advance it.
+        
+        The schedule is claimed with a conditional UPDATE on the expected
+        next_execution_at, so concurrent runners never execute the same fire twice.
+        Returns the new next execution time, or None if another runner got it first.
+        """
+        
+        now = now or datetime.utcnow()
+        due_at = schedule.next_execution_at
+        config = ScheduledMessageService._load_json(schedule.schedule_config) or {}
+        fires, next_execution = ScheduledMessageService._due_fire_times(
+            schedule.schedule_type, config, due_at, now
+        )
+        
+        claimed = await session.execute(
+            update(MessageSchedule)
+            .where(
+                and_(
+                    MessageSchedule.id == schedule.id,
+                    MessageSchedule.next_execution_at == due_at
+                )
+            )
+            .values(
+                next_execution_at=next_execution,
+                last_executed_at=now if fires else MessageSchedule.last_executed_at,
+                execution_count=MessageSchedule.execution_count + len(fires)
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if claimed.rowcount != 1:
+            return None
+        
+        target_users = ScheduledMessageService._load_json(schedule.target_users)
+        target_segments = ScheduledMessageService._load_json(schedule.target_segments)
+        spacing = timedelta(seconds=config.get("catch_up_spacing_seconds", 300))
+        for position, _fire_at in enumerate(fires):
+            # Create scheduled message from template
+            await ScheduledMessageService.create_scheduled_message(
+                session=session,
+                title=f"Recurring: {schedule.name}",
+                content=schedule.message_content,
+                scheduled_at=now + spacing * position,
+                target_type=schedule.target_type,
+                target_users=target_users,
+                target_segments=target_segments,
+                created_by=schedule.created_by
+            )
         
-        return now + timedelta(hours=1)  # Default to 1 hour from now
+        return next_execution
     
     @staticmethod
     async def process_recurring_schedules(session: AsyncSession) -> int:
-        """Process recurring message schedules"""
+        """Execute every due recurring schedule right away (the runner normally does this on time)"""
         
         now = datetime.utcnow()
         
@@ -462,31 +580,15 @@ class ScheduledMessageService:
         
         for schedule in ready_schedules:
             try:
-                # Create scheduled message from template
-                message = await ScheduledMessageService.create_scheduled_message(
-                    session=session,
-                    title=f"Recurring: {schedule.name}",
-                    content=schedule.message_content,
-                    scheduled_at=now,
-                    target_type=schedule.target_type,
-                    target_users=json.loads(schedule.target_users) if schedule.target_users else None,
-                    target_segments=json.loads(schedule.target_segments) if schedule.target_segments else None,
-                    created_by=schedule.created_by
-                )
-                
-                # Update schedule
-                schedule.last_executed_at = now
-                schedule.execution_count += 1
-                schedule.next_execution_at = ScheduledMessageService._calculate_next_execution(
-                    schedule.schedule_type,
-                    json.loads(schedule.schedule_config)
-                )
-                
-                executed_count += 1
+                if await ScheduledMessageService.execute_recurring_schedule(session, schedule, now):
+                    executed_count += 1
             
             except Exception as e:
                 print(f"Error processing recurring schedule {schedule.id}: {e}")
         
+        if executed_count:
+            ScheduledMessageService.notify_schedules_changed(session)
+        
         return executed_count
     
     @staticmethod
@@ -12,6 +12,8 @@ from models.user import TelegramUser
 from models.billing import Transaction
 from models.service import Service
 from models.catalog import Plan
+from services.discount_index import SmartDiscountIndex, CompiledDiscount
+from services.discount_limits import DiscountLimiter, DiscountLimitReached
 
 
 class SmartDiscountService:
@@ -32,53 +34,50 @@ class SmartDiscountService:
         # Get user profile
         user_profile = await SmartDiscountService._get_user_profile(session, user_id)
         
-        # Base query for active discounts
-        query = select(SmartDiscount).where(
-            and_(
-                SmartDiscount.is_active == True,
-                or_(
-                    SmartDiscount.valid_from.is_(None),
-                    SmartDiscount.valid_from <= now
-                ),
-                or_(
-                    SmartDiscount.valid_to.is_(None),
-                    SmartDiscount.valid_to >= now
-                )
-            )
-        ).order_by(SmartDiscount.priority.desc())
-        
-        discounts = (await session.execute(query)).scalars().all()
+        # Only discounts the hour, amount and plan allow are looked at further
+        index = await SmartDiscountIndex.get(session)
+        candidates = [
+            candidate for candidate in index.candidates(now.hour, purchase_amount, plan_id)
+            if SmartDiscountService._is_discount_eligible(candidate, user_profile, now, server_id)
+        ]
+        if not candidates:
+            return []
+        
+        # Usage counters and is_active change between index rebuilds; read them from the rows
+        rows = {
+            discount.id: discount
+            for discount in (await session.execute(
+                select(SmartDiscount).where(SmartDiscount.id.in_([c.id for c in candidates]))
+            )).scalars().all()
+        }
         
         eligible_discounts = []
-        
-        for discount in discounts:
-            if await SmartDiscountService._is_discount_eligible(
-                session, discount, user_profile, purchase_amount, plan_id, server_id
-            ):
-                eligible_discounts.append(discount)
+        for candidate in candidates:
+            discount = rows.get(candidate.id)
+            if discount is None or not discount.is_active:
+                continue
+            if discount.daily_limit and discount.daily_used_count >= discount.daily_limit:
+                continue
+            if discount.total_limit and discount.used_count >= discount.total_limit:
+                continue
+            eligible_discounts.append(discount)
         
         return eligible_discounts
     
     @staticmethod
-    async def _is_discount_eligible(
-        session: AsyncSession,
-        discount: SmartDiscount,
+    def _is_discount_eligible(
+        discount: CompiledDiscount,
         user_profile: UserDiscountProfile,
-        purchase_amount: float,
-        plan_id: Optional[int] = None,
+        now: datetime,
         server_id: Optional[int] = None
     ) -> bool:
-        """Check if a discount is eligible for the given context"""
+        """Check the conditions the eligibility index does not bucket on"""
         
-        # Check daily and total limits
-        if discount.daily_limit and discount.daily_used_count >= discount.daily_limit:
+        # Check validity window
+        if discount.valid_from and discount.valid_from > now:
             return False
         
-        if discount.total_limit and discount.used_count >= discount.total_limit:
-            return False
-        
-        # Check minimum purchase amount
-        if discount.min_purchase_amount and purchase_amount < discount.min_purchase_amount:
+        if discount.valid_to and discount.valid_to < now:
             return False
         
         # Check discount type specific conditions
@@ -86,61 +85,27 @@ class SmartDiscountService:
             if not user_profile.is_first_time_buyer:
                 return False
         
-        elif discount.discount_type == DiscountType.HOURLY:
-            # Check if it's within the specified hour range
-            current_hour = datetime.utcnow().hour
-            try:
-                conditions = json.loads(discount.trigger_conditions)
-                if 'hours' in conditions:
-                    if current_hour not in conditions['hours']:
-                        return False
-            except (json.JSONDecodeError, KeyError):
-                pass
-        
         elif discount.discount_type == DiscountType.LOYALTY:
             # Check loyalty level
-            try:
-                conditions = json.loads(discount.trigger_conditions)
-                if 'min_loyalty_level' in conditions:
-                    if user_profile.loyalty_level < conditions['min_loyalty_level']:
-                        return False
-            except (json.JSONDecodeError, KeyError):
-                pass
+            if discount.min_loyalty_level is not None:
+                if user_profile.loyalty_level < discount.min_loyalty_level:
+                    return False
         
         elif discount.discount_type == DiscountType.BIRTHDAY:
             # Check if it's user's birthday month
             if not user_profile.birthday_month:
                 return False
-            current_month = datetime.utcnow().month
-            if user_profile.birthday_month != current_month:
+            if user_profile.birthday_month != now.month:
                 return False
         
         # Check target criteria
-        if discount.target_user_groups:
-            try:
-                target_groups = json.loads(discount.target_user_groups)
-                if not await SmartDiscountService._user_matches_criteria(
-                    session, user_profile, target_groups
-                ):
-                    return False
-            except (json.JSONDecodeError, KeyError):
-                pass
-        
-        if discount.target_plans and plan_id:
-            try:
-                target_plans = json.loads(discount.target_plans)
-                if plan_id not in target_plans:
-                    return False
-            except (json.JSONDecodeError, KeyError):
-                pass
+        if discount.target_groups:
+            if not SmartDiscountService._user_matches_criteria(user_profile, discount.target_groups):
+                return False
         
-        if discount.target_servers and server_id:
-            try:
-                target_servers = json.loads(discount.target_servers)
-                if server_id not in target_servers:
-                    return False
-            except (json.JSONDecodeError, KeyError):
-                pass
+        if discount.target_servers is not None and server_id:
+            if server_id not in discount.target_servers:
+                return False
         
         return True
     
@@ -152,7 +117,14 @@ class SmartDiscountService:
         original_amount: float,
         transaction_id: Optional[int] = None
     ) -> Tuple[float, float]:
-        """Apply a discount and return (discount_amount, final_amount)"""
+        """Apply a discount and return (discount_amount, final_amount)
+        
+        Raises DiscountLimitReached when the discount's usage limit is used up.
+        """
+        
+        # Reserve the redemption first; the limit holds under concurrent checkouts
+        if not await DiscountLimiter.reserve(session, "smart", discount):
+            raise DiscountLimitReached(discount.name)
         
         discount_amount = 0
         
@@ -186,10 +158,6 @@ class SmartDiscountService:
         )
         session.add(usage)
         
-        # Update discount usage counters
-        discount.used_count += 1
-        discount.daily_used_count += 1
-        
         # Update user profile
         await SmartDiscountService._update_user_profile(session, user_id, discount_amount)
         
@@ -216,6 +184,10 @@ class SmartDiscountService:
         # Use the highest priority rule
         best_rule = max(cashback_rules, key=lambda r: r.priority if hasattr(r, 'priority') else 0)
         
+        # Count the use against the rule's limit
+        if not await DiscountLimiter.reserve(session, "cashback", best_rule):
+            return None
+        
         # Calculate cashback amount
         cashback_amount = 0
         
@@ -239,9 +211,6 @@ class SmartDiscountService:
         )
         session.add(cashback_tx)
         
-        # Update rule usage
-        best_rule.used_count += 1
-        
         return cashback_tx
     
     @staticmethod
@@ -375,8 +344,7 @@ class SmartDiscountService:
         return True
     
     @staticmethod
-    async def _user_matches_criteria(
-        session: AsyncSession,
+    def _user_matches_criteria(
         user_profile: UserDiscountProfile,
         criteria: Dict[str, Any]
     ) -> bool:
@@ -400,40 +368,6 @@ class SmartDiscountService:
         
         return True
     
-    @staticmethod
-    async def reset_daily_counters(session: AsyncSession):
-        """Reset daily counters for all discounts"""
-        
-        today = datetime.utcnow().date()
-        
-        # Reset discounts
-        discounts_to_reset = (await session.execute(
-            select(SmartDiscount).where(
-                or_(
-                    SmartDiscount.last_reset_date.is_(None),
-                    SmartDiscount.last_reset_date < today
-                )
-            )
-        )).scalars().all()
-        
-        for discount in discounts_to_reset:
-            discount.daily_used_count = 0
-            discount.last_reset_date = today
-        
-        # Reset cashback rules
-        cashback_rules_to_reset = (await session.execute(
-            select(CashbackRule).where(
-                or_(
-                    CashbackRule.last_reset_date.is_(None),
-                    CashbackRule.last_reset_date < today
-                )
-            )
-        )).scalars().all()
-        
-        for rule in cashback_rules_to_reset:
-            rule.daily_used_count = 0
-            rule.last_reset_date = today
-    
     @staticmethod
     async def get_user_discount_summary(
         session: AsyncSession,
@@ -0,0 +1,76 @@
+import logging
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Optional
+
+from sqlalchemy import select, event
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from models.admin import BotSettings
+
+
+logger = logging.getLogger(__name__)
+
+
+class VersionedCache:
+    """A per-process value stamped with a version kept in a bot setting.
+
+    The value is loaded the first time it is needed. Edits call `bump` in
+    their session, which writes a new stamp under `key`; other processes
+    compare stamps at most every `check_setting` seconds (a settings
+    attribute) and reload when it changed, while the editing process
+    reloads as soon as the edit commits.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        description: str,
+        check_setting: str,
+        load: Callable[[AsyncSession], Awaitable[Any]],
+    ):
+        self.key = key
+        self.description = description
+        self.check_setting = check_setting
+        self.load = load
+        self.value: Optional[Any] = None
+        self.version: Optional[str] = None
+        self.checked_at: float = 0.0
+
+    async def current_version(self, session: AsyncSession) -> str:
+        value = (await session.execute(
+            select(BotSettings.value).where(BotSettings.key == self.key)
+        )).scalar_one_or_none()
+        return value or "0"
+
+    async def get(self, session: AsyncSession) -> Any:
+        now = time.monotonic()
+        if self.value is not None and now - self.checked_at < getattr(settings, self.check_setting):
+            return self.value
+        version = await self.current_version(session)
+        self.checked_at = now
+        if self.value is None or version != self.version:
+            self.value = await self.load(session)
+            self.version = version
+            logger.info("Reloaded %s (version %s)", self.description, version)
+        return self.value
+
+    def invalidate(self) -> None:
+        self.value = None
+
+    async def bump(self, session: AsyncSession) -> None:
+        """Call in the session that makes the edit; every process reloads once it commits"""
+        row = (await session.execute(
+            select(BotSettings).where(BotSettings.key == self.key)
+        )).scalar_one_or_none()
+        version = str(int(datetime.utcnow().timestamp() * 1000))
+        if row:
+            row.value = version
+        else:
+            session.add(BotSettings(key=self.key, value=version, data_type="string", description=f"{self.description} version"))
+        event.listen(
+            session.sync_session, "after_commit",
+            lambda _session: self.invalidate(),
+            once=True
+        )
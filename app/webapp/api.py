@@ -365,6 +365,7 @@ async def purchase_service(
             status="approved",
             description=f"Purchase plan {plan.title}",
             payment_gateway="wallet",
+            plan_id=plan.id,
         )
         session.add(transaction)
 
@@ -537,6 +538,7 @@ async def renew_service(
             status="approved",
             description=f"Service renewal",
             payment_gateway="wallet",
+            plan_id=plan.id,
         )
         session.add(transaction)
         
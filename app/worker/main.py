@@ -0,0 +1,53 @@
+import asyncio
+import logging
+import signal
+import sys
+
+from aiogram import Bot
+
+from core.config import settings
+from core.db import init_db_schema
+from services.activity_log import activity_log
+from services.notification_dispatcher import notification_dispatcher
+from services.scheduled_jobs import build_scheduler
+
+
+async def main() -> None:
+    """Dedicated background worker: scheduled jobs plus the notification dispatcher"""
+
+    await init_db_schema()
+
+    scheduler = build_scheduler()
+    await scheduler.start()
+
+    bot = None
+    dispatcher_task = None
+    if settings.notification_dispatcher_enabled and settings.bot_token and settings.bot_token != "your_telegram_bot_token_here":
+        bot = Bot(token=settings.bot_token)
+        dispatcher_task = asyncio.create_task(notification_dispatcher.run(bot))
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            pass
+
+    print(f"[worker] started {len(scheduler.jobs)} jobs as {scheduler.owner_id}")
+    try:
+        await stop_event.wait()
+    finally:
+        await scheduler.stop()
+        if dispatcher_task:
+            notification_dispatcher.stop()
+            await dispatcher_task
+        if bot:
+            await bot.session.close()
+        # Write activity events the jobs queued in this process
+        await activity_log.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=getattr(logging, settings.log_level.upper(), logging.INFO), stream=sys.stdout)
+    asyncio.run(main())
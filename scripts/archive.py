@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Partitioning and archival of the append-only tables (notificationlog,
+messagerecipient, useractivity). The nightly archive.maintenance job adds
+upcoming partitions and, with ARCHIVE_ENABLED, archives cold months; this
+script converts tables and runs the same steps by hand.
+
+Usage: python scripts/archive.py partition <table>     convert to monthly partitions (MySQL)
+       python scripts/archive.py maintain              add upcoming partitions
+       python scripts/archive.py archive [--months N]  archive months older than N months
+       python scripts/archive.py query <table> --from YYYY-MM-DD --to YYYY-MM-DD [--count]
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add the app directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent / "app"))
+
+from services.archive_service import ArchiveService, ArchiveError, ARCHIVE_TABLES, _json_default
+
+
+def _parse_date(value: str) -> datetime:
+    return datetime.strptime(value, "%Y-%m-%d")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    partition = commands.add_parser("partition", help="convert a table to monthly partitions")
+    partition.add_argument("table", choices=sorted(ARCHIVE_TABLES))
+    commands.add_parser("maintain", help="add partitions for the coming months")
+    archive = commands.add_parser("archive", help="archive cold months to compressed files")
+    archive.add_argument("--months", type=int, help="keep this many whole months live (default: ARCHIVE_AFTER_MONTHS)")
+    query = commands.add_parser("query", help="print rows from archive files and the live table as JSON lines")
+    query.add_argument("table", choices=sorted(ARCHIVE_TABLES))
+    query.add_argument("--from", dest="start", type=_parse_date, required=True)
+    query.add_argument("--to", dest="end", type=_parse_date, required=True, help="last day (inclusive)")
+    query.add_argument("--count", action="store_true", help="only print the number of rows")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "partition":
+            months = await ArchiveService.partition_table(args.table)
+            print(f"{args.table}: {months} monthly partitions")
+        elif args.command == "maintain":
+            print(await ArchiveService.ensure_partitions())
+        elif args.command == "archive":
+            print(await ArchiveService.archive_cold(args.months))
+        elif args.command == "query":
+            total = 0
+            async for row in ArchiveService.iter_rows(args.table, args.start, args.end + timedelta(days=1)):
+                total += 1
+                if not args.count:
+                    print(json.dumps(row, default=_json_default, ensure_ascii=False))
+            if args.count:
+                print(total)
+    except ArchiveError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Rebuild the daily report rollups (daily stats, revenue and per-user revenue)
+from the transaction history. Run once after upgrading, or for any range
+whose rollups are known to be off; new transactions are rolled up as they
+are written.
+
+Usage: python scripts/backfill_rollups.py [--from YYYY-MM-DD] [--to YYYY-MM-DD]
+"""
+
+import argparse
+import asyncio
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# Add the app directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent / "app"))
+
+from sqlalchemy import select, func
+
+from core.db import get_db_session
+from models.billing import Transaction
+from services.revenue_rollup import RevenueRollupService
+
+
+def _parse_date(value: str):
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--from", dest="start", type=_parse_date, help="first day (default: first transaction)")
+    parser.add_argument("--to", dest="end", type=_parse_date, help="last day (default: today)")
+    parser.add_argument("--batch-days", type=int, default=7, help="days rebuilt per DB transaction")
+    args = parser.parse_args()
+
+    start = args.start
+    if start is None:
+        async with get_db_session() as session:
+            first = (await session.execute(select(func.min(Transaction.created_at)))).scalar()
+        if first is None:
+            print("No transactions, nothing to backfill")
+            return
+        start = first.date()
+
+    totals = await RevenueRollupService.backfill(start, args.end, days_per_batch=args.batch_days)
+    print(f"Rebuilt {totals.get('days', 0)} days: {totals.get('revenue_rows', 0)} revenue rows, "
+          f"{totals.get('user_rows', 0)} user rows")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
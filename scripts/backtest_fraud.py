@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Replay historical transactions through the fraud rules and report how well
+each rule would have caught the receipts admins rejected (precision/recall)
+and how fast the replay ran. Thresholds and criteria can be overridden to
+try a rule edit before making it.
+
+Usage: python scripts/backtest_fraud.py --from YYYY-MM-DD --to YYYY-MM-DD
+           [--threshold RULE=0.8 ...] [--criteria 'RULE={"max_transactions": 5}' ...]
+           [--include-inactive] [--json]
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add the app directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent / "app"))
+
+from services.fraud_backtest import FraudBacktestService
+
+
+def _parse_date(value: str) -> datetime:
+    return datetime.strptime(value, "%Y-%m-%d")
+
+
+def _parse_override(value: str):
+    name, sep, setting = value.partition("=")
+    if not sep or not name:
+        raise argparse.ArgumentTypeError(f"expected RULE=VALUE, got {value!r}")
+    return name, setting
+
+
+def _percent(value) -> str:
+    return "-" if value is None else f"{value * 100:.1f}%"
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--from", dest="start", type=_parse_date, required=True)
+    parser.add_argument("--to", dest="end", type=_parse_date, required=True, help="last day (inclusive)")
+    parser.add_argument("--threshold", type=_parse_override, action="append", default=[], help="RULE=VALUE")
+    parser.add_argument("--criteria", type=_parse_override, action="append", default=[], help="RULE=JSON, merged into the rule's criteria")
+    parser.add_argument("--include-inactive", action="store_true", help="also replay inactive rules")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    try:
+        thresholds = {name: float(value) for name, value in args.threshold}
+        criteria = {name: json.loads(value) for name, value in args.criteria}
+        rules = await FraudBacktestService.load_rules(args.include_inactive, thresholds, criteria)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    result = await FraudBacktestService.run(args.start, args.end + timedelta(days=1), rules)
+    report = result.as_dict()
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+
+    print(f"{report['transactions']} transactions, {report['scored']} receipts scored, {report['rejected']} rejected")
+    print(f"{report['seconds']}s ({report['transactions_per_second']} tx/s)")
+    print(f"{'rule':<32} {'tp':>7} {'fp':>7} {'fn':>7} {'precision':>10} {'recall':>8}")
+    for name, row in [*report["rules"].items(), ("(any rule)", report["overall"])]:
+        print(f"{name:<32} {row['tp']:>7} {row['fp']:>7} {row['fn']:>7} {_percent(row['precision']):>10} {_percent(row['recall']):>8}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
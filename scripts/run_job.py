@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Run a single background job once, outside the in-process scheduler.
+The bot (or `boot.sh worker`) already runs every job on its own schedule;
+this is for manual runs and debugging.
+
+Usage: python scripts/run_job.py <job_name> [--force]
+       python scripts/run_job.py --list
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Add the app directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent / "app"))
+
+from services.activity_log import activity_log
+from services.scheduled_jobs import build_scheduler
+
+
+async def main():
+    scheduler = build_scheduler()
+    args = sys.argv[1:]
+
+    if not args or args[0] == "--list":
+        for job in scheduler.jobs.values():
+            print(f"{job.name:40} {job.trigger!r}")
+        return
+
+    job = scheduler.jobs.get(args[0])
+    if job is None:
+        print(f"Unknown job: {args[0]}")
+        sys.exit(1)
+
+    # --force skips leader election, e.g. when the scheduler is not running anywhere
+    scheduler.leader_election = "--force" not in args
+    if scheduler.leader_election:
+        await scheduler._ensure_lease_rows()
+
+    try:
+        ok = await scheduler.run_job(job)
+    finally:
+        # Write the activity events the job queued before asyncio.run cancels the writer
+        await activity_log.close()
+    stats = job.stats
+    if stats.skipped_not_leader:
+        print(f"{job.name}: lease is held by another scheduler, use --force to run anyway")
+        sys.exit(1)
+    print(f"{job.name}: {'ok' if ok else 'failed'} in {stats.last_duration or 0:.3f}s")
+    if not ok:
+        print(stats.last_error)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())